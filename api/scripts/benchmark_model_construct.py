@@ -0,0 +1,217 @@
+"""
+Micro-benchmark of model construction in the hot loops: validated pydantic
+construction and reflective rounding (before) against the precompiled plans
+in src.model_construct (after). Reports microseconds per object.
+
+python -m scripts.benchmark_model_construct --n-objects 10000
+"""
+
+import argparse
+import datetime
+import json
+import random
+import timeit
+from typing import Callable, Dict, List
+
+import orjson
+from pydantic import BaseModel
+from src.model_construct import round_model_floats, trusted_construct
+from src.types.activity import Activity, DailyActivity
+from src.types.training_week import (
+    EnrichedActivity,
+    FullTrainingWeek,
+    TrainingSession,
+    TrainingWeek,
+)
+from stravalib import model
+
+
+def reflective_round_all_floats(model: BaseModel, precision: int = 2) -> BaseModel:
+    """utils.round_all_floats as it was, walking __fields__ on every call"""
+    for field_name, field in model.__fields__.items():
+        if (
+            isinstance(field.type_, type)
+            and issubclass(field.type_, float)
+            and getattr(model, field_name) is not None
+        ):
+            setattr(model, field_name, round(getattr(model, field_name), precision))
+    return model
+
+
+def gen_strava_activities(n: int, rng: random.Random) -> List[model.Activity]:
+    start = datetime.datetime(2024, 1, 1, 6)
+    activities = []
+    for i in range(n):
+        distance = rng.uniform(3000, 25000)
+        moving_time = int(distance / rng.uniform(2.5, 4.5))
+        start_date_local = start + datetime.timedelta(hours=13 * i)
+        activities.append(
+            model.Activity(
+                id=i,
+                name="Run",
+                sport_type="Run",
+                distance=distance,
+                moving_time=moving_time,
+                elapsed_time=moving_time + 60,
+                start_date=start_date_local.replace(tzinfo=datetime.timezone.utc),
+                start_date_local=start_date_local,
+                timezone="(GMT-05:00) America/New_York",
+                utc_offset=-18000.0,
+                total_elevation_gain=rng.uniform(0, 300),
+                average_speed=distance / moving_time,
+                max_speed=distance / moving_time * 1.3,
+                achievement_count=0,
+                athlete_count=1,
+                comment_count=0,
+                kudos_count=0,
+                pr_count=0,
+                total_photo_count=0,
+                flagged=False,
+                has_kudoed=False,
+                manual=False,
+                private=False,
+                trainer=False,
+                has_heartrate=False,
+            )
+        )
+    return activities
+
+
+def gen_daily_values(n: int, rng: random.Random) -> List[dict]:
+    start = datetime.date(2024, 1, 1)
+    values = []
+    for i in range(n):
+        date = start + datetime.timedelta(days=i)
+        distance = rng.uniform(0, 15)
+        values.append(
+            {
+                "date": date,
+                "day_of_week": date.strftime("%a").lower(),
+                "week_of_year": date.isocalendar().week,
+                "year": date.isocalendar().year,
+                "distance_in_miles": distance,
+                "elevation_gain_in_feet": rng.uniform(0, 900),
+                "moving_time_in_minutes": distance * 8.5,
+                "pace_minutes_per_mile": 8.5 if distance else None,
+                "activity_ids": [i],
+                "activity_count": 1,
+            }
+        )
+    return values
+
+
+def gen_training_week_json(rng: random.Random) -> tuple:
+    """future_training_week and past_training_week as stored in training_week"""
+    days = ["Mon", "Tues", "Wed", "Thurs", "Fri", "Sat", "Sun"]
+    future = [
+        {
+            "day": day,
+            "session_type": "easy run",
+            "distance": rng.choice([4.0, 5.5, 6.0]),
+            "notes": "Keep it conversational",
+        }
+        for day in days
+    ]
+    past = [
+        {
+            "activity": {**day, "date": day["date"].isoformat()},
+            "coaches_notes": "Solid effort, well paced",
+        }
+        for day in gen_daily_values(7, rng)
+    ]
+    return orjson.dumps(future), orjson.dumps(past)
+
+
+def validated_training_week(future_json: bytes, past_json: bytes) -> FullTrainingWeek:
+    """supabase_client.get_training_week parsing as it was"""
+    return FullTrainingWeek(
+        past_training_week=[
+            EnrichedActivity(**obj) for obj in orjson.loads(past_json)
+        ],
+        future_training_week=TrainingWeek(
+            sessions=[
+                TrainingSession(**session) for session in orjson.loads(future_json)
+            ]
+        ),
+    )
+
+
+def trusted_training_week(future_json: bytes, past_json: bytes) -> FullTrainingWeek:
+    """supabase_client.get_training_week parsing as it is now"""
+    return trusted_construct(
+        FullTrainingWeek,
+        {
+            "past_training_week": orjson.loads(past_json),
+            "future_training_week": {"sessions": orjson.loads(future_json)},
+        },
+    )
+
+
+def time_per_object(func: Callable[[], object], n_objects: int, repeat: int) -> float:
+    """Best of repeat runs, in microseconds per object"""
+    return min(timeit.repeat(func, number=1, repeat=repeat)) / n_objects * 1e6
+
+
+def benchmark(args: argparse.Namespace) -> Dict[str, dict]:
+    rng = random.Random(args.seed)
+    strava_activities = gen_strava_activities(args.n_objects, rng)
+    daily_values = gen_daily_values(args.n_objects, rng)
+    future_json, past_json = gen_training_week_json(rng)
+    n_weeks = max(1, args.n_objects // 14)
+
+    cases = {
+        "activity_from_strava": (
+            lambda: [Activity(**a.__dict__) for a in strava_activities],
+            lambda: [
+                trusted_construct(Activity, a.__dict__) for a in strava_activities
+            ],
+            args.n_objects,
+        ),
+        "rounded_daily_activity": (
+            lambda: [
+                reflective_round_all_floats(DailyActivity(**values))
+                for values in daily_values
+            ],
+            lambda: [
+                round_model_floats(
+                    trusted_construct(DailyActivity, values, coerce=False)
+                )
+                for values in daily_values
+            ],
+            args.n_objects,
+        ),
+        # 7 past days + 7 sessions per row
+        "training_week_row": (
+            lambda: [
+                validated_training_week(future_json, past_json) for _ in range(n_weeks)
+            ],
+            lambda: [
+                trusted_training_week(future_json, past_json) for _ in range(n_weeks)
+            ],
+            n_weeks * 14,
+        ),
+    }
+
+    report = {}
+    for name, (before, after, n_objects) in cases.items():
+        assert before() == after(), f"{name}: outputs differ"
+        before_us = time_per_object(before, n_objects, args.repeat)
+        after_us = time_per_object(after, n_objects, args.repeat)
+        report[name] = {
+            "before_us_per_object": round(before_us, 2),
+            "after_us_per_object": round(after_us, 2),
+            "speedup": round(before_us / after_us, 1),
+        }
+    return report
+
+
+def parse_args() -> argparse.Namespace:
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument("--n-objects", type=int, default=10000)
+    parser.add_argument("--repeat", type=int, default=5)
+    parser.add_argument("--seed", type=int, default=0)
+    return parser.parse_args()
+
+
+if __name__ == "__main__":
+    print(json.dumps(benchmark(parse_args()), indent=4))
@@ -0,0 +1,509 @@
+"""
+Benchmark update_all_users offline with synthetic athletes. Strava, OpenAI and
+Supabase are swapped for local stand-ins with configurable latency and error
+rates, nothing leaves the machine.
+
+python -m scripts.simulate_update_pipeline --n-users 500 --max-concurrent-users 16
+"""
+
+import argparse
+import asyncio
+import datetime
+import json
+import os
+import random
+import re
+import tempfile
+import time
+import tracemalloc
+from types import SimpleNamespace
+from typing import Dict, Iterator, List, Optional
+
+# stand-ins replace every external call, but modules still build clients on import
+for key, value in {
+    "SUPABASE_URL": "http://localhost",
+    "SUPABASE_KEY": "simulated.supabase.key",
+    "OPENAI_API_KEY": "simulated",
+    "EMAIL_API_KEY": "simulated",
+    "JWT_SECRET": "simulated",
+}.items():
+    os.environ.setdefault(key, value)
+
+from src import (  # noqa: E402
+    apn,
+    auth_manager,
+    email_manager,
+    llm,
+    supabase_client,
+    tracing,
+    update_pipeline,
+    utils,
+)
+from src.types.activity import Activity, ActivitySync, WeeklyRollup  # noqa: E402
+from src.types.detailed_activity import DetailedActivity  # noqa: E402
+from src.types.mileage_recommendation import MileageRecommendationRow  # noqa: E402
+from src.types.training_week import FullTrainingWeek  # noqa: E402
+from src.types.update_pipeline import LeaseStatus  # noqa: E402
+from src.types.user import Preferences, User  # noqa: E402
+from stravalib import model  # noqa: E402
+
+
+class SimulatedError(Exception):
+    """Raised by stand-ins to simulate a failing dependency"""
+
+
+class Dependency:
+    """Latency and error rate of a simulated dependency"""
+
+    def __init__(self, name: str, latency: float, error_rate: float, seed: int):
+        self.name = name
+        self.latency = latency
+        self.error_rate = error_rate
+        self.rng = random.Random(seed)
+        self.n_calls = 0
+
+    def _jittered_latency(self) -> float:
+        return self.rng.uniform(0.5, 1.5) * self.latency
+
+    def _maybe_fail(self):
+        self.n_calls += 1
+        if self.rng.random() < self.error_rate:
+            raise SimulatedError(f"Simulated {self.name} failure")
+
+    def call(self):
+        """Block like a synchronous HTTP call"""
+        time.sleep(self._jittered_latency())
+        self._maybe_fail()
+
+    async def acall(self):
+        """Yield to the event loop like an async HTTP call"""
+        await asyncio.sleep(self._jittered_latency())
+        self._maybe_fail()
+
+
+def gen_strava_activity(
+    activity_id: int, start_date_local: datetime.datetime, rng: random.Random
+) -> model.Activity:
+    """
+    Synthetic Strava run, with the fields the pipeline reads
+
+    :param activity_id: Strava activity ID
+    :param start_date_local: local start time of the run
+    :param rng: random number generator
+    :return: stravalib Activity
+    """
+    distance = rng.uniform(3000, 25000)
+    moving_time = int(distance / rng.uniform(2.5, 4.5))
+    n_splits = max(1, int(distance // 1609.34))
+    return model.Activity(
+        id=activity_id,
+        name="Simulated Run",
+        sport_type="Run",
+        type="Run",
+        distance=distance,
+        moving_time=moving_time,
+        elapsed_time=moving_time + rng.randint(0, 600),
+        start_date=start_date_local.replace(tzinfo=datetime.timezone.utc),
+        start_date_local=start_date_local,
+        timezone="(GMT-05:00) America/New_York",
+        utc_offset=-18000.0,
+        total_elevation_gain=rng.uniform(0, 300),
+        average_speed=distance / moving_time,
+        max_speed=distance / moving_time * 1.3,
+        average_heartrate=rng.uniform(130, 170),
+        has_heartrate=True,
+        achievement_count=0,
+        athlete_count=1,
+        comment_count=0,
+        kudos_count=0,
+        pr_count=0,
+        total_photo_count=0,
+        flagged=False,
+        has_kudoed=False,
+        manual=False,
+        private=False,
+        trainer=False,
+        splits_standard=[
+            {
+                "split": i + 1,
+                "distance": 1609.34,
+                "moving_time": moving_time // n_splits,
+                "elapsed_time": moving_time // n_splits,
+                "elevation_difference": rng.uniform(-10, 10),
+                "average_heartrate": rng.uniform(130, 170),
+            }
+            for i in range(n_splits)
+        ],
+    )
+
+
+class SimulatedStravaClient:
+    """Stand-in for stravalib.Client serving a synthetic activity history"""
+
+    def __init__(self, athlete_id: int, strava: Dependency, runs_per_week: float):
+        self.athlete_id = athlete_id
+        self.strava = strava
+        self.runs_per_week = runs_per_week
+
+    def _activities_on(self, date: datetime.date) -> List[model.Activity]:
+        rng = random.Random(f"{self.athlete_id}:{date.isoformat()}")
+        if rng.random() >= self.runs_per_week / 7:
+            return []
+        activity_id = self.athlete_id * 1_000_000 + date.toordinal()
+        start = datetime.datetime.combine(date, datetime.time(hour=rng.randint(5, 19)))
+        return [gen_strava_activity(activity_id, start, rng)]
+
+    def get_activities(
+        self, after: datetime.datetime, before: datetime.datetime
+    ) -> "SimulatedActivityPages":
+        return SimulatedActivityPages(self, after, before)
+
+    def get_activity(self, activity_id: int) -> model.Activity:
+        self.strava.call()
+        date = datetime.date.fromordinal(activity_id % 1_000_000)
+        return self._activities_on(date)[0]
+
+
+class SimulatedSupabase:
+    """In-memory stand-in for the supabase_client functions used by the pipeline"""
+
+    def __init__(self, users: List[User], supabase: Dependency):
+        self.users = {user.athlete_id: user for user in users}
+        self.supabase = supabase
+        self.leases: Dict[tuple, dict] = {}
+        self.training_weeks: Dict[int, dict] = {}
+        self.mileage_recommendations: Dict[int, MileageRecommendationRow] = {}
+        self.activities: Dict[int, Dict[int, Activity]] = {}
+        self.activity_syncs: Dict[int, ActivitySync] = {}
+        self.weekly_rollups: Dict[int, Dict[tuple, WeeklyRollup]] = {}
+        self.detailed_activities: Dict[int, DetailedActivity] = {}
+
+    def list_users(self) -> List[User]:
+        self.supabase.call()
+        return list(self.users.values())
+
+    def get_user(self, athlete_id: int) -> User:
+        self.supabase.call()
+        return self.users[athlete_id]
+
+    def list_athlete_ids_updated_today(self) -> set:
+        self.supabase.call()
+        return set()
+
+    def list_athlete_ids_with_run_events_since(self, since: datetime.datetime) -> set:
+        # no webhook in the simulation
+        self.supabase.call()
+        return set()
+
+    def delete_run_events_before(self, event_time: datetime.datetime) -> None:
+        self.supabase.call()
+
+    def claim_athlete_lease(self, run_key: str, athlete_id: int, **kwargs) -> bool:
+        self.supabase.call()
+        if (run_key, athlete_id) in self.leases:
+            return False
+        self.leases[(run_key, athlete_id)] = {"status": LeaseStatus.LEASED}
+        return True
+
+    def complete_athlete_lease(
+        self, run_key: str, athlete_id: int, error: Optional[str] = None, **kwargs
+    ) -> None:
+        self.supabase.call()
+        self.leases[(run_key, athlete_id)] = {
+            "status": LeaseStatus.DONE if error is None else LeaseStatus.FAILED
+        }
+
+    def renew_athlete_lease(self, run_key: str, athlete_id: int, **kwargs) -> bool:
+        self.supabase.call()
+        lease = self.leases.get((run_key, athlete_id))
+        return lease is not None and lease["status"] == LeaseStatus.LEASED
+
+    def delete_athlete_leases_before(self, created_before: datetime.datetime) -> None:
+        self.supabase.call()
+
+    def update_update_run(self, job_id: str, **fields) -> None:
+        self.supabase.call()
+
+    def get_activity_sync(self, athlete_id: int) -> Optional[ActivitySync]:
+        self.supabase.call()
+        return self.activity_syncs.get(athlete_id)
+
+    def upsert_activity_sync(self, activity_sync: ActivitySync) -> None:
+        self.supabase.call()
+        self.activity_syncs[activity_sync.athlete_id] = activity_sync
+
+    def upsert_activities(self, athlete_id: int, activities: List[Activity]) -> None:
+        self.supabase.call()
+        stored = self.activities.setdefault(athlete_id, {})
+        stored.update({activity.id: activity for activity in activities})
+
+    def iter_activities(
+        self, athlete_id: int, after: datetime.datetime, before: datetime.datetime
+    ) -> Iterator[Activity]:
+        self.supabase.call()
+        after, before = utils.make_tz_aware(after), utils.make_tz_aware(before)
+        yield from sorted(
+            (
+                activity
+                for activity in self.activities.get(athlete_id, {}).values()
+                if after <= activity.start_date <= before
+            ),
+            key=lambda activity: activity.start_date,
+        )
+
+    def upsert_weekly_rollups(self, rollups: List[WeeklyRollup]) -> None:
+        self.supabase.call()
+        for rollup in rollups:
+            stored = self.weekly_rollups.setdefault(rollup.athlete_id, {})
+            stored[(rollup.year, rollup.week_of_year)] = rollup
+
+    def list_weekly_rollups(
+        self, athlete_id: int, start_date: datetime.date, end_date: datetime.date
+    ) -> List[WeeklyRollup]:
+        self.supabase.call()
+        return sorted(
+            (
+                rollup
+                for rollup in self.weekly_rollups.get(athlete_id, {}).values()
+                if start_date <= rollup.week_start_date <= end_date
+            ),
+            key=lambda rollup: rollup.week_start_date,
+        )
+
+    def get_detailed_activity(self, activity_id: int) -> Optional[DetailedActivity]:
+        self.supabase.call()
+        return self.detailed_activities.get(activity_id)
+
+    def upsert_detailed_activity(
+        self, activity_id: int, detailed_activity: DetailedActivity
+    ) -> None:
+        self.supabase.call()
+        self.detailed_activities[activity_id] = detailed_activity
+
+    def get_mileage_recommendation(
+        self, athlete_id: int, dt: datetime.datetime
+    ) -> MileageRecommendationRow:
+        self.supabase.call()
+        return self.mileage_recommendations.get(
+            athlete_id,
+            MileageRecommendationRow(
+                week_of_year=dt.isocalendar().week,
+                year=dt.isocalendar().year,
+                thoughts="Simulated recommendation",
+                total_volume=30,
+                long_run=10,
+                athlete_id=athlete_id,
+            ),
+        )
+
+    def insert_mileage_recommendation(self, row: MileageRecommendationRow) -> None:
+        self.supabase.call()
+        self.mileage_recommendations[row.athlete_id] = row
+
+    def insert_training_plan(self, athlete_id: int, training_plan) -> None:
+        self.supabase.call()
+
+    def get_training_week(self, athlete_id: int) -> FullTrainingWeek:
+        self.supabase.call()
+        if athlete_id not in self.training_weeks:
+            raise ValueError(
+                f"Could not find training_week row for athlete_id {athlete_id}"
+            )
+        return FullTrainingWeek(**self.training_weeks[athlete_id])
+
+    def get_past_training_week(self, athlete_id: int) -> Optional[list]:
+        self.supabase.call()
+        if athlete_id not in self.training_weeks:
+            return None
+        return self.get_training_week(athlete_id).past_training_week
+
+    def upsert_training_week(self, athlete_id: int, **training_week) -> None:
+        self.supabase.call()
+        self.training_weeks[athlete_id] = training_week
+
+
+class SimulatedActivityPages:
+    """Stand-in for stravalib's BatchedResultsIterator, one request per page"""
+
+    def __init__(
+        self,
+        client: SimulatedStravaClient,
+        after: datetime.datetime,
+        before: datetime.datetime,
+    ):
+        self.client = client
+        self.after = utils.make_tz_aware(after)
+        self.before = utils.make_tz_aware(before)
+        self.per_page = 200
+
+    def __iter__(self):
+        days = (self.before.date() - self.after.date()).days + 1
+        n_yielded = 0
+        for i in range(days):
+            date = self.after.date() + datetime.timedelta(days=i)
+            for activity in self.client._activities_on(date):
+                activity_start = utils.make_tz_aware(activity.start_date_local)
+                if self.after <= activity_start <= self.before:
+                    if n_yielded % self.per_page == 0:
+                        self.client.strava.call()
+                    n_yielded += 1
+                    yield activity
+
+
+def simulated_completion(generation_name: str, messages: List[dict]) -> str:
+    """
+    Minimal valid response for each generation in the pipeline
+
+    :param generation_name: name of the generation
+    :param messages: chat messages sent to the LLM
+    :return: response content
+    """
+    prompt = messages[-1]["content"]
+    if generation_name == "gen_training_plan":
+        n_weeks = prompt.count("WeekRange(")
+        weeks = [
+            {"week_num": i + 1, "week_type": "build", "volume": 30, "long_run": 10}
+            for i in range(n_weeks)
+        ]
+        return json.dumps({"weeks": weeks})
+    if generation_name == "gen_training_plan_week":
+        return json.dumps({"week_type": "build", "notes": "Simulated notes"})
+    if generation_name == "gen_pseudo_training_week":
+        days = re.findall(r"'(mon|tue|wed|thu|fri|sat|sun)'", prompt.splitlines()[-1])
+        return json.dumps(
+            {"days": [{"day": day.title(), "number_of_miles": 5} for day in days]}
+        )
+    if generation_name == "gen_training_week":
+        days = re.findall(r"<Day\.\w+: '(\w+)'>", prompt)
+        sessions = [
+            {"day": day, "session_type": "easy run", "distance": 5, "notes": "Easy"}
+            for day in days
+        ]
+        return json.dumps({"sessions": sessions})
+    return "Simulated coach's notes"
+
+
+def gen_users(n_users: int, seed: int) -> List[User]:
+    """
+    Synthetic users with a mix of premium status and race dates
+
+    :param n_users: number of users
+    :param seed: random seed
+    :return: list of User objects
+    """
+    rng = random.Random(seed)
+    today = datetime.date.today()
+    return [
+        User(
+            athlete_id=athlete_id,
+            is_premium=rng.random() < 0.3,
+            preferences=Preferences(
+                race_date=(
+                    today + datetime.timedelta(weeks=rng.randint(2, 20))
+                    if rng.random() < 0.5
+                    else None
+                )
+            ),
+        )
+        for athlete_id in range(1, n_users + 1)
+    ]
+
+
+def install_stand_ins(args: argparse.Namespace) -> SimulatedSupabase:
+    """
+    Swap Strava, OpenAI and Supabase for local stand-ins
+
+    :param args: parsed command line arguments
+    :return: the in-memory database stand-in
+    """
+    strava = Dependency("strava", args.strava_latency, args.strava_error_rate, 1)
+    openai = Dependency("openai", args.openai_latency, args.openai_error_rate, 2)
+    supabase = Dependency("supabase", args.supabase_latency, args.supabase_error_rate, 3)
+
+    def get_strava_client(athlete_id: int) -> SimulatedStravaClient:
+        strava.call()
+        return SimulatedStravaClient(athlete_id, strava, args.runs_per_week)
+
+    async def _request_completion(
+        messages, model, response_format, generation_name
+    ) -> SimpleNamespace:
+        await openai.acall()
+        content = simulated_completion(generation_name, messages)
+        return SimpleNamespace(
+            choices=[SimpleNamespace(message=SimpleNamespace(content=content))],
+            usage=SimpleNamespace(
+                total_tokens=sum(len(m["content"]) for m in messages) // 4
+                + len(content) // 4
+            ),
+        )
+
+    database = SimulatedSupabase(gen_users(args.n_users, args.seed), supabase)
+    for name in dir(SimulatedSupabase):
+        if not name.startswith("_") and hasattr(supabase_client, name):
+            setattr(supabase_client, name, getattr(database, name))
+
+    auth_manager.get_strava_client = get_strava_client
+    llm._request_completion = _request_completion
+    apn.send_push_notif_wrapper = lambda user: None
+    email_manager.send_alert_email = lambda **kwargs: None
+    tracing.SPANS_FILE = os.path.join(tempfile.mkdtemp(), "spans.jsonl")
+    return database
+
+
+async def simulate(args: argparse.Namespace) -> dict:
+    """
+    Run update_all_users against the stand-ins
+
+    :param args: parsed command line arguments
+    :return: run report with throughput, tail latency and peak memory
+    """
+    install_stand_ins(args)
+    dt = utils.datetime_now_est()
+    if args.exe_type == "mid_week" and dt.weekday() == 6:
+        dt -= datetime.timedelta(days=1)
+
+    tracemalloc.start()
+    response = await update_pipeline.update_all_users(
+        dt=dt if args.exe_type == "mid_week" else utils.get_last_sunday(),
+        max_concurrent_users=args.max_concurrent_users,
+        deadline=dt + datetime.timedelta(days=1),
+    )
+    _, peak_memory = tracemalloc.get_traced_memory()
+    tracemalloc.stop()
+
+    user_latency = response["stage_latencies"].get("update_training_week", {})
+    return {
+        "n_users": response["n_users"],
+        "n_succeeded": response["n_succeeded"],
+        "n_failed": response["n_failed"],
+        "duration_seconds": response["duration_seconds"],
+        "users_per_minute": response["users_per_minute"],
+        "user_latency_seconds": user_latency,
+        "peak_memory_mb": round(peak_memory / 1024**2, 2),
+        "stage_latencies": response["stage_latencies"],
+        "openai_governor": response["openai_governor"],
+        "llm_cache": response["llm_cache"],
+    }
+
+
+def parse_args() -> argparse.Namespace:
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument("--n-users", type=int, default=100)
+    parser.add_argument("--max-concurrent-users", type=int, default=8)
+    parser.add_argument(
+        "--exe-type", choices=["mid_week", "new_week"], default="mid_week"
+    )
+    parser.add_argument("--runs-per-week", type=float, default=4)
+    parser.add_argument("--strava-latency", type=float, default=0.2)
+    parser.add_argument("--strava-error-rate", type=float, default=0.0)
+    parser.add_argument("--openai-latency", type=float, default=2.0)
+    parser.add_argument("--openai-error-rate", type=float, default=0.0)
+    parser.add_argument("--supabase-latency", type=float, default=0.05)
+    parser.add_argument("--supabase-error-rate", type=float, default=0.0)
+    parser.add_argument("--seed", type=int, default=0)
+    return parser.parse_args()
+
+
+if __name__ == "__main__":
+    report = asyncio.run(simulate(parse_args()))
+    print(json.dumps(report, indent=4, default=str))
@@ -0,0 +1,22 @@
+-- Per-athlete store of Strava runs, synced incrementally (see activities.sync_activities)
+-- Create the same tables as test_activity and test_activity_sync for the test suite
+create table if not exists activity (
+    id bigint primary key,
+    athlete_id bigint not null,
+    start_date timestamptz not null,
+    start_date_local timestamp not null,
+    distance double precision not null default 0,
+    moving_time double precision not null default 0,
+    total_elevation_gain double precision not null default 0,
+    created_at timestamptz not null default now()
+);
+
+create index if not exists activity_athlete_id_start_date_idx
+    on activity (athlete_id, start_date);
+
+-- synced_from/last_synced_at bound the window of Strava history held in activity
+create table if not exists activity_sync (
+    athlete_id bigint primary key,
+    synced_from timestamptz not null,
+    last_synced_at timestamptz not null
+);
@@ -0,0 +1,19 @@
+-- Per-athlete checkpoint of a nightly run, doubles as the claim table that lets
+-- many workers share a run (see supabase_client.claim_athlete_lease)
+-- Rows older than ATHLETE_LEASE_RETENTION_DAYS are deleted at the start of each
+-- run (see supabase_client.delete_athlete_leases_before)
+-- Create the same table as test_athlete_lease for the test suite
+create table if not exists athlete_lease (
+    run_key text not null,
+    athlete_id bigint not null,
+    worker_id text not null,
+    status text not null default 'leased',
+    leased_until timestamptz not null,
+    attempts integer not null default 1,
+    error text,
+    created_at timestamptz not null default now(),
+    primary key (run_key, athlete_id)
+);
+
+create index if not exists athlete_lease_created_at_idx
+    on athlete_lease (created_at);
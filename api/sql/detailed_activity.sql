@@ -0,0 +1,7 @@
+-- Persistent cache of computed DetailedActivity objects (see detailed_activity.get_detailed_activity)
+-- Create the same table as test_detailed_activity for the test suite
+create table if not exists detailed_activity (
+    activity_id bigint primary key,
+    detailed_activity jsonb not null,
+    created_at timestamptz not null default now()
+);
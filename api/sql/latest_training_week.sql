@@ -0,0 +1,9 @@
+-- Latest training_week created_at per athlete (see supabase_client.list_athlete_ids_updated_today)
+-- Create the same view over test_training_week as test_latest_training_week for the test suite
+create index if not exists training_week_athlete_id_created_at_idx
+    on training_week (athlete_id, created_at desc);
+
+create or replace view latest_training_week as
+select distinct on (athlete_id) athlete_id, created_at
+from training_week
+order by athlete_id, created_at desc;
@@ -0,0 +1,13 @@
+-- Runs reported by the Strava webhook (see webhook.handle_activity_create), the
+-- nightly run updates athletes who ran since midnight first
+-- Create the same table as test_run_event for the test suite
+create table if not exists run_event (
+    activity_id bigint primary key,
+    athlete_id bigint not null,
+    event_time timestamptz not null
+);
+
+-- Rows older than RUN_EVENT_RETENTION_DAYS are deleted at the start of each
+-- run (see supabase_client.delete_run_events_before)
+create index if not exists run_event_event_time_idx
+    on run_event (event_time);
@@ -0,0 +1,10 @@
+-- Strava usage shared across workers (see rate_limit.StravaRateLimiter)
+-- Create the same table as test_strava_rate_limit for the test suite
+create table if not exists strava_rate_limit (
+    name text primary key default 'strava',
+    short_usage integer not null,
+    long_usage integer not null,
+    short_limit integer not null,
+    long_limit integer not null,
+    updated_at timestamptz not null default now()
+);
@@ -0,0 +1,12 @@
+-- One row per /update-all-users/ job (see supabase_client.insert_update_run)
+-- Create the same table as test_update_run for the test suite
+create table if not exists update_run (
+    job_id uuid primary key,
+    run_key text,
+    status text not null default 'queued',
+    stage_durations jsonb not null default '{}'::jsonb,
+    summary jsonb,
+    error text,
+    created_at timestamptz not null default now(),
+    updated_at timestamptz not null default now()
+);
@@ -0,0 +1,18 @@
+-- Per-athlete weekly mileage, maintained from the activity table by
+-- activities.update_weekly_rollups whenever runs are synced
+-- Create the same table as test_weekly_rollup for the test suite
+create table if not exists weekly_rollup (
+    athlete_id bigint not null,
+    year int not null,
+    week_of_year int not null,
+    week_start_date date not null,
+    total_distance double precision not null default 0,
+    longest_run double precision not null default 0,
+    run_count int not null default 0,
+    moving_time_in_minutes double precision not null default 0,
+    updated_at timestamptz not null default now(),
+    primary key (athlete_id, year, week_of_year)
+);
+
+create index if not exists weekly_rollup_athlete_id_week_start_date_idx
+    on weekly_rollup (athlete_id, week_start_date);
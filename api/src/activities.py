@@ -1,183 +1,453 @@
 import datetime
 import logging
+import threading
 from collections import defaultdict
-from typing import List, Optional
-
-from src import constants
-from src.types.activity import Activity, DailyActivity, WeekSummary
-from src.utils import round_all_floats
+from concurrent.futures import ThreadPoolExecutor
+from typing import Dict, Iterator, List, Optional, Set, Tuple
+
+import numpy as np
+from src import activity_engine, constants, supabase_client
+from src.model_construct import trusted_construct
+from src.types.activity import Activity, ActivitySync, WeekSummary
+from src.types.activity_series import DailyActivitySeries
+from src.utils import make_tz_aware
 from stravalib.client import Client
 
 logging.getLogger("stravalib.protocol").setLevel(logging.ERROR)
 
+# shared by all athletes, bounds the number of history sub-ranges in flight
+_history_executor = ThreadPoolExecutor(
+    max_workers=constants.STRAVA_HISTORY_MAX_WORKERS,
+    thread_name_prefix="strava_history",
+)
 
-def add_missing_dates(
-    activities: List[Activity],
-    start_date: datetime.datetime,
-    end_date: datetime.datetime,
-) -> List[Activity]:
-    """
-    Ensures that the list of activities includes placeholder activities for all dates
-    between the start and end date.
-
-    :param activities: List of Activity Pydantic models.
-    :param start_date: The start date of the range.
-    :param end_date: The end date of the range.
-    :return: A list of Activity objects, with missing dates filled in as placeholder activities.
-    """
-    existing_dates = {activity.start_date_local.date() for activity in activities}
-    total_days = (end_date.date() - start_date.date()).days + 1
-    all_dates = {
-        start_date.date() + datetime.timedelta(days=i) for i in range(total_days)
-    }
-    missing_dates = all_dates - existing_dates
-
-    placeholders = [
-        Activity(
-            start_date=datetime.datetime.combine(date, datetime.datetime.min.time()),
-            start_date_local=datetime.datetime.combine(
-                date, datetime.datetime.min.time()
-            ),
+
+def split_time_window(
+    after: datetime.datetime, before: datetime.datetime, window: datetime.timedelta
+) -> List[Tuple[datetime.datetime, datetime.datetime]]:
+    """
+    Split [after, before] into consecutive sub-ranges of at most window
+
+    :param after: Start of the range
+    :param before: End of the range
+    :param window: max length of a sub-range
+    :return: list of (after, before) tuples covering the range
+    """
+    windows = []
+    window_start = after
+    while window_start < before:
+        window_end = min(window_start + window, before)
+        windows.append((window_start, window_end))
+        window_start = window_end
+    return windows or [(after, before)]
+
+
+def iter_runs_in_window(
+    strava_client: Client,
+    after: datetime.datetime,
+    before: datetime.datetime,
+    page_size: int,
+) -> Iterator:
+    """
+    Lazily yield an athlete's runs as Strava pages arrive
+
+    :param strava_client: The Strava client object to fetch data.
+    :param after: Start of the window
+    :param before: End of the window
+    :param page_size: activities per Strava request, at most 200
+    :return: iterator of stravalib Activity models, runs only
+    """
+    all_strava_activities = strava_client.get_activities(after=after, before=before)
+    all_strava_activities.per_page = page_size
+    for activity in all_strava_activities:
+        if activity.sport_type == "Run":
+            yield activity
+
+
+def _split_history(
+    after: datetime.datetime, before: datetime.datetime
+) -> List[Tuple[datetime.datetime, datetime.datetime]]:
+    return split_time_window(
+        after, before, datetime.timedelta(days=constants.STRAVA_HISTORY_WINDOW_DAYS)
+    )
+
+
+class DayTotals:
+    """Running totals of one day's runs"""
+
+    __slots__ = ("distance", "moving_time", "elevation_gain", "runs")
+
+    def __init__(self):
+        self.distance = 0.0
+        self.moving_time = 0.0
+        self.elevation_gain = 0.0
+        self.runs: List[Tuple[datetime.datetime, int]] = []
+
+
+class DailyActivityAccumulator:
+    """
+    Folds runs into per-day totals as they stream in, so a window of history
+    is never held as a list of Activity objects. Runs are deduped by id and
+    may be folded concurrently from several sub-ranges of the window
+    """
+
+    def __init__(self):
+        self.days: Dict[datetime.date, DayTotals] = defaultdict(DayTotals)
+        self._seen_ids: Set[int] = set()
+        self._lock = threading.Lock()
+
+    def add(
+        self,
+        activity_id: int,
+        start_date_local: datetime.datetime,
+        distance: float,
+        moving_time: float,
+        total_elevation_gain: float,
+    ) -> None:
+        """
+        Fold a single run into its day
+
+        :param activity_id: Strava activity ID
+        :param start_date_local: local start time of the run
+        :param distance: distance in meters
+        :param moving_time: moving time in seconds
+        :param total_elevation_gain: elevation gain in meters
+        """
+        with self._lock:
+            if activity_id in self._seen_ids:
+                return
+            self._seen_ids.add(activity_id)
+            day = self.days[start_date_local.date()]
+            day.distance += distance
+            day.moving_time += moving_time
+            day.elevation_gain += total_elevation_gain
+            day.runs.append((start_date_local, activity_id))
+
+    def add_activity(self, activity) -> None:
+        """
+        Fold a stravalib or Activity model, reading its raw field values
+
+        :param activity: stravalib Activity or Activity
+        """
+        fields = activity.__dict__
+        self.add(
+            activity_id=fields["id"],
+            start_date_local=fields["start_date_local"],
+            distance=fields["distance"] or 0.0,
+            moving_time=fields["moving_time"].total_seconds(),
+            total_elevation_gain=fields["total_elevation_gain"] or 0.0,
+        )
+
+    def to_daily_activity(
+        self, start_date: datetime.datetime, end_date: datetime.datetime
+    ) -> DailyActivitySeries:
+        """
+        One DailyActivity per day between start and end date (rest days
+        included)
+
+        :param start_date: The start date of the series
+        :param end_date: The end date of the series
+        :return: DailyActivitySeries
+        """
+        total_days = (end_date.date() - start_date.date()).days + 1
+        dates = {
+            start_date.date() + datetime.timedelta(days=i) for i in range(total_days)
+        }
+        dates = sorted(dates | self.days.keys())
+        empty_day = DayTotals()
+        days = [self.days.get(date, empty_day) for date in dates]
+
+        return activity_engine.build_daily_activity(
+            ordinals=np.array([date.toordinal() for date in dates], dtype=np.int64),
+            distance=np.array([day.distance for day in days]),
+            moving_time=np.array([day.moving_time for day in days]),
+            elevation_gain=np.array([day.elevation_gain for day in days]),
+            activity_ids=[
+                [activity_id for _, activity_id in sorted(day.runs)] for day in days
+            ],
         )
-        for date in missing_dates
-    ]
-    return sorted(activities + placeholders, key=lambda x: x.start_date_local)
 
 
-def aggregate_daily_activity(activities: List[Activity]) -> List[DailyActivity]:
+def store_runs(
+    athlete_id: int,
+    strava_client: Client,
+    after: datetime.datetime,
+    before: datetime.datetime,
+    page_size: int = constants.STRAVA_PAGE_SIZE,
+) -> None:
     """
-    Aggregates and transforms activity data to calculate daily and weekly metrics.
+    Stream an athlete's runs from Strava into the activity table, one page at
+    a time, so a window of history is never held as a list of Activity
+    objects. Long windows are split into sub-ranges fetched concurrently
+    (still paced by the client's rate limiter), runs repeated on a sub-range
+    boundary are upserted twice under the same id
 
-    :param activities: List of Activity Pydantic models containing activity data
-    :return: A list of DailyActivity objects with aggregated and transformed metrics
+    :param athlete_id: The ID of the athlete
+    :param strava_client: The Strava client object to fetch data.
+    :param after: Start of the window
+    :param before: End of the window
+    :param page_size: activities per Strava request and per upsert
     """
 
-    results = []
-    activities_by_date = defaultdict(list)
-    for activity in activities:
-        activities_by_date[activity.start_date_local.date()].append(activity)
+    def store_window(window: Tuple[datetime.datetime, datetime.datetime]) -> None:
+        page = []
+        for activity in iter_runs_in_window(strava_client, *window, page_size):
+            page.append(trusted_construct(Activity, activity.__dict__))
+            if len(page) == page_size:
+                supabase_client.upsert_activities(athlete_id, page)
+                page = []
+        supabase_client.upsert_activities(athlete_id, page)
 
-    for activity_date, daily_activities in activities_by_date.items():
-        total_distance = sum(a.distance for a in daily_activities)
-        total_elevation_gain = sum(a.total_elevation_gain for a in daily_activities)
-        total_moving_time = sum(a.moving_time.total_seconds() for a in daily_activities)
-        activity_ids = [a.id for a in daily_activities if a.id != -1]
-        activity_count = len([a for a in daily_activities if a.id != -1])
+    list(_history_executor.map(store_window, _split_history(after, before)))
 
-        if total_distance > 0:
-            pace_minutes_per_mile = (total_moving_time / 60) / (
-                total_distance / constants.METERS_PER_MILE
-            )
-        else:
-            pace_minutes_per_mile = None
-
-        results.append(
-            round_all_floats(
-                DailyActivity(
-                    date=activity_date,
-                    day_of_week=activity_date.strftime("%a").lower(),
-                    week_of_year=activity_date.isocalendar().week,
-                    year=activity_date.isocalendar().year,
-                    distance_in_miles=total_distance / constants.METERS_PER_MILE,
-                    elevation_gain_in_feet=total_elevation_gain
-                    * constants.FEET_PER_METER,
-                    moving_time_in_minutes=total_moving_time / 60,
-                    pace_minutes_per_mile=pace_minutes_per_mile,
-                    activity_ids=activity_ids,
-                    activity_count=activity_count,
-                )
+
+def fold_stored_runs(
+    athlete_id: int, after: datetime.datetime, before: datetime.datetime
+) -> DailyActivityAccumulator:
+    """
+    Fold an athlete's stored runs into per-day totals as they are read
+
+    :param athlete_id: The ID of the athlete
+    :param after: Start of the window
+    :param before: End of the window
+    :return: DailyActivityAccumulator
+    """
+    accumulator = DailyActivityAccumulator()
+    for activity in supabase_client.iter_activities(
+        athlete_id, after=after, before=before
+    ):
+        accumulator.add_activity(activity)
+    return accumulator
+
+
+def get_week_start(date: datetime.date) -> datetime.date:
+    """
+    :param date: any day
+    :return: Monday of date's ISO week
+    """
+    return date - datetime.timedelta(days=date.weekday())
+
+
+def update_weekly_rollups(
+    athlete_id: int,
+    synced_from: datetime.datetime,
+    after: datetime.datetime,
+    before: datetime.datetime,
+) -> None:
+    """
+    Recompute the weekly rollup of every ISO week overlapping [after, before]
+    from the athlete's stored runs. Weeks are recomputed whole rather than
+    incremented, so re-synced runs are never counted twice. The week holding
+    synced_from is only partly stored and is skipped, like the leftover first
+    week of a daily series
+
+    :param athlete_id: The ID of the athlete
+    :param synced_from: Start of the stored window of runs
+    :param after: Start of the range of new or changed runs
+    :param before: End of the range of new or changed runs
+    """
+    first_monday = max(
+        get_week_start(after.date()),
+        get_week_start(synced_from.date()) + datetime.timedelta(weeks=1),
+    )
+    last_sunday = get_week_start(before.date()) + datetime.timedelta(days=6)
+    if first_monday > last_sunday:
+        return
+
+    # runs are stored by UTC start date while days are local, pad by a day
+    day_before = datetime.datetime.combine(
+        first_monday - datetime.timedelta(days=1), datetime.time.min, after.tzinfo
+    )
+    accumulator = fold_stored_runs(
+        athlete_id,
+        after=day_before,
+        before=datetime.datetime.combine(
+            last_sunday + datetime.timedelta(days=1), datetime.time.max, after.tzinfo
+        ),
+    )
+    daily_activity = accumulator.to_daily_activity(
+        start_date=day_before,
+        end_date=datetime.datetime.combine(last_sunday, datetime.time.min),
+    ).between(first_monday, last_sunday)
+    supabase_client.upsert_weekly_rollups(
+        activity_engine.get_weekly_rollups(athlete_id, daily_activity)
+    )
+
+
+def sync_activities(
+    athlete_id: int,
+    strava_client: Client,
+    start_date: datetime.datetime,
+    dt: datetime.datetime,
+) -> None:
+    """
+    Bring the athlete's stored runs up to date through dt, only pulling from
+    Strava what is not already held: history before the stored window and
+    anything after the last_synced_at watermark. The watermark is re-fetched
+    with some overlap to pick up activities uploaded late.
+
+    :param athlete_id: The ID of the athlete
+    :param strava_client: The Strava client object to fetch data.
+    :param start_date: Earliest date the store must cover
+    :param dt: Latest date the store must cover
+    """
+    # the stored window is tz-aware, callers may pass naive local datetimes
+    start_date, dt = make_tz_aware(start_date), make_tz_aware(dt)
+    activity_sync = supabase_client.get_activity_sync(athlete_id)
+    if activity_sync is None:
+        store_runs(athlete_id, strava_client, after=start_date, before=dt)
+        update_weekly_rollups(athlete_id, start_date, after=start_date, before=dt)
+        supabase_client.upsert_activity_sync(
+            ActivitySync(
+                athlete_id=athlete_id, synced_from=start_date, last_synced_at=dt
             )
         )
+        return
 
-    # chop off remainder/leftover days near start date
-    results = sorted(results, key=lambda x: x.date)
-    first_year_week = min((item.year, item.week_of_year) for item in results)
-    results = [
-        item for item in results if (item.year, item.week_of_year) != first_year_week
-    ]
+    synced_from = activity_sync.synced_from
+    last_synced_at = activity_sync.last_synced_at
 
-    return results
+    if start_date < synced_from:
+        store_runs(athlete_id, strava_client, after=start_date, before=synced_from)
+        update_weekly_rollups(
+            athlete_id, start_date, after=start_date, before=synced_from
+        )
+        synced_from = start_date
 
+    if dt > last_synced_at:
+        overlap = datetime.timedelta(days=constants.ACTIVITY_SYNC_OVERLAP_DAYS)
+        store_runs(
+            athlete_id, strava_client, after=last_synced_at - overlap, before=dt
+        )
+        update_weekly_rollups(
+            athlete_id, synced_from, after=last_synced_at - overlap, before=dt
+        )
+        last_synced_at = dt
+
+    if (synced_from, last_synced_at) != (
+        activity_sync.synced_from,
+        activity_sync.last_synced_at,
+    ):
+        supabase_client.upsert_activity_sync(
+            ActivitySync(
+                athlete_id=athlete_id,
+                synced_from=synced_from,
+                last_synced_at=last_synced_at,
+            )
+        )
 
-def get_daily_activity(
-    strava_client: Client, dt: datetime.datetime, num_weeks: int = 8
-) -> List[DailyActivity]:
+
+def get_synced_daily_activity(
+    athlete_id: int,
+    strava_client: Client,
+    dt: datetime.datetime,
+    num_weeks: int = 8,
+) -> DailyActivitySeries:
     """
-    Fetches activities for a given athlete ID and returns a DataFrame with daily aggregated activities
+    Daily aggregated runs of the num_weeks before dt. Runs are incrementally
+    synced into the activity table and the daily series is rebuilt from there
+    instead of re-downloading the full window from Strava
 
+    :param athlete_id: The ID of the athlete
     :param strava_client: The Strava client object to fetch data.
+    :param dt: End of the window
     :param num_weeks: The number of weeks to fetch activities for.
-    :return: A cleaned and processed DataFrame of the athlete's daily aggregated activities.
+    :return: DailyActivitySeries
     """
+    dt = make_tz_aware(dt)
     start_date = dt - datetime.timedelta(weeks=num_weeks)
+    sync_activities(athlete_id, strava_client, start_date=start_date, dt=dt)
+    accumulator = fold_stored_runs(athlete_id, after=start_date, before=dt)
+    return accumulator.to_daily_activity(start_date=start_date, end_date=dt)
 
-    all_strava_activities = strava_client.get_activities(after=start_date, before=dt)
 
-    # filter and convert to our Activity type
-    activities = [
-        Activity(**activity.__dict__)
-        for activity in all_strava_activities
-        if activity.sport_type == "Run"
-    ]
+def is_synced(
+    activity_sync: Optional[ActivitySync],
+    start_date: datetime.datetime,
+    dt: datetime.datetime,
+) -> bool:
+    """
+    Whether the activity store covers [start_date, dt] without a Strava sync,
+    a watermark within ACTIVITY_SYNC_MAX_AGE of dt counts as up to date
 
-    # add empty activities for missing dates
-    all_dates_activities = add_missing_dates(
-        activities=activities, start_date=start_date, end_date=dt
+    :param activity_sync: The athlete's ActivitySync, None if never synced
+    :param start_date: Earliest date the store must cover
+    :param dt: Latest date the store must cover
+    :return: bool
+    """
+    if activity_sync is None:
+        return False
+    start_date, dt = make_tz_aware(start_date), make_tz_aware(dt)
+    return (
+        activity_sync.synced_from <= start_date
+        and activity_sync.last_synced_at >= dt - constants.ACTIVITY_SYNC_MAX_AGE
     )
 
-    # aggregate metrics
-    return aggregate_daily_activity(all_dates_activities)
+
+def get_summary_weeks(
+    dt: datetime.datetime, num_weeks: int
+) -> Tuple[datetime.date, datetime.date]:
+    """
+    :param dt: End of the window
+    :param num_weeks: The number of weeks to summarize
+    :return: Mondays of the first and last week summarized by get_weekly_summaries
+    """
+    start_date = dt - datetime.timedelta(weeks=num_weeks)
+    first_monday = get_week_start(start_date.date()) + datetime.timedelta(weeks=1)
+    return first_monday, get_week_start(dt.date())
+
+
+def count_summary_weeks(dt: datetime.datetime, num_weeks: int) -> int:
+    """
+    :param dt: End of the window
+    :param num_weeks: The number of weeks to summarize
+    :return: number of weeks get_weekly_summaries returns for a synced athlete
+    """
+    first_monday, last_monday = get_summary_weeks(dt, num_weeks)
+    return (last_monday - first_monday).days // 7 + 1
 
 
 def get_weekly_summaries(
+    athlete_id: int,
+    dt: datetime.datetime,
+    num_weeks: int = 8,
     strava_client: Optional[Client] = None,
-    daily_activity: Optional[List[DailyActivity]] = None,
-    dt: Optional[datetime.datetime] = None,
 ) -> List[WeekSummary]:
     """
-    Aggregate daily metrics by week of the year and calculate load for each week.
-
+    Weekly summaries of the num_weeks before dt, read from the weekly_rollup
+    table. The leftover first week is dropped, like a daily series. Weeks
+    missing from the rollup (athlete synced before rollups existed, or never
+    synced) are rebuilt from the activity store, syncing it first when a
+    Strava client is given
+
+    :param athlete_id: The ID of the athlete
+    :param dt: End of the window
+    :param num_weeks: The number of weeks to summarize
     :param strava_client: The Strava client object to fetch data.
-    :param daily_activity: List of DailyActivity objects
-    :param dt: datetime injection, helpful for testing
-    :return: A list of WeekSummary objects with summary statistics
+    :return: A list of WeekSummary objects sorted by week
     """
-    if strava_client is None and daily_activity is None:
-        raise ValueError("Either strava_client or daily_activity must be provided")
-
-    if daily_activity is None:
-        daily_activity = get_daily_activity(strava_client, dt=dt)
-
-    weekly_aggregates = defaultdict(
-        lambda: {"total_distance": 0, "longest_run": 0, "start_of_week": None}
+    dt = make_tz_aware(dt)
+    start_date = dt - datetime.timedelta(weeks=num_weeks)
+    first_monday, last_monday = get_summary_weeks(dt, num_weeks)
+    rollups = supabase_client.list_weekly_rollups(
+        athlete_id, start_date=first_monday, end_date=last_monday
     )
 
-    for metrics in daily_activity:
-        key = (metrics.year, metrics.week_of_year)
-
-        # calculate total distance and longest run
-        weekly_aggregates[key]["total_distance"] += metrics.distance_in_miles
-        weekly_aggregates[key]["longest_run"] = max(
-            weekly_aggregates[key]["longest_run"], metrics.distance_in_miles
-        )
-
-        # update start of week
-        if (
-            weekly_aggregates[key]["start_of_week"] is None
-            or metrics.date < weekly_aggregates[key]["start_of_week"]
-        ):
-            weekly_aggregates[key]["start_of_week"] = metrics.date
-
-    weekly_summaries = [
-        WeekSummary(
-            year=year,
-            week_of_year=week,
-            week_start_date=start_of_week,
-            longest_run=round(aggregate["longest_run"], 2),
-            total_distance=round(aggregate["total_distance"], 2),
-        )
-        for (year, week), aggregate in sorted(weekly_aggregates.items())
-        for start_of_week in [aggregate["start_of_week"]]
-    ]
+    if len(rollups) < count_summary_weeks(dt, num_weeks):
+        if strava_client is not None:
+            sync_activities(athlete_id, strava_client, start_date=start_date, dt=dt)
+        activity_sync = supabase_client.get_activity_sync(athlete_id)
+        if activity_sync is not None:
+            # runs after the watermark are not stored yet, their weeks would
+            # be rolled up short
+            update_weekly_rollups(
+                athlete_id,
+                activity_sync.synced_from,
+                after=start_date,
+                before=min(dt, activity_sync.last_synced_at),
+            )
+            rollups = supabase_client.list_weekly_rollups(
+                athlete_id, start_date=first_monday, end_date=last_monday
+            )
 
-    return weekly_summaries
+    return [rollup.to_week_summary() for rollup in rollups]
@@ -0,0 +1,257 @@
+"""
+Columnar (NumPy) aggregation of runs into daily and weekly metrics. Produces
+the same DailyActivity and WeekSummary outputs as the per-object loops in
+activities.py, which are kept as the reference implementation
+"""
+
+import datetime
+from typing import List, NamedTuple, Sequence
+
+import numpy as np
+from src import constants
+from src.types.activity import Activity, DailyActivity, WeeklyRollup, WeekSummary
+from src.types.activity_series import DailyActivitySeries
+
+UNIX_EPOCH_ORDINAL = datetime.date(1970, 1, 1).toordinal()
+
+
+def round_floats(values: np.ndarray, precision: int = 2) -> np.ndarray:
+    """
+    Vectorized rounding that matches the builtin round(). np.round scales by
+    10**precision first, which can land on the wrong side of a half, so values
+    that are (nearly) halfway are rounded one by one with the builtin
+
+    :param values: float array
+    :param precision: number of decimals
+    :return: rounded float array
+    """
+    scale = 10.0**precision
+    scaled = values * scale
+    rounded = np.round(scaled) / scale
+    ambiguous = np.abs(np.abs(scaled - np.floor(scaled)) - 0.5) < 1e-6
+    for i in np.flatnonzero(ambiguous):
+        rounded[i] = round(float(values[i]), precision)
+    return rounded
+
+
+def iso_calendar(ordinals: np.ndarray) -> tuple:
+    """
+    Vectorized date.isocalendar() over proleptic Gregorian ordinals
+
+    :param ordinals: int array of date.toordinal() values
+    :return: (iso year, iso week, weekday with Monday=0) int arrays
+    """
+    weekday = (ordinals - 1) % 7
+    # the ISO year of a week is the year of its Thursday
+    thursdays = (ordinals - weekday + 3 - UNIX_EPOCH_ORDINAL).astype("datetime64[D]")
+    year_starts = thursdays.astype("datetime64[Y]")
+    iso_year = year_starts.astype(int) + 1970
+    day_of_year = (thursdays - year_starts.astype("datetime64[D]")).astype(int)
+    iso_week = day_of_year // 7 + 1
+    return iso_year, iso_week, weekday
+
+
+def build_daily_activity(
+    ordinals: np.ndarray,
+    distance: np.ndarray,
+    moving_time: np.ndarray,
+    elevation_gain: np.ndarray,
+    activity_ids: Sequence[List[int]],
+) -> DailyActivitySeries:
+    """
+    Turn per-day totals into a DailyActivitySeries, dropping the leftover days
+    of the first (partial) ISO week
+
+    :param ordinals: date ordinals, sorted ascending
+    :param distance: meters per day
+    :param moving_time: seconds per day
+    :param elevation_gain: meters per day
+    :param activity_ids: activity ids per day
+    :return: DailyActivitySeries
+    """
+    iso_year, iso_week, weekday = iso_calendar(ordinals)
+
+    with np.errstate(divide="ignore", invalid="ignore"):
+        pace = (moving_time / 60) / (distance / constants.METERS_PER_MILE)
+    pace = np.where(distance > 0, pace, np.nan)
+
+    week_keys = iso_year * 100 + iso_week
+    keep = week_keys != week_keys.min() if len(week_keys) else week_keys > 0
+    ids_per_day = [ids for ids, kept in zip(activity_ids, keep) if kept]
+    return DailyActivitySeries(
+        ordinals=ordinals[keep],
+        year=iso_year[keep],
+        week_of_year=iso_week[keep],
+        weekday=weekday[keep],
+        distance_in_miles=round_floats(distance[keep] / constants.METERS_PER_MILE),
+        elevation_gain_in_feet=round_floats(
+            elevation_gain[keep] * constants.FEET_PER_METER
+        ),
+        moving_time_in_minutes=round_floats(moving_time[keep] / 60),
+        pace_minutes_per_mile=round_floats(pace[keep]),
+        activity_id_offsets=np.concatenate(
+            [[0], np.cumsum([len(ids) for ids in ids_per_day])]
+        ).astype(np.int64),
+        activity_ids=np.array(
+            [activity_id for ids in ids_per_day for activity_id in ids],
+            dtype=np.int64,
+        ),
+    )
+
+
+def aggregate_daily_activity(
+    activities: List[Activity],
+    start_date: datetime.datetime,
+    end_date: datetime.datetime,
+) -> DailyActivitySeries:
+    """
+    One DailyActivity per day between start and end date, rest days included
+    and the leftover first week dropped. Runs are grouped into a date-indexed
+    array with bincount, no placeholder activities needed
+
+    :param activities: List of Activity objects
+    :param start_date: The start date of the range
+    :param end_date: The end date of the range
+    :return: DailyActivitySeries
+    """
+    activities = sorted(activities, key=lambda x: x.start_date_local)
+    run_ordinals = np.array(
+        [a.start_date_local.toordinal() for a in activities], dtype=np.int64
+    )
+
+    first = start_date.toordinal()
+    last = end_date.toordinal()
+    if len(activities):
+        first = min(first, int(run_ordinals.min()))
+        last = max(last, int(run_ordinals.max()))
+    ordinals = np.arange(first, last + 1, dtype=np.int64)
+    day_index = run_ordinals - first
+
+    def sum_by_day(values: List[float]) -> np.ndarray:
+        return np.bincount(
+            day_index, weights=np.array(values, dtype=float), minlength=len(ordinals)
+        )
+
+    distance = sum_by_day([a.distance for a in activities])
+    moving_time = sum_by_day([a.moving_time.total_seconds() for a in activities])
+    elevation_gain = sum_by_day([a.total_elevation_gain for a in activities])
+
+    activity_ids = [[] for _ in range(len(ordinals))]
+    for i, activity in zip(day_index.tolist(), activities):
+        if activity.id != -1:
+            activity_ids[i].append(activity.id)
+
+    # placeholders only ever covered [start_date, end_date], plus dates of runs
+    in_series = np.zeros(len(ordinals), dtype=bool)
+    in_series[start_date.toordinal() - first : end_date.toordinal() - first + 1] = True
+    in_series[day_index] = True
+    return build_daily_activity(
+        ordinals[in_series],
+        distance[in_series],
+        moving_time[in_series],
+        elevation_gain[in_series],
+        [ids for ids, keep in zip(activity_ids, in_series) if keep],
+    )
+
+
+class WeeklyTotals(NamedTuple):
+    """Per-week columns of a daily series, one entry per ISO week"""
+
+    weeks: np.ndarray
+    week_index: np.ndarray
+    start_of_week: np.ndarray
+    total_distance: np.ndarray
+    longest_run: np.ndarray
+
+
+def _group_by_week(daily_activity: DailyActivitySeries) -> WeeklyTotals:
+    week_keys = daily_activity.year * 100 + daily_activity.week_of_year
+    distance = daily_activity.distance_in_miles
+    ordinals = daily_activity.ordinals
+
+    weeks, week_index = np.unique(week_keys, return_inverse=True)
+    total_distance = np.bincount(week_index, weights=distance, minlength=len(weeks))
+    longest_run = np.zeros(len(weeks))
+    np.maximum.at(longest_run, week_index, distance)
+    start_of_week = np.full(len(weeks), np.iinfo(np.int64).max)
+    np.minimum.at(start_of_week, week_index, ordinals)
+    return WeeklyTotals(
+        weeks=weeks,
+        week_index=week_index,
+        start_of_week=start_of_week,
+        total_distance=round_floats(total_distance),
+        longest_run=round_floats(longest_run),
+    )
+
+
+def get_weekly_summaries(
+    daily_activity: Sequence[DailyActivity],
+) -> List[WeekSummary]:
+    """
+    Per-week distance totals and longest runs, days are grouped by
+    (year, week_of_year) with bincount
+
+    :param daily_activity: DailyActivitySeries or list of DailyActivity objects
+    :return: A list of WeekSummary objects sorted by week
+    """
+    if not len(daily_activity):
+        return []
+
+    if not isinstance(daily_activity, DailyActivitySeries):
+        daily_activity = DailyActivitySeries.from_daily_activity(daily_activity)
+    totals = _group_by_week(daily_activity)
+
+    total_distance = totals.total_distance.tolist()
+    longest_run = totals.longest_run.tolist()
+    return [
+        WeekSummary(
+            year=int(week) // 100,
+            week_of_year=int(week) % 100,
+            week_start_date=datetime.date.fromordinal(int(totals.start_of_week[i])),
+            longest_run=longest_run[i],
+            total_distance=total_distance[i],
+        )
+        for i, week in enumerate(totals.weeks.tolist())
+    ]
+
+
+def get_weekly_rollups(
+    athlete_id: int, daily_activity: DailyActivitySeries
+) -> List[WeeklyRollup]:
+    """
+    Weekly rollup rows of a daily series, totals match get_weekly_summaries
+
+    :param athlete_id: The ID of the athlete
+    :param daily_activity: DailyActivitySeries
+    :return: A list of WeeklyRollup objects sorted by week
+    """
+    if not len(daily_activity):
+        return []
+
+    totals = _group_by_week(daily_activity)
+    n_weeks = len(totals.weeks)
+    run_count = np.bincount(
+        totals.week_index, weights=daily_activity.activity_count, minlength=n_weeks
+    )
+    moving_time = np.bincount(
+        totals.week_index,
+        weights=daily_activity.moving_time_in_minutes,
+        minlength=n_weeks,
+    )
+
+    total_distance = totals.total_distance.tolist()
+    longest_run = totals.longest_run.tolist()
+    moving_time = round_floats(moving_time).tolist()
+    return [
+        WeeklyRollup(
+            athlete_id=athlete_id,
+            year=int(week) // 100,
+            week_of_year=int(week) % 100,
+            week_start_date=datetime.date.fromordinal(int(totals.start_of_week[i])),
+            total_distance=total_distance[i],
+            longest_run=longest_run[i],
+            run_count=int(run_count[i]),
+            moving_time_in_minutes=moving_time[i],
+        )
+        for i, week in enumerate(totals.weeks.tolist())
+    ]
@@ -0,0 +1,67 @@
+import datetime
+from typing import Sequence
+
+from src.types.activity import DailyActivity
+from src.types.activity_series import DailyActivitySeries
+
+
+class ActivityTimeline:
+    """
+    Daily activity history indexed by date. Dates are a sorted array, so
+    window queries are binary searches returning views of the underlying
+    series instead of scans
+    """
+
+    __slots__ = ("series",)
+
+    def __init__(self, series: DailyActivitySeries):
+        """
+        :param series: daily activity sorted by date
+        """
+        self.series = series
+
+    @classmethod
+    def from_daily_activity(
+        cls, daily_activity: Sequence[DailyActivity]
+    ) -> "ActivityTimeline":
+        """
+        :param daily_activity: DailyActivitySeries or list of DailyActivity objects
+        :return: ActivityTimeline
+        """
+        if not isinstance(daily_activity, DailyActivitySeries):
+            daily_activity = DailyActivitySeries.from_daily_activity(daily_activity)
+        return cls(daily_activity)
+
+    def __len__(self) -> int:
+        return len(self.series)
+
+    @property
+    def end_date(self) -> datetime.date:
+        """Last day of the timeline"""
+        return datetime.date.fromordinal(int(self.series.ordinals[-1]))
+
+    def previous_days(
+        self, date: datetime.date, n_days: int = 7
+    ) -> DailyActivitySeries:
+        """
+        Days strictly within the n_days before date, date itself excluded
+
+        :param date: reference day
+        :param n_days: size of the window
+        :return: DailyActivitySeries view
+        """
+        return self.series.between(
+            date - datetime.timedelta(days=n_days - 1),
+            date - datetime.timedelta(days=1),
+        )
+
+    def week_to_date(self, date: datetime.date) -> DailyActivitySeries:
+        """
+        Days of date's ISO week up to and including date
+
+        :param date: reference day
+        :return: DailyActivitySeries view
+        """
+        return self.series.between(
+            date - datetime.timedelta(days=date.weekday()), date
+        )
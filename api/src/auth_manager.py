@@ -1,12 +1,23 @@
 import logging
 import os
+from typing import Tuple
 
 import jwt
 from fastapi import HTTPException, Security
 from fastapi.security import HTTPAuthorizationCredentials, HTTPBearer
-from src import supabase_client
-from src.constants import DEFAULT_ATHLETE_ID, DEFAULT_USER_ID
-from src.types.user import User
+from src import concurrency, supabase_client
+from src.constants import (
+    DEFAULT_ATHLETE_ID,
+    DEFAULT_USER_ID,
+    STRAVA_CLIENT_POOL_SIZE,
+    TOKEN_CACHE_SIZE,
+    TOKEN_EXPIRY_MARGIN,
+)
+from src.rate_limit import RateLimitedSession, StravaRateLimiter
+from src.strava_client_pool import StravaClientPool
+from src.token_cache import TokenCache
+from src.types.concurrency import Dependency
+from src.types.user import StravaToken, User
 from stravalib.client import Client
 
 logger = logging.getLogger(__name__)
@@ -14,7 +25,23 @@ logger.setLevel(logging.INFO)
 logging.getLogger("stravalib.protocol").setLevel(logging.ERROR)
 
 bearer_scheme = HTTPBearer()
-strava_client = Client()
+# one budget per process, shared with other workers via strava_rate_limit
+strava_rate_limiter = StravaRateLimiter(
+    load=lambda: supabase_client.get_strava_rate_limit(),
+    store=lambda rate_limit: supabase_client.upsert_strava_rate_limit(rate_limit),
+)
+strava_client_pool = StravaClientPool(
+    max_size=STRAVA_CLIENT_POOL_SIZE,
+    new_session=lambda: RateLimitedSession(rate_limiter=strava_rate_limiter),
+)
+token_cache = TokenCache(margin=TOKEN_EXPIRY_MARGIN, max_size=TOKEN_CACHE_SIZE)
+# oauth calls are not tied to an athlete, they share one session
+oauth_session = RateLimitedSession(rate_limiter=strava_rate_limiter)
+
+
+def get_oauth_client() -> Client:
+    """A fresh unauthenticated client, refresh_access_token mutates its token"""
+    return Client(requests_session=oauth_session)
 
 
 def generate_jwt(athlete_id: int, expires_at: int) -> str:
@@ -57,7 +84,7 @@ def refresh_and_update_user_token(athlete_id: int, refresh_token: str) -> User:
     :param refresh_token: refresh token for Strava API
     :return: User
     """
-    access_info = strava_client.refresh_access_token(
+    access_info = get_oauth_client().refresh_access_token(
         client_id=os.environ["STRAVA_CLIENT_ID"],
         client_secret=os.environ["STRAVA_CLIENT_SECRET"],
         refresh_token=refresh_token,
@@ -88,32 +115,21 @@ def refresh_and_update_user_token(athlete_id: int, refresh_token: str) -> User:
     return user
 
 
-def validate_and_refresh_token(token: str) -> int:
+def validate_token(token: str) -> Tuple[int, bool]:
     """
-    Validate and refresh the user's credentials in DB
+    Validate the user's JWT, an expired token is valid but must be refreshed
 
     :param token: JWT token
-    :return: athlete_id
+    :return: athlete_id and whether the token expired
     """
     try:
-        athlete_id = decode_jwt(token)
+        return decode_jwt(token), False
     except jwt.ExpiredSignatureError:
         try:
-            # If the token is expired, decode athlete_id and refresh
-            athlete_id = decode_jwt(token, verify_exp=False)
-            user = supabase_client.get_user(athlete_id)
-            refresh_and_update_user_token(
-                athlete_id=athlete_id, refresh_token=user.refresh_token
-            )
+            return decode_jwt(token, verify_exp=False), True
         except jwt.DecodeError:
             logger.error("Invalid JWT token")
             raise HTTPException(status_code=401, detail="Invalid JWT token")
-        except Exception as e:
-            logger.error(
-                f"Unknown error validating and refreshing token: {e}",
-                exc_info=True,
-            )
-            raise HTTPException(status_code=500, detail="Internal server error")
     except jwt.DecodeError:
         logger.error("Invalid JWT token")
         raise HTTPException(status_code=401, detail="Invalid JWT token")
@@ -124,6 +140,38 @@ def validate_and_refresh_token(token: str) -> int:
         )
         raise HTTPException(status_code=500, detail="Internal server error")
 
+
+def refresh_expired_token(athlete_id: int) -> None:
+    """
+    Refresh the credentials in DB of a user whose JWT expired
+
+    :param athlete_id: strava internal identifier
+    """
+    try:
+        user = supabase_client.get_user(athlete_id)
+        token_cache.set(
+            refresh_and_update_user_token(
+                athlete_id=athlete_id, refresh_token=user.refresh_token
+            )
+        )
+    except Exception as e:
+        logger.error(
+            f"Unknown error validating and refreshing token: {e}",
+            exc_info=True,
+        )
+        raise HTTPException(status_code=500, detail="Internal server error")
+
+
+def validate_and_refresh_token(token: str) -> int:
+    """
+    Validate and refresh the user's credentials in DB
+
+    :param token: JWT token
+    :return: athlete_id
+    """
+    athlete_id, is_expired = validate_token(token)
+    if is_expired:
+        refresh_expired_token(athlete_id)
     return athlete_id
 
 
@@ -131,12 +179,20 @@ async def validate_user(
     credentials: HTTPAuthorizationCredentials = Security(bearer_scheme),
 ) -> User:
     """
-    Dependency that validates the JWT token from the Authorization header
+    Dependency that validates the JWT token from the Authorization header.
+    Validation holds no dependency slot so API requests never queue behind
+    nightly Strava syncs, only an expired token's refresh takes a Strava slot
 
     :param credentials: Bearer token credentials
     :return: User
     """
-    athlete_id = validate_and_refresh_token(credentials.credentials)
+    athlete_id, is_expired = await concurrency.offload(
+        validate_token, credentials.credentials
+    )
+    if is_expired:
+        await concurrency.run_in_thread(
+            Dependency.STRAVA, refresh_expired_token, athlete_id
+        )
     if athlete_id is None:
         logger.error("Invalid authentication credentials")
         raise HTTPException(
@@ -145,34 +201,42 @@ async def validate_user(
     return supabase_client.get_user(athlete_id)
 
 
-def authenticate_athlete(athlete_id: int) -> User:
+def authenticate_athlete(athlete_id: int) -> StravaToken:
     """
-    Authenticate athlete with valid token, refresh if necessary
+    Authenticate athlete with valid token, refresh if it expires within
+    TOKEN_EXPIRY_MARGIN. Concurrent callers share a single refresh
 
     :param athlete_id: strava internal identifier
-    :return: User
+    :return: StravaToken
     """
-    user = supabase_client.get_user(athlete_id)
-    # if datetime_now_est() < utils.make_tz_aware(user.expires_at):
-    #     return user
-    return refresh_and_update_user_token(athlete_id, user.refresh_token)
+    return token_cache.get_or_refresh(
+        athlete_id,
+        load=supabase_client.get_user,
+        refresh=lambda token: refresh_and_update_user_token(
+            athlete_id, token.refresh_token
+        ),
+    )
 
 
-def get_configured_strava_client(user: User) -> Client:
-    strava_client.access_token = user.access_token
-    strava_client.refresh_token = user.refresh_token
-    strava_client.token_expires_at = user.expires_at
-    return strava_client
+def get_configured_strava_client(token: StravaToken) -> Client:
+    """
+    The athlete's pooled client, isolated from other athletes' clients so
+    concurrent updates cannot swap tokens mid-flight
+
+    :param token: StravaToken
+    :return: Client
+    """
+    return strava_client_pool.get(token)
 
 
 def get_strava_client(athlete_id: int) -> Client:
     """Interface for retrieving a Strava client with valid authentication"""
-    user = authenticate_athlete(athlete_id)
-    return get_configured_strava_client(user)
+    token = authenticate_athlete(athlete_id)
+    return get_configured_strava_client(token)
 
 
 def get_strava_token(code: str) -> dict:
-    return strava_client.exchange_code_for_token(
+    return get_oauth_client().exchange_code_for_token(
         client_id=os.environ["STRAVA_CLIENT_ID"],
         client_secret=os.environ["STRAVA_CLIENT_SECRET"],
         code=code,
@@ -188,7 +252,9 @@ def strava_authenticate(code: str) -> User:
     :return: User
     """
     token = get_strava_token(code)
-    strava_client.access_token = token["access_token"]
+    strava_client = Client(
+        access_token=token["access_token"], requests_session=oauth_session
+    )
     strava_client.refresh_token = token["refresh_token"]
     strava_client.token_expires_at = token["expires_at"]
 
@@ -216,6 +282,8 @@ def strava_authenticate(code: str) -> User:
     )
 
     supabase_client.upsert_user(user)
+    # the cached token of a re-authenticating athlete may have been revoked
+    token_cache.set(user)
     return {
         "success": True,
         "jwt_token": user.jwt_token,
@@ -0,0 +1,264 @@
+import datetime
+import json
+import os
+import threading
+import time
+from collections import OrderedDict
+from typing import Any, Callable, Hashable, Optional, Union
+
+
+class LRUCache:
+    """
+    Size-bounded in-memory cache, the least recently used entry is evicted
+    once max_size is reached. Optionally reads through to (and writes through
+    to) a persistent backend so entries survive restarts and are shared
+    across workers. Safe to share between threads, the backend is called
+    outside the lock
+    """
+
+    def __init__(
+        self,
+        max_size: int,
+        load: Optional[Callable[[Hashable], Optional[Any]]] = None,
+        store: Optional[Callable[[Hashable, Any], None]] = None,
+    ):
+        """
+        :param max_size: max number of entries held in memory
+        :param load: fetch a value from the persistent backend, None if missing
+        :param store: write a value to the persistent backend
+        """
+        if max_size <= 0:
+            raise ValueError("max_size must be positive")
+        self.max_size = max_size
+        self._load = load
+        self._store = store
+        self._entries: OrderedDict = OrderedDict()
+        self._lock = threading.Lock()
+
+    def __len__(self) -> int:
+        return len(self._entries)
+
+    def __contains__(self, key: Hashable) -> bool:
+        return key in self._entries
+
+    def _remember(self, key: Hashable, value: Any) -> None:
+        with self._lock:
+            self._entries[key] = value
+            self._entries.move_to_end(key)
+            while len(self._entries) > self.max_size:
+                self._entries.popitem(last=False)
+
+    def get(self, key: Hashable) -> Optional[Any]:
+        """
+        Get a value from memory, falling back to the persistent backend
+
+        :param key: cache key
+        :return: cached value, or None on a miss
+        """
+        with self._lock:
+            if key in self._entries:
+                self._entries.move_to_end(key)
+                return self._entries[key]
+
+        if self._load is None:
+            return None
+        value = self._load(key)
+        if value is not None:
+            self._remember(key, value)
+        return value
+
+    def set(self, key: Hashable, value: Any) -> None:
+        """
+        Cache a value in memory and in the persistent backend
+
+        :param key: cache key
+        :param value: value to cache, must not be None
+        """
+        self._remember(key, value)
+        if self._store is not None:
+            self._store(key, value)
+
+    def get_or_compute(self, key: Hashable, compute: Callable[[], Any]) -> Any:
+        """
+        Get a cached value or compute and cache it on a miss
+
+        :param key: cache key
+        :param compute: produces the value on a miss
+        :return: cached or freshly computed value
+        """
+        value = self.get(key)
+        if value is None:
+            value = compute()
+            self.set(key, value)
+        return value
+
+    def evict(self, key: Hashable) -> None:
+        """Drop a key from memory, the persistent backend is left untouched"""
+        with self._lock:
+            self._entries.pop(key, None)
+
+    def clear(self) -> None:
+        """Drop all in-memory entries"""
+        with self._lock:
+            self._entries.clear()
+
+
+class DiskCache:
+    """
+    Size-bounded cache of JSON values on disk, one file per key, so entries
+    survive restarts. Reads refresh a file's mtime and the least recently
+    used file is evicted once max_size is reached
+    """
+
+    def __init__(self, directory: str, max_size: int):
+        """
+        :param directory: where entries are written, created if missing
+        :param max_size: max number of entries held on disk
+        """
+        if max_size <= 0:
+            raise ValueError("max_size must be positive")
+        self.directory = directory
+        self.max_size = max_size
+        os.makedirs(directory, exist_ok=True)
+
+    def _path(self, key: str) -> str:
+        return os.path.join(self.directory, f"{key}.json")
+
+    def _paths(self) -> list:
+        return [
+            os.path.join(self.directory, name)
+            for name in os.listdir(self.directory)
+            if name.endswith(".json")
+        ]
+
+    def __len__(self) -> int:
+        return len(self._paths())
+
+    def __contains__(self, key: str) -> bool:
+        return os.path.exists(self._path(key))
+
+    def get(self, key: str) -> Optional[Any]:
+        """
+        :param key: cache key, must be a valid file name (e.g. a hex digest)
+        :return: cached value, or None on a miss
+        """
+        path = self._path(key)
+        try:
+            with open(path) as f:
+                value = json.load(f)
+            os.utime(path)
+        except (FileNotFoundError, json.JSONDecodeError):
+            return None
+        return value
+
+    def set(self, key: str, value: Any) -> None:
+        """
+        :param key: cache key, must be a valid file name (e.g. a hex digest)
+        :param value: JSON serializable value, must not be None
+        """
+        # write then rename, readers never see a partial file. The tmp file is
+        # unique per process and thread, concurrent writers of a key each
+        # rename a complete file
+        tmp_path = f"{self._path(key)}.{os.getpid()}.{threading.get_ident()}.tmp"
+        with open(tmp_path, "w") as f:
+            json.dump(value, f)
+        os.replace(tmp_path, self._path(key))
+
+        paths = self._paths()
+        if len(paths) <= self.max_size:
+            return
+
+        # other workers sharing the directory may remove files concurrently
+        mtimes = {}
+        for path in paths:
+            try:
+                mtimes[path] = os.path.getmtime(path)
+            except FileNotFoundError:
+                pass
+        by_age = sorted(mtimes, key=mtimes.get)
+        for path in by_age[: len(by_age) - self.max_size]:
+            self._remove(path)
+
+    @staticmethod
+    def _remove(path: str) -> None:
+        try:
+            os.remove(path)
+        except FileNotFoundError:
+            pass
+
+    def evict(self, key: str) -> None:
+        """Drop a key from disk"""
+        self._remove(self._path(key))
+
+    def clear(self) -> None:
+        """Drop all entries"""
+        for path in self._paths():
+            self._remove(path)
+
+
+class TTLCache:
+    """
+    Expires the entries of a backend (LRUCache or DiskCache) ttl after they
+    were set, and counts hits and misses
+    """
+
+    def __init__(self, backend: Union[LRUCache, DiskCache], ttl: datetime.timedelta):
+        """
+        :param backend: holds the entries and bounds their number
+        :param ttl: how long an entry is served after it was set
+        """
+        self.backend = backend
+        self.ttl = ttl
+        self.hits = 0
+        self.misses = 0
+
+    def __len__(self) -> int:
+        return len(self.backend)
+
+    def get(self, key: Hashable) -> Optional[Any]:
+        """
+        :param key: cache key
+        :return: cached value, or None on a miss or if the entry expired
+        """
+        entry = self.backend.get(key)
+        if entry is not None:
+            stored_at, value = entry
+            if time.time() - stored_at <= self.ttl.total_seconds():
+                self.hits += 1
+                return value
+            self.backend.evict(key)
+        self.misses += 1
+        return None
+
+    def set(self, key: Hashable, value: Any) -> None:
+        """
+        :param key: cache key
+        :param value: value to cache, must not be None
+        """
+        # a list rather than a tuple so entries round trip through JSON
+        self.backend.set(key, [time.time(), value])
+
+    def evict(self, key: Hashable) -> None:
+        """Drop a key from the backend"""
+        self.backend.evict(key)
+
+    def clear(self) -> None:
+        """Drop all entries"""
+        self.backend.clear()
+
+    def reset_stats(self) -> None:
+        """Restart counting hits and misses, e.g. at the start of a run"""
+        self.hits = 0
+        self.misses = 0
+
+    def stats(self) -> dict:
+        """
+        :return: hits, misses, hit_rate and number of entries held
+        """
+        lookups = self.hits + self.misses
+        return {
+            "hits": self.hits,
+            "misses": self.misses,
+            "hit_rate": self.hits / lookups if lookups else 0.0,
+            "size": len(self),
+        }
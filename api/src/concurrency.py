@@ -0,0 +1,130 @@
+import asyncio
+import contextvars
+import functools
+from concurrent.futures import ThreadPoolExecutor
+from contextlib import asynccontextmanager, contextmanager
+from typing import Callable, Dict, Optional, TypeVar
+
+from src.constants import (
+    DEPENDENCY_CONCURRENCY_LIMITS,
+    IO_THREAD_POOL_SIZE,
+    MAX_CONCURRENT_REQUESTS_PER_ATHLETE,
+)
+from src.types.concurrency import Dependency
+
+_dependency_limits: Dict[Dependency, int] = {
+    Dependency(name): value for name, value in DEPENDENCY_CONCURRENCY_LIMITS.items()
+}
+_dependency_semaphores: Dict[Dependency, asyncio.Semaphore] = {}
+_max_requests_per_athlete = MAX_CONCURRENT_REQUESTS_PER_ATHLETE
+
+# blocking clients (stravalib, supabase) run here so the event loop stays free
+_io_executor = ThreadPoolExecutor(
+    max_workers=IO_THREAD_POOL_SIZE, thread_name_prefix="io"
+)
+
+T = TypeVar("T")
+
+_current_athlete_id: contextvars.ContextVar[Optional[int]] = contextvars.ContextVar(
+    "current_athlete_id", default=None
+)
+_athlete_semaphore: contextvars.ContextVar[Optional[asyncio.Semaphore]] = (
+    contextvars.ContextVar("athlete_semaphore", default=None)
+)
+
+
+def get_limits() -> Dict[str, int]:
+    """
+    Current in-flight limits, helpful for run reports
+
+    :return: mapping of dependency name (and "per_athlete") to limit
+    """
+    limits = {str(dependency): value for dependency, value in _dependency_limits.items()}
+    limits["per_athlete"] = _max_requests_per_athlete
+    return limits
+
+
+def get_current_athlete_id() -> Optional[int]:
+    """The athlete whose pipeline is running in the current context, if any"""
+    return _current_athlete_id.get()
+
+
+@contextmanager
+def athlete_context(athlete_id: int):
+    """
+    Scope all dependency calls made within this context (including tasks
+    spawned from it) to a single athlete's in-flight limit
+
+    :param athlete_id: strava internal identifier
+    """
+    athlete_id_token = _current_athlete_id.set(athlete_id)
+    semaphore_token = _athlete_semaphore.set(
+        asyncio.Semaphore(_max_requests_per_athlete)
+    )
+    try:
+        yield
+    finally:
+        _athlete_semaphore.reset(semaphore_token)
+        _current_athlete_id.reset(athlete_id_token)
+
+
+def _get_dependency_semaphore(dependency: Dependency) -> asyncio.Semaphore:
+    if dependency not in _dependency_semaphores:
+        _dependency_semaphores[dependency] = asyncio.Semaphore(
+            _dependency_limits[dependency]
+        )
+    return _dependency_semaphores[dependency]
+
+
+@asynccontextmanager
+async def athlete_limit():
+    """Hold one of the current athlete's slots, if any athlete is in context"""
+    athlete_semaphore = _athlete_semaphore.get()
+    if athlete_semaphore is None:
+        yield
+    else:
+        async with athlete_semaphore:
+            yield
+
+
+@asynccontextmanager
+async def limit(dependency: Dependency):
+    """
+    Hold a slot for a call to an external dependency. The athlete slot is taken
+    first so one athlete cannot tie up global slots while waiting on itself
+
+    :param dependency: the external service being called
+    """
+    async with athlete_limit():
+        async with _get_dependency_semaphore(dependency):
+            yield
+
+
+async def offload(func: Callable[..., T], *args, **kwargs) -> T:
+    """
+    Await a blocking call on the bounded thread pool without taking any slot,
+    for short local work (e.g. JWT validation). Context variables carry over
+
+    :param func: blocking callable
+    :return: the result of func(*args, **kwargs)
+    """
+    context = contextvars.copy_context()
+    return await asyncio.get_running_loop().run_in_executor(
+        _io_executor, functools.partial(context.run, func, *args, **kwargs)
+    )
+
+
+async def run_in_thread(
+    dependency: Dependency, func: Callable[..., T], *args, **kwargs
+) -> T:
+    """
+    Await a blocking call to an external dependency without freezing the event
+    loop. The call runs on a bounded thread pool while holding the dependency's
+    (and the current athlete's) slot, context variables carry over
+
+    :param dependency: the external service being called
+    :param func: blocking callable
+    :return: the result of func(*args, **kwargs)
+    """
+    async with limit(dependency):
+        return await offload(func, *args, **kwargs)
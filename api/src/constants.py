@@ -1,3 +1,5 @@
+import datetime
+
 COACH_ROLE = "You are a talented running coach with years of experience. You have been hired by a client to help them improve their running performance. Note: convert pace values where applicable e.g. 7.5 -> 7m 30s."
 
 METERS_PER_MILE = 1609.34
@@ -10,3 +12,77 @@ DEFAULT_USER_ID = "default"
 DEFAULT_JWT_TOKEN = "default"
 
 OBSERVE_FILE = "observe.jsonl"
+
+# identical prompts (retries, overlapping webhook and nightly runs, repeated
+# refreshes) are answered from the cache, only for these generations
+LLM_CACHED_GENERATIONS = frozenset(
+    {
+        "gen_coaches_notes",
+        "gen_pseudo_training_week",
+        "gen_training_week",
+        "gen_training_plan",
+        "gen_training_plan_week",
+    }
+)
+LLM_CACHE_SIZE = 2048
+LLM_CACHE_TTL = datetime.timedelta(hours=12)
+
+# per model caps enforced by llm.governor, OpenAI requests take no dependency
+# slot below. Tokens are estimated up front and corrected with the reported usage
+OPENAI_MODEL_LIMITS = {
+    "gpt-4o": {"max_in_flight": 16, "tokens_per_minute": 450_000},
+    "gpt-4o-mini": {"max_in_flight": 32, "tokens_per_minute": 2_000_000},
+}
+OPENAI_DEFAULT_MODEL_LIMITS = {"max_in_flight": 16, "tokens_per_minute": 450_000}
+OPENAI_ESTIMATED_COMPLETION_TOKENS = 1000
+
+MAX_CONCURRENT_USERS = 8
+MAX_CONCURRENT_REQUESTS_PER_ATHLETE = 4
+DEPENDENCY_CONCURRENCY_LIMITS = {"strava": 8, "supabase": 16}
+IO_THREAD_POOL_SIZE = 32
+
+ATHLETE_LEASE_SECONDS = 15 * 60
+# held leases are renewed this often, an update can outlast ATHLETE_LEASE_SECONDS
+# (e.g. STRAVA_MAX_BACKOFF_SECONDS of retries), only a dead worker's lease expires
+ATHLETE_LEASE_RENEW_SECONDS = 60
+# leases of older runs are deleted at the start of each run
+ATHLETE_LEASE_RETENTION_DAYS = 14
+# only today's run events affect a run, older ones are deleted at its start
+RUN_EVENT_RETENTION_DAYS = 2
+MAX_UPDATE_ATTEMPTS = 3
+
+NIGHTLY_DEADLINE_HOUR = 23
+# a running update_run bumps updated_at at least this often, rows silent for
+# UPDATE_RUN_STALE_SECONDS belong to a job that died (e.g. container restart)
+UPDATE_RUN_HEARTBEAT_SECONDS = 60
+UPDATE_RUN_STALE_SECONDS = 5 * 60
+DEFAULT_UPDATE_SECONDS = 60.0
+RACE_PRIORITY_WINDOW_DAYS = 16 * 7
+DEFERRABLE_PRIORITY = 1.0
+
+SPANS_FILE = "spans.jsonl"
+
+# re-fetch this much history before the sync watermark to pick up late uploads
+ACTIVITY_SYNC_OVERLAP_DAYS = 3
+# API reads serve the activity store as is while its watermark is this recent
+ACTIVITY_SYNC_MAX_AGE = datetime.timedelta(days=1)
+
+# detailed activities (incl. splits) never change once an activity is uploaded
+DETAILED_ACTIVITY_CACHE_SIZE = 4096
+
+# Strava's default application limits, used until headers report the real ones
+STRAVA_SHORT_LIMIT = 200
+STRAVA_LONG_LIMIT = 2000
+STRAVA_BURST = 10
+STRAVA_RATE_LIMIT_SYNC_SECONDS = 5.0
+STRAVA_MAX_RETRIES = 3
+STRAVA_BACKOFF_SECONDS = 2.0
+STRAVA_MAX_BACKOFF_SECONDS = 15 * 60
+STRAVA_CLIENT_POOL_SIZE = 64
+TOKEN_EXPIRY_MARGIN = datetime.timedelta(minutes=10)
+TOKEN_CACHE_SIZE = 1024
+
+# activity history is fetched as concurrent sub-ranges of this many days
+STRAVA_PAGE_SIZE = 200
+STRAVA_HISTORY_WINDOW_DAYS = 91
+STRAVA_HISTORY_MAX_WORKERS = 8
@@ -1,8 +1,23 @@
 from math import floor
 
-from src.constants import FEET_PER_METER, METERS_PER_MILE
+from src import supabase_client
+from src.cache import LRUCache
+from src.constants import (
+    DETAILED_ACTIVITY_CACHE_SIZE,
+    FEET_PER_METER,
+    METERS_PER_MILE,
+)
 from src.types.detailed_activity import DetailedActivity, Speed, Split
 
+# keyed by activity id, backed by the detailed_activity table
+detailed_activity_cache = LRUCache(
+    max_size=DETAILED_ACTIVITY_CACHE_SIZE,
+    load=lambda activity_id: supabase_client.get_detailed_activity(activity_id),
+    store=lambda activity_id, detailed_activity: (
+        supabase_client.upsert_detailed_activity(activity_id, detailed_activity)
+    ),
+)
+
 
 def compute_activity_metrics(activity):
 
@@ -43,9 +58,9 @@ def compute_activity_metrics(activity):
     }
 
 
-def get_detailed_activity(strava_client, activity_id):
+def fetch_detailed_activity(strava_client, activity_id):
     """
-    Get detailed activity metrics
+    Fetch an activity from Strava and compute its detailed metrics
 
     :param strava_client: Strava client
     :param activity_id: Strava activity ID
@@ -60,3 +75,17 @@ def get_detailed_activity(strava_client, activity_id):
         Split(**compute_activity_metrics(split)) for split in activity.splits_standard
     ]
     return DetailedActivity(**compute_activity_metrics(activity), splits=splits)
+
+
+def get_detailed_activity(strava_client, activity_id):
+    """
+    Get detailed activity metrics. Splits of an uploaded activity never change,
+    so each activity is only fetched from Strava once and cached afterwards
+
+    :param strava_client: Strava client
+    :param activity_id: Strava activity ID
+    :return: DetailedActivity object
+    """
+    return detailed_activity_cache.get_or_compute(
+        activity_id, lambda: fetch_detailed_activity(strava_client, activity_id)
+    )
@@ -1,16 +1,68 @@
+import hashlib
 import json
+import logging
+import os
 import time
 from typing import Dict, List, Optional, Type
 
+import orjson
 from dotenv import load_dotenv
 from openai import AsyncOpenAI
 from openai.types.chat.chat_completion import ChatCompletion
 from openai.types.chat.chat_completion_message import ChatCompletionMessage
 from pydantic import BaseModel, ValidationError
-from src.constants import OBSERVE_FILE
+from src import concurrency
+from src.cache import DiskCache, LRUCache, TTLCache
+from src.constants import (
+    LLM_CACHE_SIZE,
+    LLM_CACHE_TTL,
+    LLM_CACHED_GENERATIONS,
+    OBSERVE_FILE,
+    OPENAI_DEFAULT_MODEL_LIMITS,
+    OPENAI_ESTIMATED_COMPLETION_TOKENS,
+    OPENAI_MODEL_LIMITS,
+)
+from src.llm_governor import ModelLimits, OpenAIGovernor, estimate_tokens
 
 load_dotenv()
 client = AsyncOpenAI()
+logger = logging.getLogger(__name__)
+
+# in memory by default, set LLM_CACHE_DIR to keep completions across restarts
+completion_cache = TTLCache(
+    backend=(
+        DiskCache(os.environ["LLM_CACHE_DIR"], max_size=LLM_CACHE_SIZE)
+        if os.environ.get("LLM_CACHE_DIR")
+        else LRUCache(max_size=LLM_CACHE_SIZE)
+    ),
+    ttl=LLM_CACHE_TTL,
+)
+
+# shared by every OpenAI request of the process
+governor = OpenAIGovernor(
+    model_limits={
+        model: ModelLimits(**limits) for model, limits in OPENAI_MODEL_LIMITS.items()
+    },
+    default_limits=ModelLimits(**OPENAI_DEFAULT_MODEL_LIMITS),
+)
+
+
+def get_completion_cache_key(
+    messages: List[ChatCompletionMessage],
+    model: str,
+    response_format: Optional[Dict] = None,
+) -> str:
+    """
+    Content address of a completion request
+
+    :param messages: chat messages
+    :param model: model name
+    :param response_format: OpenAI response_format, if any
+    :return: sha256 hex digest of the request
+    """
+    request = {"model": model, "messages": messages, "response_format": response_format}
+    payload = orjson.dumps(request, option=orjson.OPT_SORT_KEYS)
+    return hashlib.sha256(payload).hexdigest()
 
 
 def observe(
@@ -38,12 +90,13 @@ def observe(
         )
 
 
-async def _get_completion(
+async def _request_completion(
     messages: List[ChatCompletionMessage],
-    model: str = "gpt-4o",
-    response_format: Optional[Dict] = None,
-    generation_name: Optional[str] = None,
-):
+    model: str,
+    response_format: Optional[Dict],
+    generation_name: Optional[str],
+) -> ChatCompletion:
+    """Send a single request to OpenAI and record it"""
     start_time = time.time()
     response = await client.chat.completions.create(
         model=model, messages=messages, response_format=response_format
@@ -55,8 +108,39 @@ async def _get_completion(
         response=response,
         duration=duration,
     )
+    return response
+
 
-    return response.choices[0].message.content
+async def _get_completion(
+    messages: List[ChatCompletionMessage],
+    model: str = "gpt-4o",
+    response_format: Optional[Dict] = None,
+    generation_name: Optional[str] = None,
+):
+    cache_key = None
+    if generation_name in LLM_CACHED_GENERATIONS:
+        cache_key = get_completion_cache_key(messages, model, response_format)
+        content = completion_cache.get(cache_key)
+        if content is not None:
+            return content
+
+    tokens = estimate_tokens(messages, OPENAI_ESTIMATED_COMPLETION_TOKENS)
+    async with concurrency.athlete_limit():
+        async with governor.acquire(model, tokens) as grant:
+            response = await _request_completion(
+                messages, model, response_format, generation_name
+            )
+            if response.usage is not None:
+                grant.record_usage(response.usage.total_tokens)
+
+    content = response.choices[0].message.content
+    if cache_key is not None and content is not None:
+        # the completion is paid for, a failing cache must not lose it
+        try:
+            completion_cache.set(cache_key, content)
+        except Exception as e:
+            logger.warning(f"Failed to cache completion of {generation_name}: {e}")
+    return content
 
 
 async def get_completion(
@@ -119,6 +203,13 @@ async def get_completion_json(
             response = json.loads(response_str)
             return response_model(**response)
         except (json.JSONDecodeError, ValidationError) as e:
+            # never serve an unparseable response again, the retry must reach the LLM
+            try:
+                completion_cache.evict(
+                    get_completion_cache_key(messages, model, {"type": "json_object"})
+                )
+            except Exception as cache_error:
+                logger.warning(f"Failed to evict cached completion: {cache_error}")
             if attempt == max_retries - 1:
                 raise Exception(
                     f"Failed to parse JSON after {max_retries} attempts: {e}"
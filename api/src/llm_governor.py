@@ -0,0 +1,229 @@
+import asyncio
+import time
+from collections import OrderedDict, deque
+from contextlib import asynccontextmanager
+from typing import Deque, Dict, Hashable, List, NamedTuple, Optional
+
+from openai.types.chat.chat_completion_message import ChatCompletionMessage
+from src import concurrency
+
+TOKEN_WINDOW_SECONDS = 60.0
+
+
+class ModelLimits(NamedTuple):
+    max_in_flight: int
+    tokens_per_minute: int
+
+
+def estimate_tokens(
+    messages: List[ChatCompletionMessage], completion_tokens: int
+) -> int:
+    """
+    Rough token count of a request, about 4 characters per token
+
+    :param messages: chat messages
+    :param completion_tokens: expected size of the completion
+    :return: estimated prompt plus completion tokens
+    """
+    prompt_chars = sum(len(message["content"]) for message in messages)
+    return prompt_chars // 4 + completion_tokens
+
+
+class _Waiter:
+    __slots__ = ("future", "tokens", "usage")
+
+    def __init__(self, future: asyncio.Future, tokens: int):
+        self.future = future
+        self.tokens = tokens
+        # [granted_at, tokens] once granted, counted in the model's token window
+        self.usage: Optional[list] = None
+
+
+class _ModelLane:
+    """Queues, in-flight count and token window of a single model"""
+
+    def __init__(self, limits: ModelLimits):
+        self.limits = limits
+        self.in_flight = 0
+        # athlete -> waiters, rotated so athletes take turns
+        self.queues: "OrderedDict[Hashable, Deque[_Waiter]]" = OrderedDict()
+        self.usage: Deque[list] = deque()
+        self.wakeup: Optional[asyncio.TimerHandle] = None
+        self.max_queue_depth = 0
+
+    @property
+    def queue_depth(self) -> int:
+        return sum(len(queue) for queue in self.queues.values())
+
+    def tokens_in_window(self, now: float) -> int:
+        while self.usage and self.usage[0][0] <= now - TOKEN_WINDOW_SECONDS:
+            self.usage.popleft()
+        return sum(tokens for _, tokens in self.usage)
+
+    def seconds_until_tokens(self, now: float, tokens: int) -> float:
+        """How long until the window has room for tokens more"""
+        used = self.tokens_in_window(now)
+        for granted_at, granted_tokens in self.usage:
+            used -= granted_tokens
+            if used + tokens <= self.limits.tokens_per_minute:
+                return granted_at + TOKEN_WINDOW_SECONDS - now
+        # larger than the whole budget, wait for the window to empty
+        return self.usage[-1][0] + TOKEN_WINDOW_SECONDS - now if self.usage else 0.0
+
+
+class Grant:
+    """A granted slot, reports the tokens the request actually used"""
+
+    def __init__(self, waiter: _Waiter):
+        self._waiter = waiter
+
+    def record_usage(self, total_tokens: int) -> None:
+        """
+        Replace the estimate with the usage reported by OpenAI
+
+        :param total_tokens: prompt plus completion tokens of the response
+        """
+        self._waiter.usage[1] = total_tokens
+
+
+class OpenAIGovernor:
+    """
+    Process-wide gate for OpenAI requests. Caps in-flight requests and
+    estimated tokens per minute per model, and hands out free slots to
+    athletes in turn, so one athlete's burst (e.g. a week-by-week training
+    plan) queues behind other athletes' requests instead of starving them
+    """
+
+    def __init__(
+        self,
+        model_limits: Dict[str, ModelLimits],
+        default_limits: ModelLimits,
+    ):
+        """
+        :param model_limits: limits per model name
+        :param default_limits: limits of models not in model_limits
+        """
+        self.model_limits = dict(model_limits)
+        self.default_limits = default_limits
+        self._lanes: Dict[str, _ModelLane] = {}
+
+    def _lane(self, model: str) -> _ModelLane:
+        if model not in self._lanes:
+            self._lanes[model] = _ModelLane(
+                self.model_limits.get(model, self.default_limits)
+            )
+        return self._lanes[model]
+
+    def configure(self, model: str, limits: ModelLimits) -> None:
+        """
+        Override a model's limits, queued requests are granted under the new ones
+
+        :param model: model name
+        :param limits: new limits
+        """
+        self.model_limits[model] = limits
+        self._lane(model).limits = limits
+        self._dispatch(self._lane(model))
+
+    def queue_depth(self, model: Optional[str] = None) -> int:
+        """
+        :param model: model name, all models if None
+        :return: number of requests waiting for a slot
+        """
+        if model is not None:
+            return self._lane(model).queue_depth
+        return sum(lane.queue_depth for lane in self._lanes.values())
+
+    def stats(self) -> Dict[str, dict]:
+        """
+        :return: per model queue depth (current and max), in-flight requests
+            and tokens used in the last minute
+        """
+        now = time.monotonic()
+        return {
+            model: {
+                "queue_depth": lane.queue_depth,
+                "max_queue_depth": lane.max_queue_depth,
+                "in_flight": lane.in_flight,
+                "tokens_last_minute": lane.tokens_in_window(now),
+            }
+            for model, lane in self._lanes.items()
+        }
+
+    def reset_max_queue_depth(self) -> None:
+        """Start tracking max queue depth afresh, e.g. at the start of a run"""
+        for lane in self._lanes.values():
+            lane.max_queue_depth = lane.queue_depth
+
+    def _dispatch(self, lane: _ModelLane) -> None:
+        """Grant free slots to queued requests, one athlete at a time"""
+        if lane.wakeup is not None:
+            lane.wakeup.cancel()
+            lane.wakeup = None
+
+        while lane.queues and lane.in_flight < lane.limits.max_in_flight:
+            athlete_id, queue = next(iter(lane.queues.items()))
+            waiter = queue[0]
+            if waiter.future.done():
+                # cancelled while queued
+                queue.popleft()
+                if not queue:
+                    del lane.queues[athlete_id]
+                continue
+
+            now = time.monotonic()
+            used = lane.tokens_in_window(now)
+            # a request larger than the whole budget still goes once the window is empty
+            if used and used + waiter.tokens > lane.limits.tokens_per_minute:
+                lane.wakeup = asyncio.get_running_loop().call_later(
+                    lane.seconds_until_tokens(now, waiter.tokens) + 0.01,
+                    self._dispatch,
+                    lane,
+                )
+                return
+
+            queue.popleft()
+            if queue:
+                lane.queues.move_to_end(athlete_id)
+            else:
+                del lane.queues[athlete_id]
+            lane.in_flight += 1
+            waiter.usage = [now, waiter.tokens]
+            lane.usage.append(waiter.usage)
+            waiter.future.set_result(None)
+
+    @asynccontextmanager
+    async def acquire(self, model: str, tokens: int):
+        """
+        Wait for a slot for one request to model, queued behind the current
+        athlete's earlier requests and taking turns with other athletes
+
+        :param model: model name
+        :param tokens: estimated tokens of the request
+        :return: Grant, to record the actual token usage
+        """
+        lane = self._lane(model)
+        waiter = _Waiter(asyncio.get_running_loop().create_future(), tokens)
+        athlete_id = concurrency.get_current_athlete_id()
+        lane.queues.setdefault(athlete_id, deque()).append(waiter)
+        self._dispatch(lane)
+        lane.max_queue_depth = max(lane.max_queue_depth, lane.queue_depth)
+
+        try:
+            await waiter.future
+        except asyncio.CancelledError:
+            if waiter.usage is not None:
+                # granted just as the wait was cancelled
+                lane.in_flight -= 1
+                self._dispatch(lane)
+            elif waiter in lane.queues.get(athlete_id, ()):
+                lane.queues[athlete_id].remove(waiter)
+                if not lane.queues[athlete_id]:
+                    del lane.queues[athlete_id]
+            raise
+
+        try:
+            yield Grant(waiter)
+        finally:
+            lane.in_flight -= 1
+            self._dispatch(lane)
@@ -1,6 +1,8 @@
+import datetime
 import logging
 import os
 from typing import Callable, Optional
+from uuid import uuid4
 
 from fastapi import (
     BackgroundTasks,
@@ -12,14 +14,28 @@ from fastapi import (
     Request,
     Response,
 )
-from src import activities, auth_manager, email_manager, supabase_client, utils, webhook
+from src import (
+    activities,
+    auth_manager,
+    concurrency,
+    email_manager,
+    supabase_client,
+    utils,
+    webhook,
+)
 from src.middleware import log_and_handle_errors
+from src.types.concurrency import Dependency
 from src.types.feedback import FeedbackRow
 from src.types.training_plan import TrainingPlan
 from src.types.training_week import FullTrainingWeek
 from src.types.user import User
 from src.types.webhook import StravaEvent
-from src.update_pipeline import refresh_user_data, update_all_users
+from src.types.update_pipeline import UpdateRunProgress
+from src.update_pipeline import (
+    get_update_run_progress,
+    refresh_user_data,
+    run_update_all_users_job,
+)
 
 app = FastAPI()
 
@@ -116,7 +132,12 @@ async def get_profile_v2(user: User = Depends(auth_manager.validate_user)) -> di
     :param user: The authenticated user
     :return: Dictionary containing profile information
     """
-    athlete = auth_manager.get_strava_client(user.athlete_id).get_athlete()
+    strava_client = await concurrency.run_in_thread(
+        Dependency.STRAVA, auth_manager.get_strava_client, user.athlete_id
+    )
+    athlete = await concurrency.run_in_thread(
+        Dependency.STRAVA, strava_client.get_athlete
+    )
     return {
         "success": True,
         "profile": {
@@ -141,9 +162,27 @@ async def get_weekly_summaries(
     :param user: The authenticated user
     :return: List of WeekSummary objects as JSON
     """
-    strava_client = auth_manager.get_strava_client(user.athlete_id)
-    weekly_summaries = activities.get_weekly_summaries(
-        strava_client=strava_client, dt=utils.datetime_now_est()
+    dt = utils.datetime_now_est()
+    start_date = dt - datetime.timedelta(weeks=8)
+    # read from the weekly rollup, Strava is only called when the athlete's
+    # activity store is behind
+    activity_sync = await concurrency.run_in_thread(
+        Dependency.SUPABASE, supabase_client.get_activity_sync, user.athlete_id
+    )
+    if not activities.is_synced(activity_sync, start_date=start_date, dt=dt):
+        strava_client = await concurrency.run_in_thread(
+            Dependency.STRAVA, auth_manager.get_strava_client, user.athlete_id
+        )
+        await concurrency.run_in_thread(
+            Dependency.STRAVA,
+            activities.sync_activities,
+            user.athlete_id,
+            strava_client,
+            start_date=start_date,
+            dt=dt,
+        )
+    weekly_summaries = await concurrency.run_in_thread(
+        Dependency.SUPABASE, activities.get_weekly_summaries, user.athlete_id, dt=dt
     )
     return {
         "success": True,
@@ -205,18 +244,61 @@ async def refresh(
     return {"success": True}
 
 
-@app.post("/update-all-users/")
-async def update_all_users_trigger(request: Request) -> dict:
+def validate_api_key(request: Request) -> None:
     """
-    Trigger nightly updates for all users
-    Protected by API key authentication
+    Dependency that validates the x-api-key header for internal endpoints
+
+    :param request: incoming FastAPI Request object
     """
     api_key = request.headers.get("x-api-key")
     if api_key != os.environ["API_KEY"]:
         raise HTTPException(status_code=403, detail="Invalid API key")
 
-    await update_all_users()
-    return {"success": True}
+
+@app.post("/update-all-users/", dependencies=[Depends(validate_api_key)])
+async def update_all_users_trigger(
+    background_tasks: BackgroundTasks,
+    shard_index: int = 0,
+    shard_count: int = 1,
+) -> dict:
+    """
+    Enqueue nightly updates for all users and return immediately, poll
+    GET /update-all-users/{job_id} for progress
+    Protected by API key authentication
+
+    :param background_tasks: FastAPI background tasks
+    :param shard_index: index of this replica's shard, in [0, shard_count)
+    :param shard_count: total number of shards
+    :return: Success status and job_id
+    """
+    job_id = str(uuid4())
+    supabase_client.insert_update_run(job_id)
+    background_tasks.add_task(
+        run_update_all_users_job,
+        job_id=job_id,
+        shard_index=shard_index,
+        shard_count=shard_count,
+    )
+    return {"success": True, "job_id": job_id}
+
+
+@app.get(
+    "/update-all-users/{job_id}",
+    response_model=UpdateRunProgress,
+    dependencies=[Depends(validate_api_key)],
+)
+async def update_all_users_status(job_id: str) -> UpdateRunProgress:
+    """
+    Progress of a nightly update job
+    Protected by API key authentication
+
+    :param job_id: job_id returned by POST /update-all-users/
+    :return: UpdateRunProgress
+    """
+    try:
+        return get_update_run_progress(job_id)
+    except ValueError:
+        raise HTTPException(status_code=404, detail="Job not found")
 
 
 @app.post("/user/")
@@ -1,10 +1,7 @@
 import datetime
 import logging
-from typing import List
-
-from src import activities, supabase_client
+from src import supabase_client
 from src.training_plan import gen_training_plan_pipeline
-from src.types.activity import DailyActivity
 from src.types.mileage_recommendation import (
     MileageRecommendation,
     MileageRecommendationRow,
@@ -17,14 +14,13 @@ logger.setLevel(logging.INFO)
 
 
 async def gen_mileage_rec_wrapper(
-    user: User, daily_activity: List[DailyActivity], dt: datetime.datetime
+    user: User, dt: datetime.datetime
 ) -> MileageRecommendation:
     """
-    Abstraction for mileage rec generation, either pulled from training plan
-    generation or generated directly from weekly summaries
+    Abstraction for mileage rec generation, pulled from training plan
+    generation over the athlete's weekly rollup
 
     :param user: User object
-    :param daily_activity: List of DailyActivity objects
     :param dt: datetime injection, helpful for testing
     :return: MileageRecommendation used to generate training week
     """
@@ -33,10 +29,7 @@ async def gen_mileage_rec_wrapper(
             "Mileage recommendation can only be generated on Sunday (night) when the week is complete"
         )
 
-    weekly_summaries = activities.get_weekly_summaries(daily_activity=daily_activity)
-    training_plan = await gen_training_plan_pipeline(
-        user=user, weekly_summaries=weekly_summaries, dt=dt
-    )
+    training_plan = await gen_training_plan_pipeline(user=user, dt=dt)
     next_week_plan = training_plan.training_plan_weeks[0]
     return MileageRecommendation(
         thoughts=next_week_plan.notes,
@@ -47,20 +40,16 @@ async def gen_mileage_rec_wrapper(
 
 async def create_new_mileage_recommendation(
     user: User,
-    daily_activity: List[DailyActivity],
     dt: datetime.datetime,
 ) -> MileageRecommendation:
     """
     Creates a new mileage recommendation for the next week
 
     :param user: user entity
-    :param daily_activity: list of daily activity data
     :param dt: datetime injection, helpful for testing
     :return: mileage recommendation entity
     """
-    mileage_recommendation = await gen_mileage_rec_wrapper(
-        user=user, daily_activity=daily_activity, dt=dt
-    )
+    mileage_recommendation = await gen_mileage_rec_wrapper(user=user, dt=dt)
 
     week_of_date = dt + datetime.timedelta(days=1)
 
@@ -81,7 +70,6 @@ async def create_new_mileage_recommendation(
 
 async def get_or_gen_mileage_recommendation(
     user: User,
-    daily_activity: List[DailyActivity],
     exe_type: ExeType,
     dt: datetime,
 ) -> MileageRecommendation:
@@ -89,15 +77,12 @@ async def get_or_gen_mileage_recommendation(
     Executes mileage rec strategy depending on exe type
 
     :param user: user entity
-    :param daily_activity: list of daily activity data
     :param exe_type: new week or mid week
     :param dt: datetime injection, helpful for testing
     :return: mileage recommendation entity
     """
     if exe_type == ExeType.NEW_WEEK:
-        return await create_new_mileage_recommendation(
-            user=user, daily_activity=daily_activity, dt=dt
-        )
+        return await create_new_mileage_recommendation(user=user, dt=dt)
     else:
         mileage_recommendation_row = supabase_client.get_mileage_recommendation(
             athlete_id=user.athlete_id, dt=dt
@@ -0,0 +1,191 @@
+"""
+Fast construction of the internal pydantic models in src/types. Field
+metadata is compiled once per class into a plan, so hot loops neither walk
+__fields__ reflectively nor re-run validation on data we produced ourselves
+(typed Strava models, our own database rows and JSON)
+"""
+
+import datetime
+import functools
+from enum import Enum
+from typing import Any, Callable, Mapping, NamedTuple, Optional, Tuple, Type, TypeVar
+
+from pydantic import BaseModel
+from pydantic.fields import SHAPE_LIST, SHAPE_SINGLETON, ModelField
+
+ModelT = TypeVar("ModelT", bound=BaseModel)
+
+_REQUIRED = object()
+_IMMUTABLE_DEFAULTS = (
+    type(None),
+    bool,
+    int,
+    float,
+    str,
+    Enum,
+    datetime.date,
+    datetime.timedelta,
+)
+
+
+class FieldPlan(NamedTuple):
+    name: str
+    default: Any
+    default_factory: Optional[Callable[[], Any]]
+    allow_none: bool
+    convert: Optional[Callable[[Any], Any]]
+
+
+@functools.lru_cache(maxsize=None)
+def get_rounding_plan(model_cls: Type[BaseModel]) -> Tuple[str, ...]:
+    """
+    Names of the float fields of a model class, computed once per class
+
+    :param model_cls: pydantic model class
+    :return: tuple of field names
+    """
+    return tuple(
+        name
+        for name, field in model_cls.__fields__.items()
+        if isinstance(field.type_, type) and issubclass(field.type_, float)
+    )
+
+
+def round_model_floats(model: ModelT, precision: int = 2) -> ModelT:
+    """
+    Round the float fields of a model in place using its rounding plan
+
+    :param model: pydantic model
+    :param precision: number of decimals
+    :return: the same model
+    """
+    fields = model.__dict__
+    for name in get_rounding_plan(type(model)):
+        value = fields[name]
+        if value is not None:
+            fields[name] = round(value, precision)
+    return model
+
+
+def _to_float(value: Any) -> float:
+    return value if value.__class__ is float else float(value)
+
+
+def _to_datetime(value: Any) -> datetime.datetime:
+    if isinstance(value, str):
+        return datetime.datetime.fromisoformat(value)
+    return value
+
+
+def _to_date(value: Any) -> datetime.date:
+    if isinstance(value, str):
+        return datetime.date.fromisoformat(value)
+    return value
+
+
+def _to_timedelta(value: Any) -> datetime.timedelta:
+    if isinstance(value, datetime.timedelta):
+        return value
+    return datetime.timedelta(seconds=value)
+
+
+def _get_converter(type_: Any) -> Optional[Callable[[Any], Any]]:
+    """Cheap conversion from JSON/database values to a field's type"""
+    if not isinstance(type_, type):
+        return None
+    if issubclass(type_, BaseModel):
+        return lambda value: (
+            value if isinstance(value, type_) else trusted_construct(type_, value)
+        )
+    if issubclass(type_, Enum):
+        return type_
+    if issubclass(type_, bool):
+        return None
+    if issubclass(type_, float):
+        return _to_float
+    # datetime is a subclass of date, check it first
+    if issubclass(type_, datetime.datetime):
+        return _to_datetime
+    if issubclass(type_, datetime.date):
+        return _to_date
+    if issubclass(type_, datetime.timedelta):
+        return _to_timedelta
+    return None
+
+
+def _get_field_plan(name: str, field: ModelField) -> FieldPlan:
+    convert = _get_converter(field.type_)
+    if convert is not None and field.shape == SHAPE_LIST:
+        convert_item = convert
+
+        def convert(values: list) -> list:
+            return [convert_item(value) for value in values]
+
+    elif field.shape != SHAPE_SINGLETON:
+        convert = None
+
+    # mutable defaults are copied per instance, like pydantic does
+    default_factory = field.default_factory
+    if default_factory is None and not isinstance(field.default, _IMMUTABLE_DEFAULTS):
+        default_factory = field.get_default
+
+    return FieldPlan(
+        name=name,
+        default=_REQUIRED if field.required else field.default,
+        default_factory=None if field.required else default_factory,
+        allow_none=field.allow_none,
+        convert=convert,
+    )
+
+
+@functools.lru_cache(maxsize=None)
+def get_construction_plan(model_cls: Type[BaseModel]) -> Tuple[FieldPlan, ...]:
+    """
+    How to build each field of a model class, computed once per class
+
+    :param model_cls: pydantic model class
+    :return: tuple of FieldPlan, one per field
+    """
+    return tuple(
+        _get_field_plan(name, field) for name, field in model_cls.__fields__.items()
+    )
+
+
+def trusted_construct(
+    model_cls: Type[ModelT], values: Mapping[str, Any], coerce: bool = True
+) -> ModelT:
+    """
+    Build a model from values we trust without running pydantic validation.
+    Unknown keys are ignored, missing or None values of non-optional fields
+    fall back to the field default. With coerce, JSON and database values
+    (ISO strings, seconds, nested dicts, enum values) are converted to the
+    field types, otherwise values must already have the right types
+
+    :param model_cls: pydantic model class
+    :param values: field values, e.g. a row, parsed JSON or a model's __dict__
+    :param coerce: convert values to the field types
+    :return: model_cls instance
+    :raises ValueError: if a required field is missing
+    """
+    fields = {}
+    fields_set = set()
+    for plan in get_construction_plan(model_cls):
+        value = values.get(plan.name, _REQUIRED)
+        if value is _REQUIRED or (value is None and not plan.allow_none):
+            if plan.default_factory is not None:
+                value = plan.default_factory()
+            elif plan.default is not _REQUIRED:
+                value = plan.default
+            else:
+                raise ValueError(f"{model_cls.__name__}.{plan.name} is required")
+        else:
+            fields_set.add(plan.name)
+            if coerce and value is not None and plan.convert is not None:
+                value = plan.convert(value)
+        fields[plan.name] = value
+
+    model = model_cls.__new__(model_cls)
+    object.__setattr__(model, "__dict__", fields)
+    object.__setattr__(model, "__fields_set__", fields_set)
+    model._init_private_attributes()
+    return model
@@ -0,0 +1,249 @@
+import datetime
+import logging
+import random
+import threading
+import time
+from typing import Callable, Optional
+
+import requests
+from src.constants import (
+    STRAVA_BACKOFF_SECONDS,
+    STRAVA_BURST,
+    STRAVA_LONG_LIMIT,
+    STRAVA_MAX_BACKOFF_SECONDS,
+    STRAVA_MAX_RETRIES,
+    STRAVA_RATE_LIMIT_SYNC_SECONDS,
+    STRAVA_SHORT_LIMIT,
+)
+from src.types.rate_limit import StravaRateLimit
+from stravalib.exc import RateLimitExceeded
+from stravalib.util.limiter import get_rates_from_response_headers
+
+logger = logging.getLogger(__name__)
+logger.setLevel(logging.INFO)
+
+SHORT_WINDOW = datetime.timedelta(minutes=15)
+
+
+def _now() -> datetime.datetime:
+    return datetime.datetime.now(datetime.timezone.utc)
+
+
+def get_window_starts(dt: datetime.datetime) -> tuple:
+    """
+    Start of Strava's 15 minute and daily windows containing dt, both reset on
+    the clock in UTC
+
+    :param dt: timezone aware datetime
+    :return: (short window start, long window start)
+    """
+    dt = dt.astimezone(datetime.timezone.utc)
+    short_start = dt.replace(
+        minute=dt.minute - dt.minute % 15, second=0, microsecond=0
+    )
+    long_start = dt.replace(hour=0, minute=0, second=0, microsecond=0)
+    return short_start, long_start
+
+
+class TokenBucket:
+    """
+    Thread safe token bucket. Tokens may go negative, each reservation is
+    queued behind the previous ones and told how long to wait
+    """
+
+    def __init__(self, rate: float, capacity: float):
+        """
+        :param rate: tokens added per second
+        :param capacity: max tokens held, i.e. the allowed burst
+        """
+        self.rate = rate
+        self.capacity = capacity
+        self.tokens = capacity
+        self._updated_at = time.monotonic()
+        self._lock = threading.Lock()
+
+    def reserve(self) -> float:
+        """
+        Take a token
+
+        :return: seconds to wait before the token may be used
+        """
+        with self._lock:
+            now = time.monotonic()
+            self.tokens = min(
+                self.capacity, self.tokens + (now - self._updated_at) * self.rate
+            )
+            self._updated_at = now
+            self.tokens -= 1
+            return max(0.0, -self.tokens / self.rate)
+
+
+class StravaRateLimiter:
+    """
+    Paces Strava calls against the application's 15 minute and daily limits.
+    Usage comes from Strava's rate limit headers and is optionally shared with
+    other workers through a persistent backend
+    """
+
+    def __init__(
+        self,
+        load: Optional[Callable[[], Optional[StravaRateLimit]]] = None,
+        store: Optional[Callable[[StravaRateLimit], None]] = None,
+    ):
+        """
+        :param load: read the usage last shared by any worker
+        :param store: share this worker's usage
+        """
+        self._load = load
+        self._store = store
+        self.bucket = TokenBucket(
+            rate=STRAVA_SHORT_LIMIT / SHORT_WINDOW.total_seconds(),
+            capacity=STRAVA_BURST,
+        )
+        self.rate_limit: Optional[StravaRateLimit] = None
+        self._synced_at = 0.0
+        self._lock = threading.Lock()
+
+    def _current_usage(self, now: datetime.datetime) -> StravaRateLimit:
+        """Known usage with counters reset for windows that have rolled over"""
+        rate_limit = self.rate_limit or StravaRateLimit(
+            short_usage=0,
+            long_usage=0,
+            short_limit=STRAVA_SHORT_LIMIT,
+            long_limit=STRAVA_LONG_LIMIT,
+            updated_at=now,
+        )
+        short_start, long_start = get_window_starts(now)
+        if rate_limit.updated_at < short_start:
+            rate_limit = rate_limit.copy(update={"short_usage": 0})
+        if rate_limit.updated_at < long_start:
+            rate_limit = rate_limit.copy(update={"long_usage": 0})
+        return rate_limit
+
+    def _maybe_sync(self) -> None:
+        """Exchange usage with other workers every STRAVA_RATE_LIMIT_SYNC_SECONDS"""
+        if self._load is None or self._store is None:
+            return
+        if time.monotonic() - self._synced_at < STRAVA_RATE_LIMIT_SYNC_SECONDS:
+            return
+        self._synced_at = time.monotonic()
+        try:
+            shared = self._load()
+            with self._lock:
+                if shared is not None and (
+                    self.rate_limit is None
+                    or shared.updated_at > self.rate_limit.updated_at
+                ):
+                    self._set_rate_limit(shared)
+                rate_limit = self.rate_limit
+            if rate_limit is not None and rate_limit is not shared:
+                self._store(rate_limit)
+        except Exception as e:
+            # pacing still works on this worker's own view of usage
+            logger.warning(f"Failed to sync Strava rate limit: {e}")
+
+    def _set_rate_limit(self, rate_limit: StravaRateLimit) -> None:
+        self.rate_limit = rate_limit
+        self.bucket.rate = rate_limit.short_limit / SHORT_WINDOW.total_seconds()
+
+    def seconds_until_available(self) -> float:
+        """
+        Seconds until the current 15 minute window has budget left
+
+        :return: 0 if there is budget left now
+        :raises RateLimitExceeded: if the daily limit is used up
+        """
+        now = _now()
+        usage = self._current_usage(now)
+        short_start, long_start = get_window_starts(now)
+        if usage.long_usage >= usage.long_limit:
+            raise RateLimitExceeded(
+                "Strava daily rate limit exceeded",
+                timeout=(long_start + datetime.timedelta(days=1) - now).total_seconds(),
+                limit=usage.long_limit,
+            )
+        if usage.short_usage >= usage.short_limit:
+            return (short_start + SHORT_WINDOW - now).total_seconds()
+        return 0.0
+
+    def acquire(self) -> None:
+        """
+        Block until a Strava call may be made
+
+        :raises RateLimitExceeded: if the daily limit is used up
+        """
+        self._maybe_sync()
+        wait = max(self.bucket.reserve(), self.seconds_until_available())
+        if wait > 0:
+            logger.info(f"Pacing Strava call for {wait:.1f}s")
+            time.sleep(wait)
+
+        # count the call now, headers of the response will correct it
+        with self._lock:
+            now = _now()
+            usage = self._current_usage(now)
+            self.rate_limit = usage.copy(
+                update={
+                    "short_usage": usage.short_usage + 1,
+                    "long_usage": usage.long_usage + 1,
+                    "updated_at": now,
+                }
+            )
+
+    def update_from_headers(self, headers: dict, method: str) -> None:
+        """
+        Record the usage reported by a Strava response
+
+        :param headers: response headers
+        :param method: HTTP method of the request
+        """
+        rates = get_rates_from_response_headers(headers, method)
+        if rates is None:
+            return
+        with self._lock:
+            self._set_rate_limit(
+                StravaRateLimit(
+                    short_usage=rates.short_usage,
+                    long_usage=rates.long_usage,
+                    short_limit=rates.short_limit,
+                    long_limit=rates.long_limit,
+                    updated_at=_now(),
+                )
+            )
+
+    def backoff_seconds(self, attempt: int) -> float:
+        """
+        Exponential backoff with jitter after a 429, at least until the 15
+        minute window resets if the budget is known to be used up
+
+        :param attempt: number of 429s seen so far for this request
+        :return: seconds to wait before retrying
+        """
+        backoff = STRAVA_BACKOFF_SECONDS * 2**attempt * random.uniform(0.5, 1.5)
+        return min(
+            max(backoff, self.seconds_until_available()), STRAVA_MAX_BACKOFF_SECONDS
+        )
+
+
+class RateLimitedSession(requests.Session):
+    """
+    requests.Session for stravalib clients that paces every call through the
+    shared StravaRateLimiter and retries 429s with backoff
+    """
+
+    def __init__(self, rate_limiter: StravaRateLimiter):
+        super().__init__()
+        self.rate_limiter = rate_limiter
+
+    def request(self, method: str, url: str, *args, **kwargs) -> requests.Response:
+        for attempt in range(STRAVA_MAX_RETRIES + 1):
+            self.rate_limiter.acquire()
+            response = super().request(method, url, *args, **kwargs)
+            self.rate_limiter.update_from_headers(response.headers, method.upper())
+            if response.status_code != 429 or attempt == STRAVA_MAX_RETRIES:
+                return response
+
+            backoff = self.rate_limiter.backoff_seconds(attempt)
+            logger.warning(f"Strava returned 429, retrying in {backoff:.1f}s")
+            time.sleep(backoff)
+        return response
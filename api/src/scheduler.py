@@ -0,0 +1,119 @@
+import datetime
+import math
+from typing import AbstractSet, Iterator, List, Optional
+
+from src.constants import (
+    DEFAULT_UPDATE_SECONDS,
+    DEFERRABLE_PRIORITY,
+    RACE_PRIORITY_WINDOW_DAYS,
+)
+from src.types.user import User
+
+
+def get_priority(user: User, dt: datetime.datetime, ran_today: bool = False) -> float:
+    """
+    Higher is more urgent. Athletes close to their race, premium athletes and
+    athletes who ran today are updated first
+
+    :param user: User object
+    :param dt: datetime of the run
+    :param ran_today: whether the athlete has a run on dt's date
+    :return: priority score, below DEFERRABLE_PRIORITY the update may be deferred
+    """
+    priority = 0.0
+    if user.is_premium:
+        priority += 2.0
+    if ran_today:
+        priority += 2.0
+
+    race_date = user.preferences.race_date if user.preferences else None
+    if race_date is not None:
+        days_until_race = (race_date - dt.date()).days
+        if 0 <= days_until_race <= RACE_PRIORITY_WINDOW_DAYS:
+            priority += 3.0 * (1 - days_until_race / RACE_PRIORITY_WINDOW_DAYS)
+    return priority
+
+
+class UpdateScheduler:
+    """
+    Hands out users in priority order to the fan-out workers. Once the projected
+    finish time of the remaining users passes the deadline, users below
+    DEFERRABLE_PRIORITY are deferred instead of admitted
+    """
+
+    def __init__(
+        self,
+        users: List[User],
+        dt: datetime.datetime,
+        n_workers: int,
+        deadline: Optional[datetime.datetime] = None,
+        ran_today: AbstractSet[int] = frozenset(),
+    ):
+        """
+        :param users: users to update
+        :param dt: datetime of the run
+        :param n_workers: number of users updated at once
+        :param deadline: target completion time, no deferral if None
+        :param ran_today: athlete_ids with a run on dt's date
+        """
+        # ascending so that pop() returns the most urgent user, ties keep the
+        # original order of users
+        self.queue = [
+            (priority, user)
+            for priority, _, user in sorted(
+                (
+                    (
+                        get_priority(user, dt, user.athlete_id in ran_today),
+                        -index,
+                        user,
+                    )
+                    for index, user in enumerate(users)
+                ),
+                key=lambda item: item[:2],
+            )
+        ]
+        self.n_workers = n_workers
+        self.deadline = deadline
+        self.deferred: List[User] = []
+        self._total_seconds = 0.0
+        self._n_completed = 0
+
+    @property
+    def estimated_update_seconds(self) -> float:
+        """Mean duration of completed updates in this run"""
+        if self._n_completed == 0:
+            return DEFAULT_UPDATE_SECONDS
+        return self._total_seconds / self._n_completed
+
+    def record_duration(self, seconds: float) -> None:
+        """
+        Feed back the duration of a completed update
+
+        :param seconds: wall-clock duration of the update
+        """
+        self._total_seconds += seconds
+        self._n_completed += 1
+
+    def is_deadline_at_risk(self) -> bool:
+        """Whether running every queued user would finish after the deadline"""
+        if self.deadline is None:
+            return False
+        n_rounds = math.ceil(len(self.queue) / self.n_workers)
+        seconds_left = (
+            self.deadline - datetime.datetime.now(self.deadline.tzinfo)
+        ).total_seconds()
+        return n_rounds * self.estimated_update_seconds > seconds_left
+
+    def __iter__(self) -> Iterator[User]:
+        return self
+
+    def __next__(self) -> User:
+        while self.queue:
+            at_risk = self.is_deadline_at_risk()
+            priority, user = self.queue.pop()
+            if at_risk and priority < DEFERRABLE_PRIORITY:
+                self.deferred.append(user)
+                continue
+            return user
+        raise StopIteration
+
@@ -0,0 +1,54 @@
+import threading
+from collections import OrderedDict
+from typing import Callable
+
+import requests
+from src.types.user import StravaToken
+from stravalib.client import Client
+
+
+class StravaClientPool:
+    """
+    Bounded pool of per-athlete Strava clients. Each athlete gets an isolated
+    client (tokens are never shared across athletes) with its own session, so
+    keep-alive connections are reused across that athlete's calls. The least
+    recently used client is dropped once max_size is reached
+    """
+
+    def __init__(self, max_size: int, new_session: Callable[[], requests.Session]):
+        """
+        :param max_size: max number of athletes holding a client
+        :param new_session: builds the requests.Session of a new client
+        """
+        if max_size <= 0:
+            raise ValueError("max_size must be positive")
+        self.max_size = max_size
+        self._new_session = new_session
+        self._clients: OrderedDict[int, Client] = OrderedDict()
+        self._lock = threading.Lock()
+
+    def __len__(self) -> int:
+        return len(self._clients)
+
+    def get(self, token: StravaToken) -> Client:
+        """
+        Get the athlete's client, configured with the athlete's current tokens
+
+        :param token: StravaToken
+        :return: Client
+        """
+        with self._lock:
+            client = self._clients.get(token.athlete_id)
+            if client is None:
+                client = Client(requests_session=self._new_session())
+                self._clients[token.athlete_id] = client
+                while len(self._clients) > self.max_size:
+                    # in-flight calls keep their reference, the session is
+                    # closed once garbage collected
+                    self._clients.popitem(last=False)
+            self._clients.move_to_end(token.athlete_id)
+
+            client.access_token = token.access_token
+            client.refresh_token = token.refresh_token
+            client.token_expires_at = token.expires_at
+            return client
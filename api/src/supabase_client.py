@@ -1,22 +1,27 @@
 import datetime
 import logging
 import os
-from typing import List, Optional
+from typing import Any, Callable, Iterator, List, Optional
 from uuid import uuid4
 
 import orjson
 from dotenv import load_dotenv
+from postgrest.exceptions import APIError
 from src import auth_manager, supabase_helpers
 from src.constants import FREE_TRIAL_DAYS
+from src.model_construct import trusted_construct
+from src.types.activity import Activity, ActivitySync, WeeklyRollup
+from src.types.detailed_activity import DetailedActivity
 from src.types.feedback import FeedbackRow
 from src.types.mileage_recommendation import MileageRecommendationRow
+from src.types.rate_limit import StravaRateLimit
 from src.types.training_plan import TrainingPlan, TrainingPlanWeekRow
 from src.types.training_week import (
     EnrichedActivity,
     FullTrainingWeek,
-    TrainingSession,
     TrainingWeek,
 )
+from src.types.update_pipeline import LeaseStatus, UpdateRun, UpdateRunStatus
 from src.types.user import Preferences, User
 from src.utils import datetime_now_est
 from supabase import Client, create_client
@@ -121,13 +126,13 @@ def get_training_week(athlete_id: int) -> FullTrainingWeek:
                 session["session_type"] = "easy run"
             future_json_data_cleansed.append(session)
 
-        return FullTrainingWeek(
-            past_training_week=[EnrichedActivity(**obj) for obj in past_json_data],
-            future_training_week=TrainingWeek(
-                sessions=[
-                    TrainingSession(**session) for session in future_json_data_cleansed
-                ]
-            ),
+        # rows are written by us from validated models, skip re-validation
+        return trusted_construct(
+            FullTrainingWeek,
+            {
+                "past_training_week": past_json_data,
+                "future_training_week": {"sessions": future_json_data_cleansed},
+            },
         )
     except IndexError:
         raise ValueError(
@@ -135,6 +140,30 @@ def get_training_week(athlete_id: int) -> FullTrainingWeek:
         )
 
 
+def get_past_training_week(athlete_id: int) -> Optional[List[EnrichedActivity]]:
+    """
+    Get the past_training_week of the most recent training_week row by
+    athlete_id, rows that cannot be decoded raise
+
+    :param athlete_id: int
+    :return: List of EnrichedActivity objects, None if there is no row yet
+    """
+    table = client.table(supabase_helpers.get_training_week_table_name())
+    response = (
+        table.select("past_training_week")
+        .eq("athlete_id", athlete_id)
+        .order("created_at", desc=True)
+        .limit(1)
+        .execute()
+    )
+    if not response.data:
+        return None
+
+    past_json_data = orjson.loads(response.data[0]["past_training_week"])
+    # rows are written by us from validated models, skip re-validation
+    return [trusted_construct(EnrichedActivity, day) for day in past_json_data]
+
+
 def update_user_device_token(athlete_id: str, device_token: str) -> None:
     """
     Update the device token for a user in the database.
@@ -248,6 +277,20 @@ def upsert_training_week(
     table.upsert(row_data).execute()
 
 
+def _is_updated_today(created_at: str) -> bool:
+    """
+    Where "today" is defined as within the past 23 hours and 30 minutes (to
+    account for any delays in yesterday's evening update)
+
+    :param created_at: ISO formatted created_at of a training_week row
+    :return: True if created_at falls within today's update window
+    """
+    time_diff = datetime.datetime.now(
+        datetime.timezone.utc
+    ) - datetime.datetime.fromisoformat(created_at)
+    return time_diff < datetime.timedelta(hours=23, minutes=30)
+
+
 def has_user_updated_today(athlete_id: int) -> bool:
     """
     Check if the user has received an update today. Where "today" is defined as
@@ -259,7 +302,7 @@ def has_user_updated_today(athlete_id: int) -> bool:
     """
     table = client.table(supabase_helpers.get_training_week_table_name())
     response = (
-        table.select("*")
+        table.select("created_at")
         .eq("athlete_id", athlete_id)
         .order("created_at", desc=True)
         .limit(1)
@@ -270,10 +313,466 @@ def has_user_updated_today(athlete_id: int) -> bool:
         return False
 
     # "Has this user posted an activity in the last 23 hours and 30 minutes?"
-    time_diff = datetime.datetime.now(
-        datetime.timezone.utc
-    ) - datetime.datetime.fromisoformat(response.data[0]["created_at"])
-    return time_diff < datetime.timedelta(hours=23, minutes=30)
+    return _is_updated_today(response.data[0]["created_at"])
+
+
+def _iter_all(build_query: Callable[[], Any], page_size: int = 1000) -> Iterator[dict]:
+    """
+    Lazily page through every row of a select, the API caps rows per request
+
+    :param build_query: returns a fresh filtered/ordered select query
+    :param page_size: rows per request, must not exceed the API's max rows
+    :return: iterator of rows, one page held at a time
+    """
+    offset = 0
+    while True:
+        response = build_query().range(offset, offset + page_size - 1).execute()
+        yield from response.data
+        if len(response.data) < page_size:
+            return
+        offset += page_size
+
+
+def _select_all(build_query: Callable[[], Any], page_size: int = 1000) -> List[dict]:
+    """
+    Page through every row of a select, the API caps rows per request
+
+    :param build_query: returns a fresh filtered/ordered select query
+    :param page_size: rows per request, must not exceed the API's max rows
+    :return: all rows
+    """
+    return list(_iter_all(build_query, page_size))
+
+
+def list_athlete_ids_updated_today() -> set[int]:
+    """
+    Bulk version of has_user_updated_today, reads the latest training_week
+    created_at of every athlete from the latest_training_week view
+
+    :return: set of athlete_ids that have received an update today
+    """
+    table = client.table(supabase_helpers.get_latest_training_week_view_name())
+    rows = _select_all(
+        lambda: table.select("athlete_id, created_at").order("athlete_id")
+    )
+    return {row["athlete_id"] for row in rows if _is_updated_today(row["created_at"])}
+
+
+def upsert_run_event(
+    athlete_id: int, activity_id: int, event_time: datetime.datetime
+) -> None:
+    """
+    Record a run reported by the Strava webhook, redelivered events overwrite
+
+    :param athlete_id: The ID of the athlete
+    :param activity_id: The ID of the Strava activity
+    :param event_time: When Strava reported the run
+    """
+    table = client.table(supabase_helpers.get_run_event_table_name())
+    table.upsert(
+        {
+            "activity_id": activity_id,
+            "athlete_id": athlete_id,
+            "event_time": event_time.isoformat(),
+        }
+    ).execute()
+
+
+def list_athlete_ids_with_run_events_since(since: datetime.datetime) -> set[int]:
+    """
+    Athletes the Strava webhook reported a run for since a point in time, known
+    before their runs are synced into the activity table
+
+    :param since: earliest event_time
+    :return: set of athlete_ids
+    """
+    table = client.table(supabase_helpers.get_run_event_table_name())
+    rows = _select_all(
+        lambda: table.select("athlete_id")
+        .gte("event_time", since.isoformat())
+        .order("activity_id")
+    )
+    return {row["athlete_id"] for row in rows}
+
+
+def delete_run_events_before(event_time: datetime.datetime) -> None:
+    """
+    Delete run events that no longer affect any run
+
+    :param event_time: delete events reported before this time
+    """
+    table = client.table(supabase_helpers.get_run_event_table_name())
+    table.delete().lt("event_time", event_time.isoformat()).execute()
+
+
+def claim_athlete_lease(
+    run_key: str,
+    athlete_id: int,
+    worker_id: str,
+    lease_seconds: int,
+    max_attempts: int,
+) -> bool:
+    """
+    Claim an athlete for a run so that no other worker processes them. The
+    lease row doubles as the athlete's checkpoint for the run: done athletes are
+    never claimed again, failed athletes and expired leases (e.g. the worker
+    crashed) are reclaimed until max_attempts is reached
+
+    :param run_key: Identifies the run, shared by all workers of that run
+    :param athlete_id: The ID of the athlete
+    :param worker_id: Identifies the worker claiming the athlete
+    :param lease_seconds: How long the lease is held before it can be reclaimed
+    :param max_attempts: Max number of times an athlete is attempted in a run
+    :return: True if this worker now holds the lease, False otherwise
+    """
+    table = client.table(supabase_helpers.get_athlete_lease_table_name())
+    now = datetime.datetime.now(datetime.timezone.utc)
+    leased_until = (now + datetime.timedelta(seconds=lease_seconds)).isoformat()
+
+    try:
+        table.insert(
+            {
+                "run_key": run_key,
+                "athlete_id": athlete_id,
+                "worker_id": worker_id,
+                "status": LeaseStatus.LEASED,
+                "leased_until": leased_until,
+                "attempts": 1,
+            }
+        ).execute()
+        return True
+    except APIError as e:
+        # 23505: unique_violation, this athlete already has a checkpoint
+        if e.code != "23505":
+            raise
+
+    response = (
+        table.select("status, leased_until, attempts")
+        .eq("run_key", run_key)
+        .eq("athlete_id", athlete_id)
+        .execute()
+    )
+    if not response.data:
+        return False
+
+    row = response.data[0]
+    is_expired = datetime.datetime.fromisoformat(row["leased_until"]) < now
+    is_retryable = row["status"] == LeaseStatus.FAILED or (
+        row["status"] == LeaseStatus.LEASED and is_expired
+    )
+    if not is_retryable or row["attempts"] >= max_attempts:
+        return False
+
+    # compare-and-swap on status & attempts so only one worker wins the retry
+    response = (
+        table.update(
+            {
+                "worker_id": worker_id,
+                "status": LeaseStatus.LEASED,
+                "leased_until": leased_until,
+                "attempts": row["attempts"] + 1,
+            }
+        )
+        .eq("run_key", run_key)
+        .eq("athlete_id", athlete_id)
+        .eq("status", row["status"])
+        .eq("attempts", row["attempts"])
+        .execute()
+    )
+    return bool(response.data)
+
+
+def renew_athlete_lease(
+    run_key: str, athlete_id: int, worker_id: str, lease_seconds: int
+) -> bool:
+    """
+    Extend a held lease so a long update is not reclaimed by another worker
+
+    :param run_key: Identifies the run, shared by all workers of that run
+    :param athlete_id: The ID of the athlete
+    :param worker_id: Identifies the worker holding the lease
+    :param lease_seconds: How long from now the lease is held
+    :return: True if the lease was still held by this worker
+    """
+    table = client.table(supabase_helpers.get_athlete_lease_table_name())
+    leased_until = datetime.datetime.now(datetime.timezone.utc) + datetime.timedelta(
+        seconds=lease_seconds
+    )
+    response = (
+        table.update({"leased_until": leased_until.isoformat()})
+        .eq("run_key", run_key)
+        .eq("athlete_id", athlete_id)
+        .eq("worker_id", worker_id)
+        .eq("status", LeaseStatus.LEASED)
+        .execute()
+    )
+    return bool(response.data)
+
+
+def delete_athlete_leases_before(created_before: datetime.datetime) -> None:
+    """
+    Delete the checkpoints of past runs
+
+    :param created_before: delete leases created before this time
+    """
+    table = client.table(supabase_helpers.get_athlete_lease_table_name())
+    table.delete().lt("created_at", created_before.isoformat()).execute()
+
+
+def complete_athlete_lease(
+    run_key: str, athlete_id: int, worker_id: str, error: Optional[str] = None
+) -> None:
+    """
+    Record the outcome of a claimed athlete, done athletes are never reclaimed
+
+    :param run_key: Identifies the run, shared by all workers of that run
+    :param athlete_id: The ID of the athlete
+    :param worker_id: Identifies the worker holding the lease
+    :param error: Error message if the update failed
+    """
+    table = client.table(supabase_helpers.get_athlete_lease_table_name())
+    table.update(
+        {
+            "status": LeaseStatus.DONE if error is None else LeaseStatus.FAILED,
+            "error": error,
+        }
+    ).eq("run_key", run_key).eq("athlete_id", athlete_id).eq(
+        "worker_id", worker_id
+    ).execute()
+
+
+def insert_update_run(job_id: str) -> None:
+    """
+    Insert a queued row into the update_run table
+
+    :param job_id: Identifies the /update-all-users/ job
+    """
+    table = client.table(supabase_helpers.get_update_run_table_name())
+    table.insert({"job_id": job_id, "status": UpdateRunStatus.QUEUED}).execute()
+
+
+def update_update_run(job_id: str, **fields) -> None:
+    """
+    Update columns of an update_run row, always bumping updated_at
+
+    :param job_id: Identifies the /update-all-users/ job
+    :param fields: Columns to update
+    """
+    table = client.table(supabase_helpers.get_update_run_table_name())
+    row_data = {
+        **fields,
+        "updated_at": datetime.datetime.now(datetime.timezone.utc).isoformat(),
+    }
+    table.update(row_data).eq("job_id", job_id).execute()
+
+
+def get_update_run(job_id: str) -> UpdateRun:
+    """
+    Get an update_run row by job_id
+
+    :param job_id: Identifies the /update-all-users/ job
+    :return: UpdateRun
+    """
+    table = client.table(supabase_helpers.get_update_run_table_name())
+    response = table.select("*").eq("job_id", job_id).execute()
+
+    if not response.data:
+        raise ValueError(f"Could not find update_run with {job_id=}")
+
+    return UpdateRun(**response.data[0])
+
+
+def get_activity_sync(athlete_id: int) -> Optional[ActivitySync]:
+    """
+    Get the window of Strava history held in the activity table for an athlete
+
+    :param athlete_id: The ID of the athlete
+    :return: ActivitySync, or None if the athlete has never been synced
+    """
+    table = client.table(supabase_helpers.get_activity_sync_table_name())
+    response = table.select("*").eq("athlete_id", athlete_id).execute()
+    if not response.data:
+        return None
+    return ActivitySync(**response.data[0])
+
+
+def upsert_activity_sync(activity_sync: ActivitySync) -> None:
+    """
+    Upsert a row into the activity_sync table
+
+    :param activity_sync: An ActivitySync object
+    """
+    table = client.table(supabase_helpers.get_activity_sync_table_name())
+    table.upsert(
+        {
+            "athlete_id": activity_sync.athlete_id,
+            "synced_from": activity_sync.synced_from.isoformat(),
+            "last_synced_at": activity_sync.last_synced_at.isoformat(),
+        }
+    ).execute()
+
+
+def upsert_activities(athlete_id: int, activities: List[Activity]) -> None:
+    """
+    Upsert runs into the activity table, keyed by Strava activity id
+
+    :param athlete_id: The ID of the athlete
+    :param activities: List of Activity objects
+    """
+    if not activities:
+        return
+
+    rows = [
+        {
+            "id": activity.id,
+            "athlete_id": athlete_id,
+            "start_date": activity.start_date.isoformat(),
+            "start_date_local": activity.start_date_local.isoformat(),
+            "distance": activity.distance,
+            "moving_time": activity.moving_time.total_seconds(),
+            "total_elevation_gain": activity.total_elevation_gain,
+        }
+        for activity in activities
+    ]
+    table = client.table(supabase_helpers.get_activity_table_name())
+    table.upsert(rows).execute()
+
+
+def iter_activities(
+    athlete_id: int, after: datetime.datetime, before: datetime.datetime
+) -> Iterator[Activity]:
+    """
+    Stream stored runs of an athlete that started within [after, before], one
+    page of rows is held at a time
+
+    :param athlete_id: The ID of the athlete
+    :param after: Start of the window
+    :param before: End of the window
+    :return: iterator of Activity objects ordered by start date
+    """
+    table = client.table(supabase_helpers.get_activity_table_name())
+    rows = _iter_all(
+        lambda: table.select(
+            "id, start_date, start_date_local, distance, moving_time, total_elevation_gain"
+        )
+        .eq("athlete_id", athlete_id)
+        .gte("start_date", after.isoformat())
+        .lte("start_date", before.isoformat())
+        .order("start_date")
+        .order("id")
+    )
+    for row in rows:
+        yield trusted_construct(Activity, row)
+
+
+def upsert_weekly_rollups(rollups: List[WeeklyRollup]) -> None:
+    """
+    Upsert rows into the weekly_rollup table, keyed by athlete and ISO week
+
+    :param rollups: List of WeeklyRollup objects
+    """
+    if not rollups:
+        return
+
+    rows = [
+        {
+            **rollup.dict(),
+            "week_start_date": rollup.week_start_date.isoformat(),
+            "updated_at": datetime.datetime.now(datetime.timezone.utc).isoformat(),
+        }
+        for rollup in rollups
+    ]
+    table = client.table(supabase_helpers.get_weekly_rollup_table_name())
+    table.upsert(rows).execute()
+
+
+def list_weekly_rollups(
+    athlete_id: int, start_date: datetime.date, end_date: datetime.date
+) -> List[WeeklyRollup]:
+    """
+    List an athlete's weekly rollups for weeks starting within [start_date,
+    end_date]
+
+    :param athlete_id: The ID of the athlete
+    :param start_date: Earliest week start date
+    :param end_date: Latest week start date
+    :return: List of WeeklyRollup objects ordered by week
+    """
+    table = client.table(supabase_helpers.get_weekly_rollup_table_name())
+    rows = _select_all(
+        lambda: table.select(
+            "athlete_id, year, week_of_year, week_start_date, total_distance, "
+            "longest_run, run_count, moving_time_in_minutes"
+        )
+        .eq("athlete_id", athlete_id)
+        .gte("week_start_date", start_date.isoformat())
+        .lte("week_start_date", end_date.isoformat())
+        .order("week_start_date")
+    )
+    return [trusted_construct(WeeklyRollup, row) for row in rows]
+
+
+def get_detailed_activity(activity_id: int) -> Optional[DetailedActivity]:
+    """
+    Get a previously computed DetailedActivity
+
+    :param activity_id: Strava activity ID
+    :return: DetailedActivity, or None if it has not been computed yet
+    """
+    table = client.table(supabase_helpers.get_detailed_activity_table_name())
+    response = (
+        table.select("detailed_activity").eq("activity_id", activity_id).execute()
+    )
+    if not response.data:
+        return None
+    return DetailedActivity(**response.data[0]["detailed_activity"])
+
+
+def upsert_detailed_activity(
+    activity_id: int, detailed_activity: DetailedActivity
+) -> None:
+    """
+    Upsert a computed DetailedActivity into the detailed_activity table
+
+    :param activity_id: Strava activity ID
+    :param detailed_activity: DetailedActivity object
+    """
+    table = client.table(supabase_helpers.get_detailed_activity_table_name())
+    table.upsert(
+        {
+            "activity_id": activity_id,
+            "detailed_activity": detailed_activity.dict(),
+        }
+    ).execute()
+
+
+def get_strava_rate_limit() -> Optional[StravaRateLimit]:
+    """
+    Get the Strava usage last reported by any worker
+
+    :return: StravaRateLimit, or None if no worker has reported usage yet
+    """
+    table = client.table(supabase_helpers.get_strava_rate_limit_table_name())
+    response = table.select("*").eq("name", "strava").execute()
+    if not response.data:
+        return None
+    return StravaRateLimit(**response.data[0])
+
+
+def upsert_strava_rate_limit(rate_limit: StravaRateLimit) -> None:
+    """
+    Share this worker's view of Strava usage with other workers
+
+    :param rate_limit: StravaRateLimit object
+    """
+    table = client.table(supabase_helpers.get_strava_rate_limit_table_name())
+    table.upsert(
+        {
+            "name": "strava",
+            **rate_limit.dict(exclude={"updated_at"}),
+            "updated_at": rate_limit.updated_at.isoformat(),
+        }
+    ).execute()
 
 
 def insert_mileage_recommendation(mileage_recommendation_row: MileageRecommendationRow):
@@ -52,3 +52,102 @@ def get_feedback_table_name() -> str:
     if os.environ.get("TEST_FLAG", "false") == "true":
         return "test_feedback"
     return "feedback"
+
+
+def get_athlete_lease_table_name() -> str:
+    """
+    Inject test_athlete_lease table name during testing
+
+    :return: The name of the athlete_lease table
+    """
+    if os.environ.get("TEST_FLAG", "false") == "true":
+        return "test_athlete_lease"
+    return "athlete_lease"
+
+
+def get_latest_training_week_view_name() -> str:
+    """
+    Inject test_latest_training_week view name during testing
+
+    :return: The name of the latest_training_week view
+    """
+    if os.environ.get("TEST_FLAG", "false") == "true":
+        return "test_latest_training_week"
+    return "latest_training_week"
+
+
+def get_update_run_table_name() -> str:
+    """
+    Inject test_update_run table name during testing
+
+    :return: The name of the update_run table
+    """
+    if os.environ.get("TEST_FLAG", "false") == "true":
+        return "test_update_run"
+    return "update_run"
+
+
+def get_activity_table_name() -> str:
+    """
+    Inject test_activity table name during testing
+
+    :return: The name of the activity table
+    """
+    if os.environ.get("TEST_FLAG", "false") == "true":
+        return "test_activity"
+    return "activity"
+
+
+def get_activity_sync_table_name() -> str:
+    """
+    Inject test_activity_sync table name during testing
+
+    :return: The name of the activity_sync table
+    """
+    if os.environ.get("TEST_FLAG", "false") == "true":
+        return "test_activity_sync"
+    return "activity_sync"
+
+
+def get_detailed_activity_table_name() -> str:
+    """
+    Inject test_detailed_activity table name during testing
+
+    :return: The name of the detailed_activity table
+    """
+    if os.environ.get("TEST_FLAG", "false") == "true":
+        return "test_detailed_activity"
+    return "detailed_activity"
+
+
+def get_strava_rate_limit_table_name() -> str:
+    """
+    Inject test_strava_rate_limit table name during testing
+
+    :return: The name of the strava_rate_limit table
+    """
+    if os.environ.get("TEST_FLAG", "false") == "true":
+        return "test_strava_rate_limit"
+    return "strava_rate_limit"
+
+
+def get_weekly_rollup_table_name() -> str:
+    """
+    Inject test_weekly_rollup table name during testing
+
+    :return: The name of the weekly_rollup table
+    """
+    if os.environ.get("TEST_FLAG", "false") == "true":
+        return "test_weekly_rollup"
+    return "weekly_rollup"
+
+
+def get_run_event_table_name() -> str:
+    """
+    Inject test_run_event table name during testing
+
+    :return: The name of the run_event table
+    """
+    if os.environ.get("TEST_FLAG", "false") == "true":
+        return "test_run_event"
+    return "run_event"
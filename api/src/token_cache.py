@@ -0,0 +1,89 @@
+import datetime
+import threading
+from collections import defaultdict
+from typing import Callable, Dict, Optional
+
+from src.cache import LRUCache
+from src.types.user import StravaToken, User
+from src.utils import datetime_now_est, make_tz_aware
+
+
+class TokenCache:
+    """
+    Per-athlete cache of valid Strava tokens, the least recently used athlete
+    is dropped once max_size is reached. A token is served until it is within
+    margin of expiring, then refreshed by exactly one caller per athlete while
+    concurrent callers wait for its result
+    """
+
+    def __init__(self, margin: datetime.timedelta, max_size: int):
+        """
+        :param margin: refresh tokens expiring within this margin
+        :param max_size: max number of athletes holding a cached token
+        """
+        self.margin = margin
+        self._tokens = LRUCache(max_size=max_size)
+        self._locks: Dict[int, threading.Lock] = defaultdict(threading.Lock)
+        self._locks_lock = threading.Lock()
+
+    def __len__(self) -> int:
+        return len(self._tokens)
+
+    def is_valid(self, token: Optional[StravaToken]) -> bool:
+        """
+        Whether the token can be used for at least another margin
+
+        :param token: StravaToken or None
+        :return: bool
+        """
+        if token is None or token.access_token is None or token.expires_at is None:
+            return False
+        return datetime_now_est() + self.margin < make_tz_aware(token.expires_at)
+
+    def set(self, user: User) -> StravaToken:
+        """
+        Cache the tokens of a user with freshly issued tokens
+
+        :param user: User
+        :return: the cached StravaToken
+        """
+        token = StravaToken(
+            athlete_id=user.athlete_id,
+            access_token=user.access_token,
+            refresh_token=user.refresh_token,
+            expires_at=user.expires_at,
+        )
+        self._tokens.set(user.athlete_id, token)
+        return token
+
+    def get_or_refresh(
+        self,
+        athlete_id: int,
+        load: Callable[[int], User],
+        refresh: Callable[[StravaToken], User],
+    ) -> StravaToken:
+        """
+        Get a valid token, refreshing it at most once at a time
+
+        :param athlete_id: strava internal identifier
+        :param load: read the user (and stored token) from the database
+        :param refresh: refresh the token and persist it, returns the user
+        :return: StravaToken that is valid for at least another margin
+        """
+        token = self._tokens.get(athlete_id)
+        if self.is_valid(token):
+            return token
+
+        with self._locks_lock:
+            lock = self._locks[athlete_id]
+        with lock:
+            # a concurrent caller may have refreshed while we waited
+            token = self._tokens.get(athlete_id)
+            if self.is_valid(token):
+                return token
+
+            # another worker may have refreshed and stored a new token
+            token = self.set(load(athlete_id))
+            if not self.is_valid(token):
+                token = self.set(refresh(token))
+            return token
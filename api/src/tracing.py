@@ -0,0 +1,109 @@
+import contextvars
+import datetime
+import time
+from contextlib import contextmanager
+from typing import Dict, Iterable, List, Optional
+
+import numpy as np
+import orjson
+from src import concurrency
+from src.constants import SPANS_FILE
+from src.types.tracing import Span, SpanOutcome, StageLatency
+
+_collected_spans: contextvars.ContextVar[Optional[List[Span]]] = (
+    contextvars.ContextVar("collected_spans", default=None)
+)
+
+
+def export_span(span: Span) -> None:
+    """
+    Append a span to SPANS_FILE, one json object per line
+
+    :param span: Span object
+    """
+    with open(SPANS_FILE, "ab") as f:
+        f.write(orjson.dumps(span.dict()) + b"\n")
+
+
+@contextmanager
+def span(name: str, athlete_id: Optional[int] = None):
+    """
+    Time a pipeline stage, recording its outcome even when it raises
+
+    :param name: name of the stage
+    :param athlete_id: athlete the stage runs for, defaults to the current athlete
+    """
+    if athlete_id is None:
+        athlete_id = concurrency.get_current_athlete_id()
+    start = datetime.datetime.now(datetime.timezone.utc)
+    start_time = time.monotonic()
+    outcome = SpanOutcome.OK
+    error = None
+    try:
+        yield
+    except Exception as e:
+        outcome = SpanOutcome.ERROR
+        error = f"{type(e).__name__}: {e}"
+        raise
+    finally:
+        stage_span = Span(
+            name=name,
+            athlete_id=athlete_id,
+            start=start,
+            duration=round(time.monotonic() - start_time, 4),
+            outcome=outcome,
+            error=error,
+        )
+        export_span(stage_span)
+        collected_spans = _collected_spans.get()
+        if collected_spans is not None:
+            collected_spans.append(stage_span)
+
+
+@contextmanager
+def collect_spans():
+    """
+    Collect every span recorded within this context, including spans from
+    tasks spawned within it
+
+    :return: list that spans are appended to
+    """
+    collected_spans: List[Span] = []
+    token = _collected_spans.set(collected_spans)
+    try:
+        yield collected_spans
+    finally:
+        _collected_spans.reset(token)
+
+
+def read_spans(path: str = SPANS_FILE) -> List[Span]:
+    """
+    Read spans exported by export_span
+
+    :param path: path to the spans file
+    :return: list of Span objects
+    """
+    with open(path, "rb") as f:
+        return [Span(**orjson.loads(line)) for line in f if line.strip()]
+
+
+def summarize_spans(spans: Iterable[Span]) -> Dict[str, StageLatency]:
+    """
+    Latency percentiles per stage
+
+    :param spans: spans to summarize, e.g. those of a single nightly run
+    :return: mapping of stage name to StageLatency
+    """
+    durations_by_stage: Dict[str, List[float]] = {}
+    for stage_span in spans:
+        durations_by_stage.setdefault(stage_span.name, []).append(stage_span.duration)
+
+    return {
+        name: StageLatency(
+            count=len(durations),
+            p50=round(float(np.percentile(durations, 50)), 3),
+            p95=round(float(np.percentile(durations, 95)), 3),
+            max=round(max(durations), 3),
+        )
+        for name, durations in sorted(durations_by_stage.items())
+    }
@@ -3,11 +3,12 @@ import datetime
 from typing import List, Optional
 
 import numpy as np
-from src import supabase_client
+from src import activities, concurrency, supabase_client
 from src.constants import COACH_ROLE
 from src.llm import get_completion_json
 from src.prompts import TRAINING_PLAN_PROMPT, TRAINING_PLAN_SKELETON_PROMPT
 from src.types.activity import WeekSummary
+from src.types.concurrency import Dependency
 from src.types.training_plan import (
     TrainingPlan,
     TrainingPlanSkeleton,
@@ -173,17 +174,22 @@ async def gen_training_plan_week(
     )
 
 
-async def gen_training_plan(
-    user: User, weekly_summaries: List[WeekSummary], dt: datetime.datetime
-) -> TrainingPlan:
+async def gen_training_plan(user: User, dt: datetime.datetime) -> TrainingPlan:
     """
-    Generate a training plan for the user given training history.
+    Generate a training plan for the user given training history, read from
+    the last 52 weeks of the athlete's weekly rollup
 
     :param user: User object
-    :param weekly_summaries: List of WeekSummary objects
     :param dt: Current datetime, useful for testing
     :return: TrainingPlan object
     """
+    weekly_summaries = await concurrency.run_in_thread(
+        Dependency.SUPABASE,
+        activities.get_weekly_summaries,
+        athlete_id=user.athlete_id,
+        dt=dt,
+        num_weeks=52,
+    )
     sorted_weekly_summaries: List[WeekSummary] = sorted(
         weekly_summaries, key=lambda x: x.week_start_date
     )
@@ -224,20 +230,15 @@ async def gen_training_plan(
     return TrainingPlan(training_plan_weeks=training_plan_weeks)
 
 
-async def gen_training_plan_pipeline(
-    user: User, weekly_summaries: List[WeekSummary], dt: datetime.datetime
-) -> TrainingPlan:
+async def gen_training_plan_pipeline(user: User, dt: datetime.datetime) -> TrainingPlan:
     """
     Generate a training plan for the user given training history
 
     :param user: User object
-    :param weekly_summaries: List of WeekSummary objects
     :param dt: datetime injection, helpful for testing
     :return: TrainingPlan object
     """
-    training_plan = await gen_training_plan(
-        user=user, weekly_summaries=weekly_summaries, dt=dt
-    )
+    training_plan = await gen_training_plan(user=user, dt=dt)
     supabase_client.insert_training_plan(
         athlete_id=user.athlete_id, training_plan=training_plan
     )
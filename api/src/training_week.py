@@ -1,8 +1,9 @@
 import asyncio
 import datetime
-from typing import List
+from typing import List, Optional
 
-from src import auth_manager
+from src import concurrency, supabase_client, tracing
+from src.activity_timeline import ActivityTimeline
 from src.constants import COACH_ROLE
 from src.detailed_activity import get_detailed_activity
 from src.llm import get_completion, get_completion_json
@@ -12,6 +13,7 @@ from src.prompts import (
     TRAINING_WEEK_PROMPT,
 )
 from src.types.activity import DailyActivity
+from src.types.concurrency import Dependency
 from src.types.detailed_activity import DetailedActivity
 from src.types.mileage_recommendation import MileageRecommendation
 from src.types.training_week import (
@@ -22,6 +24,7 @@ from src.types.training_week import (
 )
 from src.types.update_pipeline import ExeType
 from src.types.user import Preferences, User
+from stravalib.client import Client
 
 
 def get_remaining_days_of_week(dt: datetime.datetime, exe_type: ExeType) -> List[str]:
@@ -99,18 +102,16 @@ async def gen_training_week(
 
 
 def get_detailed_activities_from_today(
-    user: User, activity_of_interest: DailyActivity
+    strava_client: Client, activity_of_interest: DailyActivity
 ) -> List[DetailedActivity]:
     """
     Extract detailed activities from a given activity. Rarely there is more than
     one activity per day - we use a list of activities here to handle this edge case
 
-    :param user: user entity
+    :param strava_client: authenticated Strava client of the user
     :param activity_of_interest: The activity of interest
     :return: List of detailed activities from today
     """
-    strava_client = auth_manager.get_strava_client(user.athlete_id)
-
     activities_from_today = []
     for activity_id in activity_of_interest.activity_ids:
         activities_from_today.append(get_detailed_activity(strava_client, activity_id))
@@ -122,6 +123,7 @@ def get_detailed_activities_from_today(
 
 async def gen_coaches_notes(
     user: User,
+    strava_client: Client,
     activity_of_interest: DailyActivity,
     past_7_days: List[DailyActivity],
 ) -> str:
@@ -129,70 +131,99 @@ async def gen_coaches_notes(
     Generate comments from the coach for a given activity
 
     :param user: user entity
+    :param strava_client: authenticated Strava client of the user
     :param activity_of_interest: The activity of interest
     :param past_7_days: List of past 7 days of activities
     :return: Comments from the coach for the activity
     """
+    with tracing.span("get_detailed_activities_from_today", user.athlete_id):
+        activities_from_today = await concurrency.run_in_thread(
+            Dependency.STRAVA,
+            get_detailed_activities_from_today,
+            strava_client=strava_client,
+            activity_of_interest=activity_of_interest,
+        )
     message = COACHES_NOTES_PROMPT.substitute(
         COACH_ROLE=COACH_ROLE,
         user_preferences=user.preferences,
         past_7_days=past_7_days,
-        activities_from_today=get_detailed_activities_from_today(
-            user=user, activity_of_interest=activity_of_interest
-        ),
+        activities_from_today=activities_from_today,
         day_of_week=activity_of_interest.day_of_week,
     )
-    return await get_completion(
-        message=message,
-        model="gpt-4o-mini",
-        generation_name="gen_coaches_notes",
-    )
+    with tracing.span("gen_coaches_notes", user.athlete_id):
+        return await get_completion(
+            message=message,
+            model="gpt-4o-mini",
+            generation_name="gen_coaches_notes",
+        )
 
 
 def get_past_week_activities(
-    daily_activity: List[DailyActivity], activity_of_interest: DailyActivity
+    timeline: ActivityTimeline, activity_of_interest: DailyActivity
 ) -> List[DailyActivity]:
     """
     Returns the previous 7 days of activities for a given activity
 
-    :param daily_activity: List of all activities
+    :param timeline: ActivityTimeline of all activities
     :param activity_of_interest: The activity of interest
     :return: List of previous 7 days of activities
     """
-    filtered_activities = []
-    for activity in daily_activity:
-        if (
-            activity.date > activity_of_interest.date - datetime.timedelta(days=7)
-            and activity.date < activity_of_interest.date
-        ):
-            filtered_activities.append(activity)
-    return filtered_activities
+    return timeline.previous_days(activity_of_interest.date, n_days=7).to_list()
+
+
+def get_previous_past_training_week(athlete_id: int) -> List[EnrichedActivity]:
+    """
+    Annotated days of the athlete's most recent training_week row
+
+    :param athlete_id: The athlete's ID
+    :return: List of EnrichedActivity objects, empty if there is no row yet
+    """
+    past_training_week = supabase_client.get_past_training_week(athlete_id)
+    if past_training_week is None:
+        return []
+    return past_training_week
 
 
 async def slice_and_gen_weekly_activity(
-    user: User, daily_activity: List[DailyActivity], rest_of_week: List[str]
+    user: User,
+    strava_client: Client,
+    daily_activity: List[DailyActivity],
+    rest_of_week: List[str],
+    previous_week: Optional[List[EnrichedActivity]] = None,
 ) -> List[EnrichedActivity]:
     """
-    Slices the weekly activity based on the remaining days of the week and
-    generates coach notes for each activity concurrently
+    Slices this week's activity (the ISO week of the last day of
+    daily_activity, up to that day) and generates coach notes for each
+    activity concurrently. Days annotated in previous_week whose activity is
+    unchanged (same activity_ids and metrics) keep their notes
 
     :param user: user entity
+    :param strava_client: authenticated Strava client of the user
     :param daily_activity: List of DailyActivity objects
     :param rest_of_week: List of remaining days of the week
+    :param previous_week: past_training_week of the last training_week row
     :return: List of EnrichedActivity objects
     """
     if len(rest_of_week) == 7:
         return []
 
-    days_so_far = 7 - len(rest_of_week)
-    this_weeks_activity = daily_activity[-days_so_far:]
+    timeline = ActivityTimeline.from_daily_activity(daily_activity)
+    this_weeks_activity = timeline.week_to_date(timeline.end_date)
+    previous_days = {
+        enriched.activity.date: enriched for enriched in previous_week or []
+    }
 
     async def create_enriched_activity(activity: DailyActivity) -> EnrichedActivity:
+        previous_day = previous_days.get(activity.date)
+        if previous_day is not None and previous_day.activity == activity:
+            return previous_day
+
         coaches_notes = await gen_coaches_notes(
             user=user,
+            strava_client=strava_client,
             activity_of_interest=activity,
             past_7_days=get_past_week_activities(
-                daily_activity=daily_activity,
+                timeline=timeline,
                 activity_of_interest=activity,
             ),
         )
@@ -206,6 +237,7 @@ async def slice_and_gen_weekly_activity(
 
 async def gen_full_training_week(
     user: User,
+    strava_client: Client,
     daily_activity: List[DailyActivity],
     mileage_rec: MileageRecommendation,
     exe_type: ExeType,
@@ -215,6 +247,7 @@ async def gen_full_training_week(
     Generates full training week given mileage recommendation
 
     :param user: user entity
+    :param strava_client: authenticated Strava client of the user
     :param daily_activity: list of daily activity data
     :param mileage_rec: recommendation for this weeks training
     :param exe_type: new week or mid week
@@ -222,26 +255,41 @@ async def gen_full_training_week(
     :return: full training week
     """
     rest_of_week = get_remaining_days_of_week(dt, exe_type)
-    this_weeks_activity = await slice_and_gen_weekly_activity(
-        user=user, daily_activity=daily_activity, rest_of_week=rest_of_week
-    )
+
+    # mid week, days already annotated by the last update keep their notes
+    previous_week = []
+    if exe_type == ExeType.MID_WEEK:
+        with tracing.span("get_previous_past_training_week", user.athlete_id):
+            previous_week = await concurrency.run_in_thread(
+                Dependency.SUPABASE, get_previous_past_training_week, user.athlete_id
+            )
+    with tracing.span("slice_and_gen_weekly_activity", user.athlete_id):
+        this_weeks_activity = await slice_and_gen_weekly_activity(
+            user=user,
+            strava_client=strava_client,
+            daily_activity=daily_activity,
+            rest_of_week=rest_of_week,
+            previous_week=previous_week,
+        )
     miles_completed_this_week = sum(
         [obj.activity.distance_in_miles for obj in this_weeks_activity]
     )
     miles_remaining_this_week = mileage_rec.total_volume - miles_completed_this_week
-    pseudo_training_week = await gen_pseudo_training_week(
-        last_n_days_of_activity=daily_activity,
-        mileage_recommendation=mileage_rec,
-        miles_completed_this_week=miles_completed_this_week,
-        miles_remaining_this_week=miles_remaining_this_week,
-        rest_of_week=rest_of_week,
-        user_preferences=user.preferences,
-    )
-    training_week = await gen_training_week(
-        user=user,
-        pseudo_training_week=pseudo_training_week,
-        mileage_recommendation=mileage_rec,
-    )
+    with tracing.span("gen_pseudo_training_week", user.athlete_id):
+        pseudo_training_week = await gen_pseudo_training_week(
+            last_n_days_of_activity=daily_activity,
+            mileage_recommendation=mileage_rec,
+            miles_completed_this_week=miles_completed_this_week,
+            miles_remaining_this_week=miles_remaining_this_week,
+            rest_of_week=rest_of_week,
+            user_preferences=user.preferences,
+        )
+    with tracing.span("gen_training_week", user.athlete_id):
+        training_week = await gen_training_week(
+            user=user,
+            pseudo_training_week=pseudo_training_week,
+            mileage_recommendation=mileage_rec,
+        )
     return FullTrainingWeek(
         past_training_week=this_weeks_activity,
         future_training_week=training_week,
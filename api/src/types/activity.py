@@ -75,3 +75,37 @@ class WeekSummary(BaseModel):
 
     def __repr__(self):
         return str(self)
+
+
+class ActivitySync(BaseModel):
+    """Database row representation of activity_sync table"""
+
+    athlete_id: int
+    synced_from: datetime.datetime
+    last_synced_at: datetime.datetime
+
+
+class WeeklyRollup(BaseModel):
+    """Database row representation of weekly_rollup table"""
+
+    athlete_id: int
+    year: int
+    week_of_year: int
+    week_start_date: datetime.date
+    total_distance: float
+    """Miles, sum of the rounded daily distances"""
+
+    longest_run: float
+    """Miles, longest day of the week (same as WeekSummary)"""
+
+    run_count: int
+    moving_time_in_minutes: float
+
+    def to_week_summary(self) -> WeekSummary:
+        return WeekSummary(
+            year=self.year,
+            week_of_year=self.week_of_year,
+            week_start_date=self.week_start_date,
+            longest_run=self.longest_run,
+            total_distance=self.total_distance,
+        )
@@ -0,0 +1,218 @@
+import datetime
+from collections.abc import Sequence
+from typing import Iterator, List, Union
+
+import numpy as np
+from src.model_construct import trusted_construct
+from src.types.activity import DailyActivity
+
+DAYS_OF_WEEK = np.array(["mon", "tue", "wed", "thu", "fri", "sat", "sun"])
+
+
+class DailyActivitySeries(Sequence):
+    """
+    Daily activity history held column-wise in NumPy arrays, sorted by date.
+    Behaves like a list of DailyActivity: objects are only materialized when a
+    day is indexed or iterated, while slices and date/week queries return
+    views that share the underlying arrays
+    """
+
+    __slots__ = (
+        "ordinals",
+        "year",
+        "week_of_year",
+        "weekday",
+        "distance_in_miles",
+        "elevation_gain_in_feet",
+        "moving_time_in_minutes",
+        "pace_minutes_per_mile",
+        "activity_id_offsets",
+        "activity_ids",
+    )
+
+    def __init__(
+        self,
+        ordinals: np.ndarray,
+        year: np.ndarray,
+        week_of_year: np.ndarray,
+        weekday: np.ndarray,
+        distance_in_miles: np.ndarray,
+        elevation_gain_in_feet: np.ndarray,
+        moving_time_in_minutes: np.ndarray,
+        pace_minutes_per_mile: np.ndarray,
+        activity_id_offsets: np.ndarray,
+        activity_ids: np.ndarray,
+    ):
+        """
+        :param ordinals: date.toordinal() of each day, ascending
+        :param year: ISO year of each day
+        :param week_of_year: ISO week of each day
+        :param weekday: day of the week, Monday=0
+        :param distance_in_miles: rounded miles per day
+        :param elevation_gain_in_feet: rounded feet per day
+        :param moving_time_in_minutes: rounded minutes per day
+        :param pace_minutes_per_mile: rounded pace per day, NaN on rest days
+        :param activity_id_offsets: activity ids of day i are
+            activity_ids[activity_id_offsets[i]:activity_id_offsets[i + 1]]
+        :param activity_ids: activity ids of all days, concatenated
+        """
+        self.ordinals = ordinals
+        self.year = year
+        self.week_of_year = week_of_year
+        self.weekday = weekday
+        self.distance_in_miles = distance_in_miles
+        self.elevation_gain_in_feet = elevation_gain_in_feet
+        self.moving_time_in_minutes = moving_time_in_minutes
+        self.pace_minutes_per_mile = pace_minutes_per_mile
+        self.activity_id_offsets = activity_id_offsets
+        self.activity_ids = activity_ids
+
+    @classmethod
+    def from_daily_activity(
+        cls, daily_activity: List[DailyActivity]
+    ) -> "DailyActivitySeries":
+        """
+        Pack DailyActivity objects (sorted by date) into a series
+
+        :param daily_activity: List of DailyActivity objects
+        :return: DailyActivitySeries
+        """
+        ids_per_day = [day.activity_ids for day in daily_activity]
+        return cls(
+            ordinals=np.array(
+                [day.date.toordinal() for day in daily_activity], dtype=np.int64
+            ),
+            year=np.array([day.year for day in daily_activity], dtype=np.int64),
+            week_of_year=np.array(
+                [day.week_of_year for day in daily_activity], dtype=np.int64
+            ),
+            weekday=np.array(
+                [day.date.weekday() for day in daily_activity], dtype=np.int64
+            ),
+            distance_in_miles=np.array(
+                [day.distance_in_miles for day in daily_activity], dtype=float
+            ),
+            elevation_gain_in_feet=np.array(
+                [day.elevation_gain_in_feet for day in daily_activity], dtype=float
+            ),
+            moving_time_in_minutes=np.array(
+                [day.moving_time_in_minutes for day in daily_activity], dtype=float
+            ),
+            pace_minutes_per_mile=np.array(
+                [
+                    np.nan if day.pace_minutes_per_mile is None
+                    else day.pace_minutes_per_mile
+                    for day in daily_activity
+                ],
+                dtype=float,
+            ),
+            activity_id_offsets=np.concatenate(
+                [[0], np.cumsum([len(ids) for ids in ids_per_day], dtype=np.int64)]
+            ).astype(np.int64),
+            activity_ids=np.array(
+                [activity_id for ids in ids_per_day for activity_id in ids],
+                dtype=np.int64,
+            ),
+        )
+
+    def __len__(self) -> int:
+        return len(self.ordinals)
+
+    def _view(self, start: int, stop: int) -> "DailyActivitySeries":
+        return DailyActivitySeries(
+            ordinals=self.ordinals[start:stop],
+            year=self.year[start:stop],
+            week_of_year=self.week_of_year[start:stop],
+            weekday=self.weekday[start:stop],
+            distance_in_miles=self.distance_in_miles[start:stop],
+            elevation_gain_in_feet=self.elevation_gain_in_feet[start:stop],
+            moving_time_in_minutes=self.moving_time_in_minutes[start:stop],
+            pace_minutes_per_mile=self.pace_minutes_per_mile[start:stop],
+            activity_id_offsets=self.activity_id_offsets[start : max(start, stop) + 1],
+            activity_ids=self.activity_ids,
+        )
+
+    def _materialize(self, i: int) -> DailyActivity:
+        ids = self.activity_ids[
+            self.activity_id_offsets[i] : self.activity_id_offsets[i + 1]
+        ].tolist()
+        pace = float(self.pace_minutes_per_mile[i])
+        # every value below already has its field's type
+        return trusted_construct(
+            DailyActivity,
+            {
+                "date": datetime.date.fromordinal(int(self.ordinals[i])),
+                "day_of_week": str(DAYS_OF_WEEK[self.weekday[i]]),
+                "week_of_year": int(self.week_of_year[i]),
+                "year": int(self.year[i]),
+                "distance_in_miles": float(self.distance_in_miles[i]),
+                "elevation_gain_in_feet": float(self.elevation_gain_in_feet[i]),
+                "moving_time_in_minutes": float(self.moving_time_in_minutes[i]),
+                "pace_minutes_per_mile": None if np.isnan(pace) else pace,
+                "activity_ids": ids,
+                "activity_count": len(ids),
+            },
+            coerce=False,
+        )
+
+    def __getitem__(
+        self, index: Union[int, slice]
+    ) -> Union[DailyActivity, "DailyActivitySeries"]:
+        if isinstance(index, slice):
+            start, stop, step = index.indices(len(self))
+            if step != 1:
+                raise ValueError("DailyActivitySeries slices must be contiguous")
+            return self._view(start, stop)
+
+        if index < 0:
+            index += len(self)
+        if not 0 <= index < len(self):
+            raise IndexError("DailyActivitySeries index out of range")
+        return self._materialize(index)
+
+    def __iter__(self) -> Iterator[DailyActivity]:
+        for i in range(len(self)):
+            yield self._materialize(i)
+
+    def __eq__(self, other) -> bool:
+        if not isinstance(other, Sequence):
+            return NotImplemented
+        return len(self) == len(other) and all(a == b for a, b in zip(self, other))
+
+    def __repr__(self) -> str:
+        # prompts interpolate the history, render it exactly like a list
+        return repr(self.to_list())
+
+    def to_list(self) -> List[DailyActivity]:
+        """Materialize every day, e.g. at API boundaries"""
+        return list(self)
+
+    @property
+    def activity_count(self) -> np.ndarray:
+        """Number of activities per day"""
+        return np.diff(self.activity_id_offsets)
+
+    def between(
+        self, start_date: datetime.date, end_date: datetime.date
+    ) -> "DailyActivitySeries":
+        """
+        View of the days in [start_date, end_date]
+
+        :param start_date: first day, inclusive
+        :param end_date: last day, inclusive
+        :return: DailyActivitySeries
+        """
+        start = np.searchsorted(self.ordinals, start_date.toordinal(), side="left")
+        stop = np.searchsorted(self.ordinals, end_date.toordinal(), side="right")
+        return self._view(int(start), int(stop))
+
+    def iso_week(self, year: int, week_of_year: int) -> "DailyActivitySeries":
+        """
+        View of the days in an ISO week
+
+        :param year: ISO year
+        :param week_of_year: ISO week
+        :return: DailyActivitySeries
+        """
+        monday = datetime.date.fromisocalendar(year, week_of_year, 1)
+        return self.between(monday, monday + datetime.timedelta(days=6))
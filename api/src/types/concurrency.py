@@ -0,0 +1,6 @@
+from strenum import StrEnum
+
+
+class Dependency(StrEnum):
+    STRAVA = "strava"
+    SUPABASE = "supabase"
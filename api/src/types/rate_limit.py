@@ -0,0 +1,15 @@
+import datetime
+
+from pydantic import BaseModel
+
+
+class StravaRateLimit(BaseModel):
+    """Application-wide Strava usage, as last reported by Strava's headers"""
+
+    short_usage: int
+    """requests in the current 15 minute window"""
+    long_usage: int
+    """requests today (UTC)"""
+    short_limit: int
+    long_limit: int
+    updated_at: datetime.datetime
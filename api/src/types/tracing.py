@@ -0,0 +1,30 @@
+import datetime
+from typing import Optional
+
+from pydantic import BaseModel
+from strenum import StrEnum
+
+
+class SpanOutcome(StrEnum):
+    OK = "ok"
+    ERROR = "error"
+
+
+class Span(BaseModel):
+    """Timing of a single pipeline stage"""
+
+    name: str
+    athlete_id: Optional[int] = None
+    start: datetime.datetime
+    duration: float
+    outcome: SpanOutcome = SpanOutcome.OK
+    error: Optional[str] = None
+
+
+class StageLatency(BaseModel):
+    """Latency percentiles of a stage, in seconds"""
+
+    count: int
+    p50: float
+    p95: float
+    max: float
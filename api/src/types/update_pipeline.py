@@ -1,3 +1,8 @@
+import datetime
+from typing import Dict, List, Optional
+
+from pydantic import BaseModel
+from src.types.tracing import StageLatency
 from strenum import StrEnum
 
 
@@ -6,3 +11,66 @@ class ExeType(StrEnum):
     MID_WEEK = "mid_week"
 
 
+class LeaseStatus(StrEnum):
+    LEASED = "leased"
+    DONE = "done"
+    FAILED = "failed"
+
+
+class UpdateRunSummary(BaseModel):
+    """Throughput report for a single update_all_users run"""
+
+    exe_type: ExeType
+    n_users: int = 0
+    n_succeeded: int = 0
+    n_failed: int = 0
+    n_skipped: int = 0
+    n_deferred: int = 0
+    # left for tomorrow's mid-week run, see scheduler.UpdateScheduler
+    deferred_athlete_ids: List[int] = []
+    shard_index: int = 0
+    shard_count: int = 1
+    max_concurrent_users: int = 1
+    duration_seconds: float = 0.0
+    users_per_minute: float = 0.0
+    stage_latencies: Dict[str, StageLatency] = {}
+    # per model queue depth and token usage of llm.governor, see OpenAIGovernor.stats
+    openai_governor: Dict[str, dict] = {}
+    # hits and misses of llm.completion_cache during the run, see TTLCache.stats
+    llm_cache: Dict[str, float] = {}
+
+
+class UpdateRunStatus(StrEnum):
+    QUEUED = "queued"
+    RUNNING = "running"
+    COMPLETE = "complete"
+    FAILED = "failed"
+
+
+class UpdateRun(BaseModel):
+    """Database row representation of update_run table"""
+
+    job_id: str
+    run_key: Optional[str] = None
+    status: UpdateRunStatus = UpdateRunStatus.QUEUED
+    stage_durations: Dict[str, float] = {}
+    summary: Optional[dict] = None
+    error: Optional[str] = None
+    created_at: datetime.datetime
+    updated_at: datetime.datetime
+
+
+class UpdateRunProgress(BaseModel):
+    """Progress of an /update-all-users/ job"""
+
+    job_id: str
+    status: UpdateRunStatus
+    n_users: Optional[int] = None
+    n_done: int = 0
+    n_failed: int = 0
+    n_skipped: int = 0
+    n_deferred: int = 0
+    n_remaining: Optional[int] = None
+    elapsed_seconds: float
+    stage_durations: Dict[str, float] = {}
+    error: Optional[str] = None
@@ -34,6 +34,22 @@ class Preferences(BaseModel):
         return data
 
 
+class StravaToken(BaseModel):
+    """
+    The Strava credentials of a user, all a Strava client needs
+
+    :athlete_id: athlete ID provided by Strava
+    :access_token: Strava access token
+    :refresh_token: Strava refresh token
+    :expires_at: Strava access token expiration date
+    """
+
+    athlete_id: int
+    access_token: Optional[str] = None
+    refresh_token: Optional[str] = None
+    expires_at: Optional[datetime.datetime] = None
+
+
 class User(BaseModel):
     """
     Representing an application user
@@ -1,27 +1,56 @@
+import asyncio
 import datetime
 import logging
+import os
+import socket
+import time
 import traceback
-from typing import Optional
+from contextlib import contextmanager
+from typing import AbstractSet, Callable, Dict, List, Optional
+from uuid import uuid4
 
 from src import (
     activities,
     apn,
     auth_manager,
+    concurrency,
     email_manager,
+    llm,
     mileage_recommendation,
     supabase_client,
+    tracing,
     training_week,
     utils,
 )
-from src.constants import DEFAULT_ATHLETE_ID
+from src.constants import (
+    ATHLETE_LEASE_RENEW_SECONDS,
+    ATHLETE_LEASE_RETENTION_DAYS,
+    ATHLETE_LEASE_SECONDS,
+    DEFAULT_ATHLETE_ID,
+    MAX_CONCURRENT_USERS,
+    MAX_UPDATE_ATTEMPTS,
+    NIGHTLY_DEADLINE_HOUR,
+    RUN_EVENT_RETENTION_DAYS,
+    UPDATE_RUN_HEARTBEAT_SECONDS,
+    UPDATE_RUN_STALE_SECONDS,
+)
+from src.scheduler import UpdateScheduler
+from src.types.concurrency import Dependency
 from src.types.mileage_recommendation import MileageRecommendation
 from src.types.training_week import FullTrainingWeek
-from src.types.update_pipeline import ExeType
+from src.types.update_pipeline import (
+    ExeType,
+    UpdateRunProgress,
+    UpdateRunStatus,
+    UpdateRunSummary,
+)
 from src.types.user import User
 
 logger = logging.getLogger()
 logger.setLevel(logging.INFO)
 
+WORKER_ID = f"{socket.gethostname()}:{os.getpid()}:{uuid4().hex[:8]}"
+
 
 async def _update_training_week(
     user: User, exe_type: ExeType, dt: datetime.datetime
@@ -34,15 +63,28 @@ async def _update_training_week(
     :param dt: datetime injection, helpful for testing
     :return: FullTrainingWeek object
     """
-    strava_client = auth_manager.get_strava_client(user.athlete_id)
-    daily_activity = activities.get_daily_activity(strava_client, dt=dt, num_weeks=52)
+    with tracing.span("get_strava_client", user.athlete_id):
+        strava_client = await concurrency.run_in_thread(
+            Dependency.STRAVA, auth_manager.get_strava_client, user.athlete_id
+        )
+    with tracing.span("get_daily_activity", user.athlete_id):
+        daily_activity = await concurrency.run_in_thread(
+            Dependency.STRAVA,
+            activities.get_synced_daily_activity,
+            user.athlete_id,
+            strava_client,
+            dt=dt,
+            num_weeks=52,
+        )
 
-    mileage_rec = await mileage_recommendation.get_or_gen_mileage_recommendation(
-        user=user, daily_activity=daily_activity, exe_type=exe_type, dt=dt
-    )
+    with tracing.span("get_or_gen_mileage_recommendation", user.athlete_id):
+        mileage_rec = await mileage_recommendation.get_or_gen_mileage_recommendation(
+            user=user, exe_type=exe_type, dt=dt
+        )
 
     return await training_week.gen_full_training_week(
         user=user,
+        strava_client=strava_client,
         daily_activity=daily_activity,
         mileage_rec=mileage_rec,
         exe_type=exe_type,
@@ -62,11 +104,12 @@ async def update_training_week(
     :return: dict
     """
     training_week = await _update_training_week(user=user, exe_type=exe_type, dt=dt)
-    supabase_client.upsert_training_week(
-        athlete_id=user.athlete_id,
-        future_training_week=training_week.future_training_week,
-        past_training_week=training_week.past_training_week,
-    )
+    with tracing.span("upsert_training_week", user.athlete_id):
+        supabase_client.upsert_training_week(
+            athlete_id=user.athlete_id,
+            future_training_week=training_week.future_training_week,
+            past_training_week=training_week.past_training_week,
+        )
     return {"success": True}
 
 
@@ -82,7 +125,9 @@ async def update_training_week_wrapper(
     :return: dict
     """
     try:
-        response = await update_training_week(user, exe_type, dt)
+        with concurrency.athlete_context(user.athlete_id):
+            with tracing.span("update_training_week", user.athlete_id):
+                response = await update_training_week(user, exe_type, dt)
         apn.send_push_notif_wrapper(user)
         return response
     except Exception as e:
@@ -95,38 +140,425 @@ async def update_training_week_wrapper(
         return {"success": False, "error": error_message}
 
 
-async def update_all_users(dt: Optional[datetime.datetime] = None) -> dict:
+async def renew_athlete_lease(run_key: str, athlete_id: int) -> None:
+    """
+    Keep renewing this worker's lease on an athlete until cancelled
+
+    :param run_key: Identifies the run, shared by all workers of that run
+    :param athlete_id: The ID of the athlete
+    """
+    while True:
+        await asyncio.sleep(ATHLETE_LEASE_RENEW_SECONDS)
+        try:
+            await concurrency.run_in_thread(
+                Dependency.SUPABASE,
+                supabase_client.renew_athlete_lease,
+                run_key=run_key,
+                athlete_id=athlete_id,
+                worker_id=WORKER_ID,
+                lease_seconds=ATHLETE_LEASE_SECONDS,
+            )
+        except Exception as e:
+            logger.warning(f"Failed to renew lease of {athlete_id}: {e}")
+
+
+def get_run_key(exe_type: ExeType, dt: datetime.datetime) -> str:
+    """
+    Key shared by every worker taking part in the same nightly run
+
+    :param exe_type: ExeType object
+    :param dt: datetime of the run
+    :return: str
+    """
+    return f"{dt.date().isoformat()}:{exe_type}"
+
+
+def shard_users(users: List[User], shard_index: int, shard_count: int) -> List[User]:
+    """
+    Deterministically split users across shard_count workers
+
+    :param users: all users
+    :param shard_index: index of this worker's shard, in [0, shard_count)
+    :param shard_count: total number of shards
+    :return: users belonging to this shard
+    """
+    if not 0 <= shard_index < shard_count:
+        raise ValueError(f"Invalid shard: {shard_index=}, {shard_count=}")
+    return [user for user in users if user.athlete_id % shard_count == shard_index]
+
+
+async def fan_out_updates(
+    users: List[User],
+    exe_type: ExeType,
+    dt: datetime.datetime,
+    max_concurrent_users: int = MAX_CONCURRENT_USERS,
+    run_key: Optional[str] = None,
+    on_progress: Optional[Callable[[UpdateRunSummary], None]] = None,
+    deadline: Optional[datetime.datetime] = None,
+    ran_today: AbstractSet[int] = frozenset(),
+) -> UpdateRunSummary:
+    """
+    Run update_training_week_wrapper for many users at once, keeping at most
+    max_concurrent_users pipelines in flight. Calls to external dependencies
+    are further bounded by the limits in src.concurrency
+
+    When run_key is given, each user is claimed through the athlete_lease table
+    right before it is processed and its outcome is recorded there afterwards.
+    This lets many workers share the same user list, and lets a re-triggered
+    run skip finished athletes and retry only failed ones
+
+    Users are handed out by an UpdateScheduler in priority order. In mid-week
+    runs low priority users are deferred when the deadline is at risk, they
+    keep last night's training week and are recorded in the summary. New week
+    runs are never deferred, each athlete needs that week's mileage
+    recommendation
+
+    :param users: users to update
+    :param exe_type: ExeType object
+    :param dt: datetime injection, helpful for testing
+    :param max_concurrent_users: max number of pipelines in flight, 1 is serial
+    :param run_key: claim users under this run key, no claiming if None
+    :param on_progress: called with the running summary after each user
+    :param deadline: target completion time of the run, no deferral if None
+    :param ran_today: athlete_ids with a run on dt's date, updated first
+    :return: UpdateRunSummary with throughput of the run
+    """
+    start_time = time.monotonic()
+    n_workers = max(1, min(max_concurrent_users, len(users)))
+    summary = UpdateRunSummary(
+        exe_type=exe_type, n_users=len(users), max_concurrent_users=n_workers
+    )
+    scheduler = UpdateScheduler(
+        users,
+        dt=dt,
+        n_workers=n_workers,
+        deadline=deadline if exe_type == ExeType.MID_WEEK else None,
+        ran_today=ran_today,
+    )
+    llm.governor.reset_max_queue_depth()
+    llm.completion_cache.reset_stats()
+
+    async def report_progress():
+        if on_progress is None:
+            return
+        # serialized off the event loop while the workers keep counting
+        snapshot = summary.copy(deep=True)
+        try:
+            await concurrency.run_in_thread(Dependency.SUPABASE, on_progress, snapshot)
+        except Exception as e:
+            logger.warning(f"Failed to report update run progress: {e}")
+
+    async def claim_lease(user: User) -> bool:
+        if run_key is None:
+            return True
+        return await concurrency.run_in_thread(
+            Dependency.SUPABASE,
+            supabase_client.claim_athlete_lease,
+            run_key=run_key,
+            athlete_id=user.athlete_id,
+            worker_id=WORKER_ID,
+            lease_seconds=ATHLETE_LEASE_SECONDS,
+            max_attempts=MAX_UPDATE_ATTEMPTS,
+        )
+
+    async def complete_lease(user: User, error: Optional[str]) -> None:
+        if run_key is None:
+            return
+        try:
+            await concurrency.run_in_thread(
+                Dependency.SUPABASE,
+                supabase_client.complete_athlete_lease,
+                run_key=run_key,
+                athlete_id=user.athlete_id,
+                worker_id=WORKER_ID,
+                error=error,
+            )
+        except Exception as e:
+            # the lease expires and the athlete may be attempted again
+            logger.error(f"Failed to complete lease of {user.athlete_id}: {e}")
+
+    async def worker():
+        for user in scheduler:
+            try:
+                is_claimed = await claim_lease(user)
+            except Exception as e:
+                # a lease error costs this athlete, not the whole run
+                logger.error(f"Failed to claim lease of {user.athlete_id}: {e}")
+                summary.n_failed += 1
+                is_claimed = None
+
+            if is_claimed is False:
+                summary.n_skipped += 1
+            elif is_claimed:
+                update_start_time = time.monotonic()
+                renewal = (
+                    asyncio.create_task(renew_athlete_lease(run_key, user.athlete_id))
+                    if run_key is not None
+                    else None
+                )
+                try:
+                    response = await update_training_week_wrapper(
+                        user, exe_type, dt=dt
+                    )
+                finally:
+                    if renewal is not None:
+                        renewal.cancel()
+                scheduler.record_duration(time.monotonic() - update_start_time)
+                if response["success"]:
+                    summary.n_succeeded += 1
+                else:
+                    summary.n_failed += 1
+                await complete_lease(user, response.get("error"))
+
+            duration = time.monotonic() - start_time
+            n_processed = summary.n_succeeded + summary.n_failed
+            summary.n_deferred = len(scheduler.deferred)
+            summary.duration_seconds = round(duration, 2)
+            summary.users_per_minute = (
+                round(n_processed / duration * 60, 2) if duration else 0.0
+            )
+            summary.openai_governor = llm.governor.stats()
+            summary.llm_cache = llm.completion_cache.stats()
+            await report_progress()
+
+    await report_progress()
+    with tracing.collect_spans() as spans:
+        await asyncio.gather(*(worker() for _ in range(n_workers)))
+    summary.n_deferred = len(scheduler.deferred)
+    summary.deferred_athlete_ids = [user.athlete_id for user in scheduler.deferred]
+    summary.openai_governor = llm.governor.stats()
+    summary.llm_cache = llm.completion_cache.stats()
+    summary.stage_latencies = tracing.summarize_spans(spans)
+
+    logger.info(f"Update run complete: {summary}, limits={concurrency.get_limits()}")
+    return summary
+
+
+@contextmanager
+def timed_stage(stage_durations: Dict[str, float], stage: str):
+    """
+    Record the wall-clock duration of a stage of the nightly run
+
+    :param stage_durations: mapping of stage name to duration in seconds
+    :param stage: name of the stage
+    """
+    start_time = time.monotonic()
+    try:
+        yield
+    finally:
+        stage_durations[stage] = round(time.monotonic() - start_time, 2)
+
+
+async def update_all_users(
+    dt: Optional[datetime.datetime] = None,
+    max_concurrent_users: int = MAX_CONCURRENT_USERS,
+    shard_index: int = 0,
+    shard_count: int = 1,
+    job_id: Optional[str] = None,
+    deadline: Optional[datetime.datetime] = None,
+) -> dict:
     """
     Evenings excluding Sunday: Send update to users who have not yet triggered an update today
     Sunday evening: Send new training week to all active users
 
+    Every run is checkpointed per athlete in the athlete_lease table under a
+    key derived from the date, so re-triggering the same night resumes the run.
+    The same claims let replicas split the work dynamically; shard_index and
+    shard_count split it statically instead
+
+    :param dt: datetime injection, helpful for testing
+    :param max_concurrent_users: max number of users updated at once, 1 is serial
+    :param shard_index: index of this worker's shard, in [0, shard_count)
+    :param shard_count: total number of shards
+    :param job_id: report stages and progress to this update_run row
+    :param deadline: target completion time, defaults to NIGHTLY_DEADLINE_HOUR tonight
     :return: dict
     """
 
     if dt is None:
         dt = utils.datetime_now_est()
 
+    if deadline is None:
+        now = utils.datetime_now_est()
+        deadline = now.replace(hour=NIGHTLY_DEADLINE_HOUR, minute=59, second=0)
+        if deadline <= now:
+            deadline = None
+
+    stage_durations: Dict[str, float] = {}
+
+    def report(**fields):
+        if job_id is not None:
+            supabase_client.update_update_run(
+                job_id, stage_durations=stage_durations, **fields
+            )
+
+    with timed_stage(stage_durations, "list_users"):
+        users = [
+            user
+            for user in supabase_client.list_users()
+            if user.athlete_id != DEFAULT_ATHLETE_ID
+        ]
+        users = shard_users(users, shard_index=shard_index, shard_count=shard_count)
+    report()
+
+    with timed_stage(stage_durations, "list_runs_today"):
+        midnight = dt.replace(hour=0, minute=0, second=0, microsecond=0)
+        ran_today = supabase_client.list_athlete_ids_with_run_events_since(midnight)
+    report()
+
     if dt.weekday() != 6:
-        for user in supabase_client.list_users():
-            if user.athlete_id == DEFAULT_ATHLETE_ID:
-                continue
-            if supabase_client.has_user_updated_today(user.athlete_id):
-                continue
-            await update_training_week_wrapper(user, ExeType.MID_WEEK, dt=dt)
+        exe_type = ExeType.MID_WEEK
+        with timed_stage(stage_durations, "filter_users"):
+            updated_today = supabase_client.list_athlete_ids_updated_today()
+            users = [user for user in users if user.athlete_id not in updated_today]
+        report()
     else:
         # all users get a new training week on Sunday night
-        for user in supabase_client.list_users():
-            if user.athlete_id == DEFAULT_ATHLETE_ID:
-                continue
-            await update_training_week_wrapper(
-                user, ExeType.NEW_WEEK, dt=utils.get_last_sunday()
+        exe_type = ExeType.NEW_WEEK
+        dt = utils.get_last_sunday()
+
+    run_key = get_run_key(exe_type, dt)
+    report(run_key=run_key)
+    try:
+        supabase_client.delete_athlete_leases_before(
+            datetime.datetime.now(datetime.timezone.utc)
+            - datetime.timedelta(days=ATHLETE_LEASE_RETENTION_DAYS)
+        )
+    except Exception as e:
+        logger.warning(f"Failed to delete expired athlete leases: {e}")
+    try:
+        supabase_client.delete_run_events_before(
+            midnight - datetime.timedelta(days=RUN_EVENT_RETENTION_DAYS)
+        )
+    except Exception as e:
+        logger.warning(f"Failed to delete expired run events: {e}")
+    with timed_stage(stage_durations, "update_users"):
+        summary = await fan_out_updates(
+            users,
+            exe_type,
+            dt=dt,
+            max_concurrent_users=max_concurrent_users,
+            run_key=run_key,
+            on_progress=lambda summary: report(summary=summary.dict()),
+            deadline=deadline,
+            ran_today=ran_today,
+        )
+    summary.shard_index = shard_index
+    summary.shard_count = shard_count
+    report(summary=summary.dict())
+    return {"success": True, **summary.dict()}
+
+
+async def heartbeat_update_run(job_id: str) -> None:
+    """
+    Bump the update_run row's updated_at until cancelled, so a job that dies
+    without recording its outcome shows up as stale
+
+    :param job_id: Identifies the /update-all-users/ job
+    """
+    while True:
+        await asyncio.sleep(UPDATE_RUN_HEARTBEAT_SECONDS)
+        try:
+            await concurrency.run_in_thread(
+                Dependency.SUPABASE, supabase_client.update_update_run, job_id
             )
-    return {"success": True}
+        except Exception as e:
+            logger.warning(f"Failed to heartbeat update_run {job_id}: {e}")
+
+
+async def run_update_all_users_job(job_id: str, **kwargs) -> None:
+    """
+    Run update_all_users in the background as the given job, recording its
+    status in the update_run table
+
+    :param job_id: Identifies the /update-all-users/ job
+    :param kwargs: forwarded to update_all_users
+    """
+    supabase_client.update_update_run(job_id, status=UpdateRunStatus.RUNNING)
+    heartbeat = asyncio.create_task(heartbeat_update_run(job_id))
+    try:
+        await update_all_users(job_id=job_id, **kwargs)
+        supabase_client.update_update_run(job_id, status=UpdateRunStatus.COMPLETE)
+    except Exception as e:
+        error_message = f"Error running update_all_users job {job_id}: {e}\n{traceback.format_exc()}"
+        logger.error(error_message)
+        supabase_client.update_update_run(
+            job_id, status=UpdateRunStatus.FAILED, error=error_message
+        )
+        email_manager.send_alert_email(
+            subject="Crush Your Race Update Pipeline Error 😵‍💫",
+            text_content=error_message,
+        )
+    finally:
+        heartbeat.cancel()
+
+
+def get_update_run_progress(job_id: str) -> UpdateRunProgress:
+    """
+    Progress of an /update-all-users/ job. A queued or running job whose
+    heartbeat went stale died without recording its outcome and is reported as
+    failed, re-triggering the run resumes from its athlete checkpoints
+
+    :param job_id: Identifies the /update-all-users/ job
+    :return: UpdateRunProgress
+    """
+    update_run = supabase_client.get_update_run(job_id)
+    now = datetime.datetime.now(datetime.timezone.utc)
+    status, error = update_run.status, update_run.error
+    silent_seconds = (now - update_run.updated_at).total_seconds()
+    if (
+        status in (UpdateRunStatus.QUEUED, UpdateRunStatus.RUNNING)
+        and silent_seconds > UPDATE_RUN_STALE_SECONDS
+    ):
+        status = UpdateRunStatus.FAILED
+        error = (
+            f"No heartbeat since {update_run.updated_at.isoformat()}, the job "
+            "stopped without finishing. POST /update-all-users/ again to resume"
+        )
+
+    end_time = (
+        update_run.updated_at
+        if status in (UpdateRunStatus.COMPLETE, UpdateRunStatus.FAILED)
+        else now
+    )
+    progress = UpdateRunProgress(
+        job_id=job_id,
+        status=status,
+        elapsed_seconds=round((end_time - update_run.created_at).total_seconds(), 2),
+        stage_durations=update_run.stage_durations,
+        error=error,
+    )
+    if update_run.summary is not None:
+        summary = UpdateRunSummary(**update_run.summary)
+        progress.n_users = summary.n_users
+        progress.n_done = summary.n_succeeded
+        progress.n_failed = summary.n_failed
+        progress.n_skipped = summary.n_skipped
+        progress.n_deferred = summary.n_deferred
+        progress.n_remaining = summary.n_users - (
+            summary.n_succeeded
+            + summary.n_failed
+            + summary.n_skipped
+            + summary.n_deferred
+        )
+    return progress
 
 
 async def refresh_user_data(
     user: User, dt: datetime.datetime = utils.datetime_now_est()
 ) -> dict:
+    """
+    Refresh user data, scoped to the athlete's in-flight limit
+
+    :param user: User object
+    :param dt: datetime injection, helpful for testing
+    :return: dict
+    """
+    with concurrency.athlete_context(user.athlete_id):
+        return await _refresh_user_data(user, dt=dt)
+
+
+async def _refresh_user_data(user: User, dt: datetime.datetime) -> dict:
     """
     Refresh user data
 
@@ -137,30 +569,50 @@ async def refresh_user_data(
     # when refresh triggered on sundays, we need to step into next week
     dt_tomorrow = dt + datetime.timedelta(days=1)
 
-    strava_client = auth_manager.get_strava_client(user.athlete_id)
-    daily_activity = activities.get_daily_activity(
-        strava_client, dt=utils.get_last_sunday(dt), num_weeks=52
-    )
+    with tracing.span("get_strava_client", user.athlete_id):
+        strava_client = await concurrency.run_in_thread(
+            Dependency.STRAVA, auth_manager.get_strava_client, user.athlete_id
+        )
+    # the training plan reads a year of weekly rollups, kept current by the sync
+    with tracing.span("sync_activities", user.athlete_id):
+        await concurrency.run_in_thread(
+            Dependency.STRAVA,
+            activities.sync_activities,
+            user.athlete_id,
+            strava_client,
+            start_date=utils.get_last_sunday(dt) - datetime.timedelta(weeks=52),
+            dt=utils.get_last_sunday(dt),
+        )
 
-    await mileage_recommendation.create_new_mileage_recommendation(
-        user=user,
-        daily_activity=daily_activity,
-        dt=utils.get_last_sunday(dt),
-    )
+    with tracing.span("create_new_mileage_recommendation", user.athlete_id):
+        await mileage_recommendation.create_new_mileage_recommendation(
+            user=user,
+            dt=utils.get_last_sunday(dt),
+        )
 
-    mileage_recommendation_row = supabase_client.get_mileage_recommendation(
-        athlete_id=user.athlete_id, dt=dt_tomorrow
-    )
+    with tracing.span("get_mileage_recommendation", user.athlete_id):
+        mileage_recommendation_row = supabase_client.get_mileage_recommendation(
+            athlete_id=user.athlete_id, dt=dt_tomorrow
+        )
     mileage_rec = MileageRecommendation(
         thoughts=mileage_recommendation_row.thoughts,
         total_volume=mileage_recommendation_row.total_volume,
         long_run=mileage_recommendation_row.long_run,
     )
 
-    daily_activity = activities.get_daily_activity(strava_client, dt=dt, num_weeks=3)
+    with tracing.span("get_daily_activity", user.athlete_id):
+        daily_activity = await concurrency.run_in_thread(
+            Dependency.STRAVA,
+            activities.get_synced_daily_activity,
+            user.athlete_id,
+            strava_client,
+            dt=dt,
+            num_weeks=3,
+        )
 
     training_week_obj = await training_week.gen_full_training_week(
         user=user,
+        strava_client=strava_client,
         daily_activity=daily_activity,
         mileage_rec=mileage_rec,
         exe_type=(
@@ -169,9 +621,10 @@ async def refresh_user_data(
         dt=dt,
     )
 
-    supabase_client.upsert_training_week(
-        athlete_id=user.athlete_id,
-        future_training_week=training_week_obj.future_training_week,
-        past_training_week=training_week_obj.past_training_week,
-    )
+    with tracing.span("upsert_training_week", user.athlete_id):
+        supabase_client.upsert_training_week(
+            athlete_id=user.athlete_id,
+            future_training_week=training_week_obj.future_training_week,
+            past_training_week=training_week_obj.past_training_week,
+        )
     return {"success": True}
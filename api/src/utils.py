@@ -2,6 +2,7 @@ import datetime
 from zoneinfo import ZoneInfo
 
 from pydantic import BaseModel
+from src.model_construct import round_model_floats
 
 
 def datetime_now_est() -> datetime.datetime:
@@ -23,14 +24,7 @@ def make_tz_aware(dt: datetime.datetime) -> datetime.datetime:
 
 def round_all_floats(model: BaseModel, precision: int = 2) -> BaseModel:
     """Round all float fields in a pydantic model to a given precision"""
-    for field_name, field in model.__fields__.items():
-        if (
-            isinstance(field.type_, type)
-            and issubclass(field.type_, float)
-            and getattr(model, field_name) is not None
-        ):
-            setattr(model, field_name, round(getattr(model, field_name), precision))
-    return model
+    return round_model_floats(model, precision)
 
 
 def get_last_sunday(dt: datetime.datetime = datetime_now_est()) -> datetime.datetime:
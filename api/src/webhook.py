@@ -1,21 +1,39 @@
-from src import auth_manager, supabase_client, utils
+import datetime
+
+from src import auth_manager, concurrency, supabase_client, utils
+from src.types.concurrency import Dependency
 from src.types.update_pipeline import ExeType
 from src.types.webhook import StravaEvent
 from src.update_pipeline import update_training_week_wrapper
 
 
-def handle_activity_create(event: StravaEvent) -> dict:
+async def handle_activity_create(event: StravaEvent) -> dict:
     """
     Handle the creation of a Strava activity
 
     :param event: Strava webhook event
     """
     user = supabase_client.get_user(event.owner_id)
-    strava_client = auth_manager.get_strava_client(user.athlete_id)
-    activity = strava_client.get_activity(event.object_id)
+    strava_client = await concurrency.run_in_thread(
+        Dependency.STRAVA, auth_manager.get_strava_client, user.athlete_id
+    )
+    activity = await concurrency.run_in_thread(
+        Dependency.STRAVA, strava_client.get_activity, event.object_id
+    )
 
     if activity.sport_type == "Run":
-        return update_training_week_wrapper(
+        # recorded before the update, so that the nightly run still puts this
+        # athlete first if the update below fails
+        await concurrency.run_in_thread(
+            Dependency.SUPABASE,
+            supabase_client.upsert_run_event,
+            athlete_id=user.athlete_id,
+            activity_id=event.object_id,
+            event_time=datetime.datetime.fromtimestamp(
+                event.event_time, tz=datetime.timezone.utc
+            ),
+        )
+        return await update_training_week_wrapper(
             user=user,
             exe_type=ExeType.MID_WEEK,
             dt=utils.datetime_now_est(),
@@ -26,7 +44,7 @@ def handle_activity_create(event: StravaEvent) -> dict:
     }
 
 
-def maybe_process_strava_event(event: StravaEvent) -> dict:
+async def maybe_process_strava_event(event: StravaEvent) -> dict:
     """
     Process the Strava webhook event. Perform any updates based on the event data.
     Strava Event: subscription_id=2****3 aspect_type='create' object_type='activity' object_id=1*********4 owner_id=9******6 event_time=1731515741 updates={}
@@ -36,7 +54,7 @@ def maybe_process_strava_event(event: StravaEvent) -> dict:
     :return: Success status and error message if any
     """
     if event.aspect_type == "create":
-        return handle_activity_create(event)
+        return await handle_activity_create(event)
     else:
         return {
             "success": False,
@@ -0,0 +1,277 @@
+import datetime
+from zoneinfo import ZoneInfo
+
+from src import activities, activity_engine, constants, supabase_client
+from src.types.activity import Activity, ActivitySync
+from tests import reference_activities
+
+
+class FakeStravaClient:
+    def __init__(self, runs):
+        self.runs = runs
+        self.windows = []
+
+    def get_activities(self, after, before):
+        self.windows.append((after, before))
+        return FakeActivityPages(
+            run for run in self.runs if after <= run.start_date <= before
+        )
+
+
+class FakeActivityPages(list):
+    per_page = 200
+
+
+class FakeRun:
+    def __init__(self, activity_id, start_date):
+        self.sport_type = "Run"
+        self.__dict__.update(
+            Activity(
+                id=activity_id,
+                distance=5000,
+                moving_time=datetime.timedelta(minutes=25),
+                start_date=start_date,
+                start_date_local=start_date.replace(tzinfo=None),
+            ).__dict__
+        )
+
+
+def reference_daily_activity(runs, dt, num_weeks):
+    start_date = dt - datetime.timedelta(weeks=num_weeks)
+    window = [
+        Activity(**run.__dict__)
+        for run in runs
+        if start_date <= run.start_date <= dt
+    ]
+    return reference_activities.aggregate_daily_activity(
+        reference_activities.add_missing_dates(window, start_date, end_date=dt)
+    )
+
+
+def patch_activity_store(monkeypatch):
+    store, syncs, rollups = {}, {}, {}
+    monkeypatch.setattr(supabase_client, "get_activity_sync", syncs.get)
+    monkeypatch.setattr(
+        supabase_client,
+        "upsert_activity_sync",
+        lambda activity_sync: syncs.update({activity_sync.athlete_id: activity_sync}),
+    )
+    monkeypatch.setattr(
+        supabase_client,
+        "upsert_activities",
+        lambda athlete_id, runs: store.update({run.id: run for run in runs}),
+    )
+    monkeypatch.setattr(
+        supabase_client,
+        "iter_activities",
+        lambda athlete_id, after, before: iter(
+            sorted(
+                (run for run in store.values() if after <= run.start_date <= before),
+                key=lambda run: run.start_date,
+            )
+        ),
+    )
+    monkeypatch.setattr(
+        supabase_client,
+        "upsert_weekly_rollups",
+        lambda rows: rollups.update(
+            {(row.athlete_id, row.year, row.week_of_year): row for row in rows}
+        ),
+    )
+    monkeypatch.setattr(
+        supabase_client,
+        "list_weekly_rollups",
+        lambda athlete_id, start_date, end_date: sorted(
+            (
+                row
+                for row in rollups.values()
+                if row.athlete_id == athlete_id
+                and start_date <= row.week_start_date <= end_date
+            ),
+            key=lambda row: row.week_start_date,
+        ),
+    )
+    return store, syncs, rollups
+
+
+def test_sync_activities_only_fetches_past_watermark(monkeypatch):
+    _, syncs, _ = patch_activity_store(monkeypatch)
+
+    dt = datetime.datetime(2024, 10, 9, 12, tzinfo=datetime.timezone.utc)
+    runs = [FakeRun(i, dt - datetime.timedelta(days=i)) for i in range(60)]
+    strava_client = FakeStravaClient(runs)
+
+    first = activities.get_synced_daily_activity(1, strava_client, dt, num_weeks=4)
+    assert first == reference_daily_activity(runs, dt, num_weeks=4)
+
+    # next day: only the overlap past the watermark is re-fetched
+    strava_client.windows.clear()
+    next_dt = dt + datetime.timedelta(days=1)
+    activities.get_synced_daily_activity(1, strava_client, next_dt, num_weeks=4)
+    overlap = datetime.timedelta(days=constants.ACTIVITY_SYNC_OVERLAP_DAYS)
+    assert strava_client.windows == [(dt - overlap, next_dt)]
+    assert syncs[1].last_synced_at == next_dt
+
+    # a longer window backfills history before synced_from
+    strava_client.windows.clear()
+    activities.get_synced_daily_activity(1, strava_client, next_dt, num_weeks=6)
+    assert strava_client.windows == [
+        (next_dt - datetime.timedelta(weeks=6), dt - datetime.timedelta(weeks=4))
+    ]
+    assert syncs[1].synced_from == next_dt - datetime.timedelta(weeks=6)
+
+
+def test_sync_activities_accepts_naive_datetimes(monkeypatch):
+    """utils.get_last_sunday() is naive while the stored sync state is aware"""
+    _, syncs, _ = patch_activity_store(monkeypatch)
+
+    dt = datetime.datetime(2024, 10, 6, 12, tzinfo=ZoneInfo("America/New_York"))
+    runs = [FakeRun(i, dt - datetime.timedelta(days=i)) for i in range(60)]
+    strava_client = FakeStravaClient(runs)
+    activities.get_synced_daily_activity(1, strava_client, dt, num_weeks=4)
+    assert syncs[1].last_synced_at.tzinfo is not None
+
+    naive_dt = (dt + datetime.timedelta(days=1)).replace(tzinfo=None)
+    strava_client.windows.clear()
+    activities.sync_activities(
+        1,
+        strava_client,
+        start_date=naive_dt - datetime.timedelta(weeks=6),
+        dt=naive_dt,
+    )
+    assert syncs[1].synced_from == dt + datetime.timedelta(days=1, weeks=-6)
+    assert syncs[1].last_synced_at == dt + datetime.timedelta(days=1)
+    assert len(strava_client.windows) == 2
+
+    daily_activity = activities.get_synced_daily_activity(
+        1, strava_client, naive_dt, num_weeks=4
+    )
+    assert daily_activity[-1].date == naive_dt.date()
+    assert activities.get_weekly_summaries(1, naive_dt, num_weeks=4)
+
+
+def test_weekly_rollups_follow_synced_activities(monkeypatch):
+    _, _, rollups = patch_activity_store(monkeypatch)
+
+    dt = datetime.datetime(2024, 10, 9, 12, tzinfo=datetime.timezone.utc)
+    runs = [
+        FakeRun(i, dt - datetime.timedelta(days=i, hours=i % 3)) for i in range(90)
+    ]
+    strava_client = FakeStravaClient(runs)
+
+    def expected_summaries(dt, num_weeks):
+        return activity_engine.get_weekly_summaries(
+            reference_daily_activity(runs, dt, num_weeks)
+        )
+
+    activities.get_synced_daily_activity(1, strava_client, dt, num_weeks=8)
+    assert activities.get_weekly_summaries(1, dt, num_weeks=8) == expected_summaries(
+        dt, 8
+    )
+
+    # a late upload lands in an already rolled up week
+    late_run = FakeRun(1000, dt - datetime.timedelta(days=2, hours=5))
+    runs.append(late_run)
+    next_dt = dt + datetime.timedelta(days=1)
+    activities.get_synced_daily_activity(1, strava_client, next_dt, num_weeks=8)
+    summaries = activities.get_weekly_summaries(1, next_dt, num_weeks=8)
+    assert summaries == expected_summaries(next_dt, 8)
+    first_week_start = summaries[0].week_start_date
+    assert sum(rollup.run_count for rollup in rollups.values()) == len(
+        [run for run in runs if run.start_date_local.date() >= first_week_start]
+    )
+
+    # weeks missing from the rollup are rebuilt from the activity store
+    rollups.clear()
+    assert activities.get_weekly_summaries(1, next_dt, num_weeks=8) == summaries
+
+
+def test_weekly_summaries_rebuild_stops_at_watermark(monkeypatch):
+    """Weeks past last_synced_at are not rolled up from a partial store"""
+    _, syncs, rollups = patch_activity_store(monkeypatch)
+
+    dt = datetime.datetime(2024, 10, 9, 12, tzinfo=datetime.timezone.utc)
+    runs = [FakeRun(i, dt - datetime.timedelta(days=i)) for i in range(60)]
+    activities.get_synced_daily_activity(1, FakeStravaClient(runs), dt, num_weeks=8)
+
+    rollups.clear()
+    next_week = dt + datetime.timedelta(weeks=1)
+    summaries = activities.get_weekly_summaries(1, next_week, num_weeks=8)
+    assert summaries[-1].week_start_date == activities.get_week_start(dt.date())
+    assert syncs[1].last_synced_at == dt
+
+
+def test_is_synced():
+    dt = datetime.datetime(2024, 10, 9, 12, tzinfo=datetime.timezone.utc)
+    start_date = dt - datetime.timedelta(weeks=8)
+    activity_sync = ActivitySync(
+        athlete_id=1,
+        synced_from=start_date,
+        last_synced_at=dt - datetime.timedelta(hours=6),
+    )
+
+    assert activities.is_synced(activity_sync, start_date, dt)
+    assert not activities.is_synced(None, start_date, dt)
+    # history before the stored window
+    assert not activities.is_synced(
+        activity_sync, start_date - datetime.timedelta(days=1), dt
+    )
+    # a stale watermark
+    assert not activities.is_synced(
+        activity_sync, start_date, dt + constants.ACTIVITY_SYNC_MAX_AGE
+    )
+
+
+def test_store_runs_streams_pages_into_store(monkeypatch):
+    store, _, _ = patch_activity_store(monkeypatch)
+    upsert_activities = supabase_client.upsert_activities
+    page_sizes = []
+
+    def upsert_page(athlete_id, runs):
+        page_sizes.append(len(runs))
+        upsert_activities(athlete_id, runs)
+
+    monkeypatch.setattr(supabase_client, "upsert_activities", upsert_page)
+
+    dt = datetime.datetime(2024, 10, 9, 12, tzinfo=datetime.timezone.utc)
+    runs = [FakeRun(i, dt - datetime.timedelta(days=i)) for i in range(10)]
+    activities.store_runs(
+        1,
+        FakeStravaClient(runs),
+        after=dt - datetime.timedelta(weeks=4),
+        before=dt,
+        page_size=3,
+    )
+
+    assert page_sizes == [3, 3, 3, 1]
+    assert sorted(store) == list(range(10))
+
+
+def test_store_runs_fetches_sub_ranges(monkeypatch):
+    store, _, _ = patch_activity_store(monkeypatch)
+    dt = datetime.datetime(2024, 10, 9, 12, tzinfo=datetime.timezone.utc)
+    after = dt - datetime.timedelta(weeks=52)
+    runs = [FakeRun(i, dt - datetime.timedelta(days=i)) for i in range(0, 364, 2)]
+    strava_client = FakeStravaClient(runs)
+
+    activities.store_runs(1, strava_client, after=after, before=dt)
+
+    assert len(strava_client.windows) == 4
+    assert strava_client.windows[0][0] == after
+    assert strava_client.windows[-1][1] == dt
+    assert sorted(store) == sorted(run.id for run in runs)
+
+
+def test_synced_daily_activity_matches_reference_aggregation(monkeypatch):
+    patch_activity_store(monkeypatch)
+    dt = datetime.datetime(2024, 10, 9, 12, tzinfo=datetime.timezone.utc)
+    runs = [FakeRun(i, dt - datetime.timedelta(days=i, hours=i % 5)) for i in range(200)]
+    # a double day
+    runs.append(FakeRun(1000, dt - datetime.timedelta(days=3, hours=6)))
+
+    streamed = activities.get_synced_daily_activity(
+        1, FakeStravaClient(runs), dt, num_weeks=30
+    )
+
+    assert streamed == reference_daily_activity(runs, dt, num_weeks=30)
+    assert any(day.activity_count == 2 for day in streamed)
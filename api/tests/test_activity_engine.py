@@ -0,0 +1,73 @@
+import datetime
+import random
+
+import numpy as np
+import pytest
+from src import activity_engine
+from src.types.activity import Activity
+from tests import reference_activities
+
+
+def gen_activities(seed, start_date, end_date):
+    rng = random.Random(seed)
+    runs = []
+    n_days = (end_date - start_date).days
+    for i in range(rng.randint(0, 3 * n_days // 2)):
+        start = start_date + datetime.timedelta(
+            days=rng.randint(-1, n_days + 1), minutes=rng.randint(0, 24 * 60 - 1)
+        )
+        runs.append(
+            Activity(
+                id=i,
+                distance=rng.choice([0.0, rng.uniform(1000, 30000)]),
+                moving_time=datetime.timedelta(seconds=rng.randint(0, 10800)),
+                total_elevation_gain=rng.uniform(0, 500),
+                start_date=start,
+                start_date_local=start,
+            )
+        )
+    return runs
+
+
+@pytest.mark.parametrize("seed", range(20))
+def test_engine_matches_reference_implementation(seed):
+    end_date = datetime.datetime(2024, 12, 29, 20) + datetime.timedelta(days=seed * 17)
+    start_date = end_date - datetime.timedelta(weeks=random.Random(seed).randint(2, 60))
+    runs = gen_activities(seed, start_date, end_date)
+
+    reference = reference_activities.aggregate_daily_activity(
+        reference_activities.add_missing_dates(runs, start_date=start_date, end_date=end_date)
+    )
+    daily_activity = activity_engine.aggregate_daily_activity(
+        runs, start_date=start_date, end_date=end_date
+    )
+    assert daily_activity == reference
+
+    assert activity_engine.get_weekly_summaries(
+        daily_activity
+    ) == reference_activities.aggregate_weekly_activity(reference)
+
+
+def test_round_floats_matches_builtin_round():
+    rng = np.random.default_rng(0)
+    values = np.concatenate(
+        [
+            rng.uniform(0, 1000, 10000),
+            np.arange(0, 100, 0.005),  # halfway values
+            [2.675, 1.005, 0.285, 0.0],
+        ]
+    )
+    assert activity_engine.round_floats(values).tolist() == [
+        round(value, 2) for value in values.tolist()
+    ]
+
+
+def test_iso_calendar_matches_date_isocalendar():
+    dates = [datetime.date(2015, 12, 20) + datetime.timedelta(days=i) for i in range(4000)]
+    iso_year, iso_week, weekday = activity_engine.iso_calendar(
+        np.array([date.toordinal() for date in dates])
+    )
+    assert list(zip(iso_year.tolist(), iso_week.tolist(), weekday.tolist())) == [
+        (date.isocalendar().year, date.isocalendar().week, date.weekday())
+        for date in dates
+    ]
@@ -0,0 +1,52 @@
+import datetime
+
+import pytest
+from src.types.activity import Activity
+from src.types.activity_series import DailyActivitySeries
+from tests import reference_activities
+
+
+@pytest.fixture
+def daily_activity():
+    end_date = datetime.datetime(2024, 10, 9, 20)
+    start_date = end_date - datetime.timedelta(weeks=8)
+    runs = [
+        Activity(
+            id=i,
+            distance=5000 + i,
+            moving_time=datetime.timedelta(minutes=25),
+            start_date=end_date - datetime.timedelta(days=2 * i),
+            start_date_local=end_date - datetime.timedelta(days=2 * i),
+        )
+        for i in range(25)
+    ]
+    return reference_activities.aggregate_daily_activity(
+        reference_activities.add_missing_dates(runs, start_date=start_date, end_date=end_date)
+    )
+
+
+def test_series_round_trips_daily_activity(daily_activity):
+    series = DailyActivitySeries.from_daily_activity(daily_activity)
+
+    assert not hasattr(series, "__dict__")
+    assert len(series) == len(daily_activity)
+    assert series == daily_activity
+    assert series[-1] == daily_activity[-1]
+    assert series[-3:] == daily_activity[-3:]
+    assert repr(series) == repr(daily_activity)
+    assert series.activity_count.tolist() == [
+        day.activity_count for day in daily_activity
+    ]
+
+
+def test_series_views_by_date_range_and_iso_week(daily_activity):
+    series = DailyActivitySeries.from_daily_activity(daily_activity)
+    start, end = datetime.date(2024, 9, 20), datetime.date(2024, 9, 26)
+
+    assert series.between(start, end) == [
+        day for day in daily_activity if start <= day.date <= end
+    ]
+    assert series.iso_week(2024, 39) == [
+        day for day in daily_activity if (day.year, day.week_of_year) == (2024, 39)
+    ]
+    assert len(series.between(end, start)) == 0
@@ -0,0 +1,38 @@
+import datetime
+
+from src.activity_timeline import ActivityTimeline
+from src.types.activity import Activity
+from tests import reference_activities
+
+
+def gen_daily_activity(end_date, num_weeks):
+    start_date = end_date - datetime.timedelta(weeks=num_weeks)
+    runs = [
+        Activity(
+            id=i,
+            distance=3000 + 100 * i,
+            moving_time=datetime.timedelta(minutes=20),
+            start_date=end_date - datetime.timedelta(days=i * 3 // 2),
+            start_date_local=end_date - datetime.timedelta(days=i * 3 // 2),
+        )
+        for i in range(num_weeks * 4)
+    ]
+    return reference_activities.aggregate_daily_activity(
+        reference_activities.add_missing_dates(runs, start_date=start_date, end_date=end_date)
+    )
+
+
+def test_timeline_queries_match_scans():
+    end_date = datetime.datetime(2025, 1, 2, 18)  # a Thursday, ISO week 2025-1
+    daily_activity = gen_daily_activity(end_date, num_weeks=20)
+    timeline = ActivityTimeline.from_daily_activity(daily_activity)
+
+    for day in daily_activity:
+        assert timeline.previous_days(day.date) == [
+            other
+            for other in daily_activity
+            if day.date - datetime.timedelta(days=7) < other.date < day.date
+        ]
+
+    days_so_far = end_date.weekday() + 1
+    assert timeline.week_to_date(timeline.end_date) == daily_activity[-days_so_far:]
@@ -0,0 +1,93 @@
+import asyncio
+import datetime
+import time
+from types import SimpleNamespace
+
+import pytest
+from fastapi import HTTPException
+from fastapi.security import HTTPAuthorizationCredentials
+from src import auth_manager, concurrency, supabase_client
+from src.types.concurrency import Dependency
+from src.types.user import User
+
+
+def bearer(token):
+    return HTTPAuthorizationCredentials(scheme="Bearer", credentials=token)
+
+
+@pytest.mark.asyncio
+async def test_validate_user_takes_strava_slot_only_to_refresh(monkeypatch):
+    monkeypatch.setenv("JWT_SECRET", "secret")
+    monkeypatch.setattr(concurrency, "_dependency_semaphores", {})
+    monkeypatch.setitem(concurrency._dependency_limits, Dependency.STRAVA, 1)
+    monkeypatch.setattr(
+        supabase_client, "get_user", lambda athlete_id: User(athlete_id=athlete_id)
+    )
+    refreshed = []
+    monkeypatch.setattr(auth_manager, "refresh_expired_token", refreshed.append)
+
+    valid = auth_manager.generate_jwt(1, expires_at=int(time.time()) + 3600)
+    expired = auth_manager.generate_jwt(2, expires_at=int(time.time()) - 3600)
+
+    # a nightly sync holds every Strava slot
+    async with concurrency.limit(Dependency.STRAVA):
+        user = await asyncio.wait_for(auth_manager.validate_user(bearer(valid)), 1)
+        assert user.athlete_id == 1
+
+        refresh = asyncio.create_task(auth_manager.validate_user(bearer(expired)))
+        await asyncio.sleep(0.05)
+        assert not refresh.done()
+        assert refreshed == []
+
+    assert (await refresh).athlete_id == 2
+    assert refreshed == [2]
+
+    with pytest.raises(HTTPException) as e:
+        await auth_manager.validate_user(bearer("not a jwt"))
+    assert e.value.status_code == 401
+
+
+def test_strava_authenticate_replaces_cached_token(monkeypatch):
+    monkeypatch.setenv("JWT_SECRET", "secret")
+    monkeypatch.setattr(
+        auth_manager,
+        "token_cache",
+        auth_manager.TokenCache(margin=datetime.timedelta(minutes=10), max_size=8),
+    )
+    expires_at = int(time.time()) + 3600
+    revoked = User(
+        athlete_id=1,
+        access_token="revoked",
+        expires_at=datetime.datetime.fromtimestamp(expires_at, datetime.UTC),
+    )
+    auth_manager.token_cache.set(revoked)
+
+    class FakeClient:
+        def __init__(self, access_token, requests_session):
+            self.access_token = access_token
+
+        def get_athlete(self):
+            return SimpleNamespace(id=1)
+
+    monkeypatch.setattr(auth_manager, "Client", FakeClient)
+    monkeypatch.setattr(
+        auth_manager,
+        "get_strava_token",
+        lambda code: {
+            "access_token": "fresh",
+            "refresh_token": "refresh",
+            "expires_at": expires_at,
+        },
+    )
+    monkeypatch.setattr(supabase_client, "is_new_user", lambda athlete_id: False)
+    monkeypatch.setattr(
+        supabase_client,
+        "get_or_create_user",
+        lambda athlete_id, user_id: User(athlete_id=athlete_id),
+    )
+    monkeypatch.setattr(supabase_client, "get_device_token", lambda athlete_id: None)
+    monkeypatch.setattr(supabase_client, "upsert_user", lambda user: None)
+
+    assert auth_manager.strava_authenticate("code")["success"]
+    token = auth_manager.token_cache.get_or_refresh(1, load=None, refresh=None)
+    assert token.access_token == "fresh"
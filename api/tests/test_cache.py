@@ -0,0 +1,152 @@
+import datetime
+import json
+import os
+import threading
+import time
+from collections import OrderedDict
+from concurrent.futures import ThreadPoolExecutor
+
+from src.cache import DiskCache, LRUCache, TTLCache
+
+
+def test_lru_cache_evicts_least_recently_used():
+    cache = LRUCache(max_size=2)
+    cache.set("a", 1)
+    cache.set("b", 2)
+    assert cache.get("a") == 1
+
+    cache.set("c", 3)
+    assert "b" not in cache
+    assert cache.get("a") == 1
+    assert cache.get("c") == 3
+    assert len(cache) == 2
+
+
+def test_lru_cache_reads_and_writes_through_backend():
+    backend = {"a": 1}
+    cache = LRUCache(max_size=1, load=backend.get, store=backend.__setitem__)
+
+    assert cache.get("a") == 1
+    assert cache.get_or_compute("b", lambda: 2) == 2
+    assert backend == {"a": 1, "b": 2}
+
+    # evicted from memory, still served by the backend without recomputing
+    assert "a" not in cache
+    assert cache.get_or_compute("a", lambda: 3) == 1
+
+
+class YieldingOrderedDict(OrderedDict):
+    def move_to_end(self, key, last=True):
+        # hand the GIL to other threads between the lookup and the move
+        time.sleep(0.0001)
+        super().move_to_end(key, last)
+
+
+def test_lru_cache_is_thread_safe():
+    cache = LRUCache(max_size=8)
+    cache._entries = YieldingOrderedDict()
+    errors = []
+
+    def hammer(thread_index):
+        try:
+            for i in range(200):
+                key = (thread_index * 7 + i) % 32
+                if cache.get(key) is None:
+                    cache.set(key, key)
+                if i % 20 == 0:
+                    cache.evict(key)
+        except Exception as e:
+            errors.append(e)
+
+    with ThreadPoolExecutor(max_workers=16) as executor:
+        list(executor.map(hammer, range(16)))
+
+    assert errors == []
+    assert len(cache) <= 8
+    assert all(cache.get(key) == key for key in list(cache._entries))
+
+
+def test_disk_cache_evicts_least_recently_used(tmp_path):
+    cache = DiskCache(str(tmp_path), max_size=2)
+    cache.set("a", {"value": 1})
+    time.sleep(0.01)
+    cache.set("b", {"value": 2})
+    time.sleep(0.01)
+    assert cache.get("a") == {"value": 1}
+    time.sleep(0.01)
+
+    cache.set("c", {"value": 3})
+    assert "b" not in cache
+    assert len(cache) == 2
+
+    # entries survive a new instance over the same directory
+    assert DiskCache(str(tmp_path), max_size=2).get("c") == {"value": 3}
+
+
+def test_disk_cache_tolerates_files_removed_by_other_workers(tmp_path, monkeypatch):
+    cache = DiskCache(str(tmp_path), max_size=2)
+    cache.set("a", 1)
+    cache.set("b", 2)
+
+    # another worker evicts "a" between listing the directory and reading mtimes
+    getmtime = os.path.getmtime
+
+    def racing_getmtime(path):
+        if path.endswith("a.json"):
+            os.remove(path)
+        return getmtime(path)
+
+    monkeypatch.setattr(os.path, "getmtime", racing_getmtime)
+    cache.set("c", 3)
+    assert len(cache) == 2
+
+    # and removes the oldest file right before this worker does
+    monkeypatch.setattr(os.path, "getmtime", getmtime)
+    remove = os.remove
+
+    def racing_remove(path):
+        remove(path)
+        remove(path)
+
+    monkeypatch.setattr(os, "remove", racing_remove)
+    cache.set("d", 4)
+    assert len(cache) == 2
+    cache.clear()
+    assert len(cache) == 0
+
+
+def test_disk_cache_concurrent_writers_of_a_key(tmp_path, monkeypatch):
+    cache = DiskCache(str(tmp_path), max_size=2)
+    both_written = threading.Barrier(2, timeout=1)
+    dump = json.dump
+
+    def dump_together(value, f):
+        dump(value, f)
+        f.flush()
+        both_written.wait()
+
+    monkeypatch.setattr(json, "dump", dump_together)
+    with ThreadPoolExecutor(max_workers=2) as executor:
+        list(executor.map(lambda value: cache.set("a", value), [1, 2]))
+
+    assert cache.get("a") in (1, 2)
+    assert os.listdir(tmp_path) == ["a.json"]
+
+
+def test_ttl_cache_expires_entries_and_counts(tmp_path, monkeypatch):
+    now = [1000.0]
+    monkeypatch.setattr(time, "time", lambda: now[0])
+
+    for backend in [LRUCache(max_size=2), DiskCache(str(tmp_path), max_size=2)]:
+        cache = TTLCache(backend, ttl=datetime.timedelta(minutes=1))
+        cache.set("a", "cached")
+        assert cache.get("a") == "cached"
+        assert cache.get("b") is None
+
+        now[0] += 61
+        assert cache.get("a") is None
+        assert "a" not in backend
+        assert cache.stats() == {"hits": 1, "misses": 2, "hit_rate": 1 / 3, "size": 0}
+
+        cache.reset_stats()
+        assert cache.stats()["hits"] == cache.stats()["misses"] == 0
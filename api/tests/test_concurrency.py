@@ -0,0 +1,186 @@
+import asyncio
+import time
+
+import pytest
+from postgrest.exceptions import APIError
+from src import concurrency, llm, supabase_client, update_pipeline
+from src.types.concurrency import Dependency
+from src.types.update_pipeline import ExeType
+from src.types.user import User
+from src.utils import datetime_now_est
+
+
+@pytest.mark.asyncio
+async def test_athlete_context_bounds_in_flight_requests(monkeypatch):
+    """Requests from one athlete never exceed the per-athlete limit"""
+    monkeypatch.setattr(concurrency, "_max_requests_per_athlete", 2)
+    in_flight = 0
+    max_in_flight = 0
+
+    async def call():
+        nonlocal in_flight, max_in_flight
+        async with concurrency.limit(Dependency.SUPABASE):
+            in_flight += 1
+            max_in_flight = max(max_in_flight, in_flight)
+            await asyncio.sleep(0.01)
+            in_flight -= 1
+
+    with concurrency.athlete_context(1):
+        await asyncio.gather(*(call() for _ in range(6)))
+
+    assert max_in_flight == 2
+    assert concurrency.get_current_athlete_id() is None
+
+
+@pytest.mark.asyncio
+async def test_run_in_thread_does_not_block_event_loop():
+    """Blocking calls overlap and keep the athlete context"""
+
+    def blocking_call():
+        time.sleep(0.2)
+        return concurrency.get_current_athlete_id()
+
+    start = time.monotonic()
+    with concurrency.athlete_context(1):
+        results = await asyncio.gather(
+            *(
+                concurrency.run_in_thread(Dependency.STRAVA, blocking_call)
+                for _ in range(4)
+            )
+        )
+
+    assert results == [1, 1, 1, 1]
+    assert time.monotonic() - start < 0.6
+
+
+@pytest.mark.asyncio
+async def test_fan_out_updates(monkeypatch):
+    """All users are updated with at most max_concurrent_users in flight"""
+    in_flight = 0
+    max_in_flight = 0
+
+    async def fake_wrapper(user, exe_type, dt):
+        nonlocal in_flight, max_in_flight
+        in_flight += 1
+        max_in_flight = max(max_in_flight, in_flight)
+        await asyncio.sleep(0.01)
+        in_flight -= 1
+        return {"success": user.athlete_id % 2 == 0}
+
+    monkeypatch.setattr(update_pipeline, "update_training_week_wrapper", fake_wrapper)
+    users = [User(athlete_id=athlete_id) for athlete_id in range(10)]
+    summary = await update_pipeline.fan_out_updates(
+        users, ExeType.MID_WEEK, dt=datetime_now_est(), max_concurrent_users=3
+    )
+
+    assert max_in_flight == 3
+    assert summary.n_users == 10
+    assert summary.n_succeeded == 5
+    assert summary.n_failed == 5
+    assert summary.openai_governor == llm.governor.stats()
+
+
+@pytest.mark.asyncio
+async def test_fan_out_updates_survives_lease_errors(monkeypatch):
+    """A failing lease call costs one athlete, the other workers carry on"""
+    updated, progress = [], []
+
+    async def fake_wrapper(user, exe_type, dt):
+        await asyncio.sleep(0.01)
+        updated.append(user.athlete_id)
+        return {"success": True}
+
+    def claim_athlete_lease(athlete_id, **kwargs):
+        if athlete_id == 2:
+            raise APIError({"code": "57014", "message": "statement timeout"})
+        return athlete_id != 3
+
+    def complete_athlete_lease(athlete_id, **kwargs):
+        if athlete_id == 4:
+            raise APIError({"code": "57014", "message": "statement timeout"})
+
+    monkeypatch.setattr(update_pipeline, "update_training_week_wrapper", fake_wrapper)
+    monkeypatch.setattr(supabase_client, "claim_athlete_lease", claim_athlete_lease)
+    monkeypatch.setattr(
+        supabase_client, "complete_athlete_lease", complete_athlete_lease
+    )
+
+    users = [User(athlete_id=athlete_id) for athlete_id in range(6)]
+    summary = await update_pipeline.fan_out_updates(
+        users,
+        ExeType.MID_WEEK,
+        dt=datetime_now_est(),
+        max_concurrent_users=3,
+        run_key="run",
+        on_progress=lambda summary: progress.append(summary.n_succeeded),
+    )
+
+    assert sorted(updated) == [0, 1, 4, 5]
+    assert summary.n_succeeded == 4
+    assert summary.n_failed == 1
+    assert summary.n_skipped == 1
+    # once up front, then after every athlete
+    assert len(progress) == 7
+
+
+@pytest.mark.asyncio
+async def test_fan_out_updates_renews_leases_of_long_updates(monkeypatch):
+    """A slow update keeps its lease, renewals stop once it finishes"""
+    renewed = []
+
+    async def fake_wrapper(user, exe_type, dt):
+        await asyncio.sleep(0.1)
+        return {"success": True}
+
+    monkeypatch.setattr(update_pipeline, "ATHLETE_LEASE_RENEW_SECONDS", 0.01)
+    monkeypatch.setattr(update_pipeline, "update_training_week_wrapper", fake_wrapper)
+    monkeypatch.setattr(supabase_client, "claim_athlete_lease", lambda **kwargs: True)
+    monkeypatch.setattr(
+        supabase_client, "complete_athlete_lease", lambda **kwargs: None
+    )
+    monkeypatch.setattr(
+        supabase_client,
+        "renew_athlete_lease",
+        lambda athlete_id, **kwargs: renewed.append(athlete_id),
+    )
+
+    summary = await update_pipeline.fan_out_updates(
+        [User(athlete_id=1)],
+        ExeType.MID_WEEK,
+        dt=datetime_now_est(),
+        run_key="run",
+    )
+    assert summary.n_succeeded == 1
+    assert renewed and set(renewed) == {1}
+
+    n_renewed = len(renewed)
+    await asyncio.sleep(0.05)
+    assert len(renewed) == n_renewed
+
+
+@pytest.mark.asyncio
+async def test_refresh_user_data_runs_in_athlete_context(monkeypatch):
+    athlete_ids = []
+
+    async def fake_refresh(user, dt):
+        athlete_ids.append(concurrency.get_current_athlete_id())
+        return {"success": True}
+
+    monkeypatch.setattr(update_pipeline, "_refresh_user_data", fake_refresh)
+    response = await update_pipeline.refresh_user_data(User(athlete_id=7))
+
+    assert response == {"success": True}
+    assert athlete_ids == [7]
+    assert concurrency.get_current_athlete_id() is None
+
+
+def test_shard_users():
+    """Every user lands in exactly one shard"""
+    users = [User(athlete_id=athlete_id) for athlete_id in range(10)]
+    shards = [update_pipeline.shard_users(users, i, 3) for i in range(3)]
+
+    assert sorted(user.athlete_id for shard in shards for user in shard) == list(
+        range(10)
+    )
+    with pytest.raises(ValueError):
+        update_pipeline.shard_users(users, 3, 3)
@@ -0,0 +1,63 @@
+from types import SimpleNamespace
+
+import pytest
+from src import llm
+from src.cache import LRUCache, TTLCache
+from src.constants import LLM_CACHE_TTL
+
+
+@pytest.mark.asyncio
+async def test_get_completion_caches_opted_in_generations(monkeypatch):
+    requests = []
+
+    async def create(model, messages, response_format):
+        requests.append(messages)
+        message = SimpleNamespace(content=f"response {len(requests)}")
+        return SimpleNamespace(
+            choices=[SimpleNamespace(message=message)],
+            usage=SimpleNamespace(total_tokens=10),
+        )
+
+    monkeypatch.setattr(llm.client.chat.completions, "create", create)
+    monkeypatch.setattr(llm, "observe", lambda **kwargs: None)
+    monkeypatch.setattr(
+        llm, "completion_cache", TTLCache(LRUCache(max_size=8), ttl=LLM_CACHE_TTL)
+    )
+
+    first = await llm.get_completion("notes", generation_name="gen_coaches_notes")
+    second = await llm.get_completion("notes", generation_name="gen_coaches_notes")
+    assert first == second == "response 1"
+
+    # different model or prompt is a different request
+    await llm.get_completion(
+        "notes", model="gpt-4o-mini", generation_name="gen_coaches_notes"
+    )
+    await llm.get_completion("other notes", generation_name="gen_coaches_notes")
+    assert len(requests) == 3
+
+    # generations that did not opt in always reach the LLM
+    await llm.get_completion("notes", generation_name="not_cached")
+    await llm.get_completion("notes", generation_name="not_cached")
+    assert len(requests) == 5
+    assert llm.completion_cache.stats()["hits"] == 1
+
+
+@pytest.mark.asyncio
+async def test_get_completion_survives_cache_write_failures(monkeypatch):
+    async def create(model, messages, response_format):
+        message = SimpleNamespace(content="response")
+        return SimpleNamespace(choices=[SimpleNamespace(message=message)], usage=None)
+
+    class FailingCache:
+        def get(self, key):
+            return None
+
+        def set(self, key, value):
+            raise FileNotFoundError("removed by another worker")
+
+    monkeypatch.setattr(llm.client.chat.completions, "create", create)
+    monkeypatch.setattr(llm, "observe", lambda **kwargs: None)
+    monkeypatch.setattr(llm, "completion_cache", FailingCache())
+
+    content = await llm.get_completion("notes", generation_name="gen_coaches_notes")
+    assert content == "response"
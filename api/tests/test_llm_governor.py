@@ -0,0 +1,102 @@
+import asyncio
+import time
+
+import pytest
+from src import concurrency, llm_governor
+from src.llm_governor import ModelLimits, OpenAIGovernor
+
+
+def new_governor(max_in_flight, tokens_per_minute=1_000_000):
+    return OpenAIGovernor(
+        model_limits={},
+        default_limits=ModelLimits(
+            max_in_flight=max_in_flight, tokens_per_minute=tokens_per_minute
+        ),
+    )
+
+
+@pytest.mark.asyncio
+async def test_governor_caps_in_flight_requests_per_model():
+    governor = new_governor(max_in_flight=2)
+    in_flight = {"gpt-4o": 0, "gpt-4o-mini": 0}
+    max_in_flight = {"gpt-4o": 0, "gpt-4o-mini": 0}
+
+    async def call(model):
+        async with governor.acquire(model, tokens=10):
+            in_flight[model] += 1
+            max_in_flight[model] = max(max_in_flight[model], in_flight[model])
+            await asyncio.sleep(0.01)
+            in_flight[model] -= 1
+
+    await asyncio.gather(*(call(model) for model in in_flight for _ in range(6)))
+
+    assert max_in_flight == {"gpt-4o": 2, "gpt-4o-mini": 2}
+    assert governor.queue_depth() == 0
+    assert governor.stats()["gpt-4o"]["max_queue_depth"] == 4
+
+    # each run reports its own max
+    governor.reset_max_queue_depth()
+    assert governor.stats()["gpt-4o"]["max_queue_depth"] == 0
+
+
+@pytest.mark.asyncio
+async def test_governor_takes_turns_across_athletes():
+    governor = new_governor(max_in_flight=1)
+    granted = []
+
+    async def call(athlete_id):
+        with concurrency.athlete_context(athlete_id):
+            async with governor.acquire("gpt-4o", tokens=10):
+                granted.append(athlete_id)
+                await asyncio.sleep(0.01)
+
+    # athlete 1 bursts a training plan, athlete 2 arrives right after
+    burst = [asyncio.create_task(call(1)) for _ in range(5)]
+    await asyncio.sleep(0)
+    assert governor.queue_depth("gpt-4o") == 4
+    await asyncio.gather(*burst, call(2), call(2))
+
+    assert granted == [1, 1, 2, 1, 2, 1, 1]
+
+
+@pytest.mark.asyncio
+async def test_governor_paces_tokens_per_minute(monkeypatch):
+    monkeypatch.setattr(llm_governor, "TOKEN_WINDOW_SECONDS", 0.2)
+    governor = new_governor(max_in_flight=10, tokens_per_minute=100)
+    granted_at = []
+
+    async def call(estimated_tokens, used_tokens):
+        async with governor.acquire("gpt-4o", tokens=estimated_tokens) as grant:
+            granted_at.append(time.monotonic())
+            grant.record_usage(used_tokens)
+
+    start = time.monotonic()
+    await asyncio.gather(call(30, 50), call(50, 50), call(10, 10))
+
+    # the first estimate is corrected to the reported usage, so the first two
+    # fill the window and the third waits for the first to expire
+    assert granted_at[1] - start < 0.1
+    assert granted_at[2] - start >= 0.2
+
+
+@pytest.mark.asyncio
+async def test_governor_drops_cancelled_waiters():
+    governor = new_governor(max_in_flight=1)
+    release = asyncio.Event()
+
+    async def call():
+        async with governor.acquire("gpt-4o", tokens=10):
+            await release.wait()
+
+    holder = asyncio.create_task(call())
+    waiter = asyncio.create_task(call())
+    await asyncio.sleep(0)
+    assert governor.queue_depth() == 1
+
+    waiter.cancel()
+    await asyncio.sleep(0)
+    assert governor.queue_depth() == 0
+
+    release.set()
+    await holder
+    assert governor.stats()["gpt-4o"]["in_flight"] == 0
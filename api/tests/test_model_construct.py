@@ -0,0 +1,119 @@
+import datetime
+
+import orjson
+from src.model_construct import round_model_floats, trusted_construct
+from src.types.activity import Activity, DailyActivity
+from src.types.training_week import (
+    Day,
+    EnrichedActivity,
+    FullTrainingWeek,
+    SessionType,
+    TrainingSession,
+    TrainingWeek,
+)
+from stravalib import model
+
+
+def test_trusted_construct_matches_validation_for_strava_activity():
+    strava_activity = model.Activity(
+        id=1,
+        name="Morning Run",
+        sport_type="Run",
+        distance=8046.7,
+        moving_time=2400,
+        elapsed_time=2500,
+        start_date="2024-08-13T10:00:00Z",
+        start_date_local="2024-08-13T06:00:00",
+        timezone="(GMT-05:00) America/New_York",
+        utc_offset=-14400,
+        total_elevation_gain=42,
+        average_speed=3.35,
+        max_speed=4.1,
+        average_heartrate=151.0,
+        kudos_count=3,
+    )
+    values = {
+        key: value
+        for key, value in strava_activity.__dict__.items()
+        if key in Activity.__fields__ and value is not None
+    }
+
+    activity = trusted_construct(Activity, strava_activity.__dict__)
+    assert activity == Activity(**values)
+    assert activity.moving_time == datetime.timedelta(seconds=2400)
+    assert activity.achievement_count == 0
+
+
+def test_trusted_construct_matches_validation_for_stored_json():
+    training_week = FullTrainingWeek(
+        past_training_week=[
+            EnrichedActivity(
+                activity=DailyActivity(
+                    date=datetime.date(2024, 8, 13),
+                    day_of_week="tue",
+                    week_of_year=33,
+                    year=2024,
+                    distance_in_miles=5.0,
+                    elevation_gain_in_feet=138,
+                    moving_time_in_minutes=40.0,
+                    pace_minutes_per_mile=8.0,
+                    activity_ids=[1],
+                    activity_count=1,
+                ),
+                coaches_notes="Nice and easy",
+            )
+        ],
+        future_training_week=TrainingWeek(
+            sessions=[
+                TrainingSession(
+                    day=Day.WED,
+                    session_type=SessionType.SPEED,
+                    distance=6,
+                    notes="6x800m",
+                )
+            ]
+        ),
+    )
+    values = orjson.loads(orjson.dumps(training_week.dict()))
+
+    constructed = trusted_construct(FullTrainingWeek, values)
+    assert constructed == training_week
+    assert constructed.past_training_week[0].activity.date == datetime.date(
+        2024, 8, 13
+    )
+    assert constructed.future_training_week.sessions[0].day is Day.WED
+
+
+def test_trusted_construct_copies_mutable_defaults():
+    first = trusted_construct(TrainingWeek, {})
+    first.sessions.append("session")
+    assert trusted_construct(TrainingWeek, {}).sessions == []
+
+
+def test_round_model_floats_matches_reflective_rounding():
+    def reference(day, precision=2):
+        for field_name, field in day.__fields__.items():
+            if (
+                isinstance(field.type_, type)
+                and issubclass(field.type_, float)
+                and getattr(day, field_name) is not None
+            ):
+                setattr(day, field_name, round(getattr(day, field_name), precision))
+        return day
+
+    def make_day(pace):
+        return DailyActivity(
+            date=datetime.date(2024, 8, 13),
+            day_of_week="tue",
+            week_of_year=33,
+            year=2024,
+            distance_in_miles=5.123456,
+            elevation_gain_in_feet=138.005,
+            moving_time_in_minutes=40.666666,
+            pace_minutes_per_mile=pace,
+            activity_ids=[1],
+            activity_count=1,
+        )
+
+    for pace in [7.94949, None]:
+        assert round_model_floats(make_day(pace)) == reference(make_day(pace))
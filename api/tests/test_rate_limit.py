@@ -0,0 +1,71 @@
+import pytest
+import requests
+from src import rate_limit
+from stravalib.exc import RateLimitExceeded
+
+shared = {}
+
+
+def gen_limiter():
+    return rate_limit.StravaRateLimiter(
+        load=lambda: shared.get("strava"),
+        store=lambda usage: shared.update(strava=usage),
+    )
+
+
+@pytest.fixture
+def limiter(monkeypatch):
+    shared.clear()
+    monkeypatch.setattr(rate_limit.time, "sleep", lambda seconds: None)
+    return gen_limiter()
+
+
+def headers(short_usage, long_usage, short_limit=100, long_limit=1000):
+    return {
+        "X-RateLimit-Usage": f"{short_usage},{long_usage}",
+        "X-RateLimit-Limit": f"{short_limit},{long_limit}",
+    }
+
+
+def test_token_bucket_queues_reservations():
+    bucket = rate_limit.TokenBucket(rate=10, capacity=2)
+    assert bucket.reserve() == 0
+    assert bucket.reserve() == 0
+    assert bucket.reserve() == pytest.approx(0.1, abs=0.01)
+    assert bucket.reserve() == pytest.approx(0.2, abs=0.01)
+
+
+def test_limiter_waits_for_window_and_raises_on_daily_limit(limiter):
+    limiter.update_from_headers(headers(10, 10), "POST")
+    assert limiter.seconds_until_available() == 0
+
+    limiter.update_from_headers(headers(100, 200), "POST")
+    assert 0 < limiter.seconds_until_available() <= 15 * 60
+
+    limiter.update_from_headers(headers(10, 1000), "POST")
+    with pytest.raises(RateLimitExceeded):
+        limiter.acquire()
+
+
+def test_limiter_shares_usage_with_other_workers(limiter):
+    limiter.update_from_headers(headers(100, 200), "POST")
+    limiter._maybe_sync()
+
+    other_worker = gen_limiter()
+    assert other_worker.seconds_until_available() == 0
+    other_worker._maybe_sync()
+    assert other_worker.seconds_until_available() > 0
+
+
+def test_session_retries_429(limiter, monkeypatch):
+    statuses = iter([429, 429, 200])
+
+    def request(self, method, url, *args, **kwargs):
+        response = requests.Response()
+        response.status_code = next(statuses)
+        response.headers.update(headers(10, 10))
+        return response
+
+    monkeypatch.setattr(requests.Session, "request", request)
+    session = rate_limit.RateLimitedSession(rate_limiter=limiter)
+    assert session.get("https://www.strava.com/api/v3/athlete").status_code == 200
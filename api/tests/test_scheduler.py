@@ -0,0 +1,179 @@
+import datetime
+
+import pytest
+from src import auth_manager, supabase_client, update_pipeline, webhook
+from src.scheduler import UpdateScheduler
+from src.types.update_pipeline import ExeType
+from src.types.user import Preferences, User
+from src.types.webhook import StravaEvent
+from src.utils import datetime_now_est
+
+
+def test_scheduler_orders_by_priority():
+    """Race proximity, premium and fresh runs are updated before dormant users"""
+    dt = datetime_now_est()
+    dormant = User(athlete_id=1)
+    premium = User(athlete_id=2, is_premium=True)
+    racing = User(
+        athlete_id=3,
+        preferences=Preferences(race_date=dt.date() + datetime.timedelta(days=7)),
+    )
+    fresh_run = User(athlete_id=4)
+
+    ordered = list(
+        UpdateScheduler(
+            [dormant, premium, racing, fresh_run],
+            dt=dt,
+            n_workers=1,
+            ran_today={fresh_run.athlete_id},
+        )
+    )
+
+    assert [user.athlete_id for user in ordered] == [3, 2, 4, 1]
+
+
+def test_scheduler_defers_low_priority_when_deadline_at_risk():
+    """Only low priority users are deferred once the deadline is at risk"""
+    dt = datetime_now_est()
+    users = [User(athlete_id=1, is_premium=True)] + [
+        User(athlete_id=athlete_id) for athlete_id in range(2, 6)
+    ]
+    update_scheduler = UpdateScheduler(
+        users, dt=dt, n_workers=1, deadline=dt + datetime.timedelta(seconds=1)
+    )
+
+    assert [user.athlete_id for user in update_scheduler] == [1]
+    assert len(update_scheduler.deferred) == 4
+
+
+@pytest.mark.asyncio
+async def test_fan_out_updates_defers_only_mid_week_runs(monkeypatch):
+    """New week runs update everyone, mid-week runs record who was deferred"""
+
+    async def fake_wrapper(user, exe_type, dt):
+        return {"success": True}
+
+    monkeypatch.setattr(update_pipeline, "update_training_week_wrapper", fake_wrapper)
+    dt = datetime_now_est()
+    users = [User(athlete_id=athlete_id) for athlete_id in range(1, 5)]
+    # already passed, so the deadline stays at risk however fast updates are
+    deadline = dt - datetime.timedelta(seconds=1)
+
+    summary = await update_pipeline.fan_out_updates(
+        users, ExeType.MID_WEEK, dt=dt, deadline=deadline, ran_today={3}
+    )
+    assert summary.n_succeeded == 1
+    assert summary.n_deferred == 3
+    assert sorted(summary.deferred_athlete_ids) == [1, 2, 4]
+
+    summary = await update_pipeline.fan_out_updates(
+        users, ExeType.NEW_WEEK, dt=dt, deadline=deadline
+    )
+    assert summary.n_succeeded == 4
+    assert summary.n_deferred == 0
+
+
+@pytest.mark.asyncio
+async def test_update_all_users_updates_webhook_runs_first(monkeypatch):
+    """A run reported by the webhook moves a queued athlete to the front"""
+    dt = datetime.datetime(2024, 11, 13, 22, tzinfo=datetime_now_est().tzinfo)
+    users = [User(athlete_id=athlete_id) for athlete_id in range(1, 4)]
+    run_events = {}
+    updated = []
+
+    async def fake_wrapper(user, exe_type, dt):
+        updated.append(user.athlete_id)
+        return {"success": True}
+
+    def list_athlete_ids_with_run_events_since(since):
+        return {
+            athlete_id
+            for athlete_id, event_time in run_events.items()
+            if event_time >= since
+        }
+
+    monkeypatch.setattr(update_pipeline, "update_training_week_wrapper", fake_wrapper)
+    monkeypatch.setattr(supabase_client, "list_users", lambda: users)
+    monkeypatch.setattr(supabase_client, "list_athlete_ids_updated_today", set)
+    monkeypatch.setattr(
+        supabase_client,
+        "list_athlete_ids_with_run_events_since",
+        list_athlete_ids_with_run_events_since,
+    )
+    monkeypatch.setattr(supabase_client, "claim_athlete_lease", lambda **kwargs: True)
+    monkeypatch.setattr(
+        supabase_client, "complete_athlete_lease", lambda **kwargs: None
+    )
+    monkeypatch.setattr(
+        supabase_client, "delete_athlete_leases_before", lambda created_before: None
+    )
+    monkeypatch.setattr(
+        supabase_client, "delete_run_events_before", lambda event_time: None
+    )
+
+    async def update_all_users():
+        updated.clear()
+        await update_pipeline.update_all_users(
+            dt=dt,
+            max_concurrent_users=1,
+            deadline=datetime_now_est() + datetime.timedelta(days=1),
+        )
+        return updated
+
+    assert await update_all_users() == [1, 2, 3]
+
+    # yesterday's run does not count
+    run_events[3] = dt - datetime.timedelta(days=1)
+    assert await update_all_users() == [1, 2, 3]
+
+    run_events[3] = dt - datetime.timedelta(hours=1)
+    assert await update_all_users() == [3, 1, 2]
+
+
+@pytest.mark.asyncio
+async def test_webhook_records_run_events(monkeypatch):
+    """Runs are recorded even if the webhook's own update fails"""
+    run_events = []
+
+    class FakeActivity:
+        sport_type = "Run"
+
+    class FakeStravaClient:
+        def get_activity(self, activity_id):
+            return FakeActivity()
+
+    async def failing_wrapper(user, exe_type, dt):
+        return {"success": False, "error": "boom"}
+
+    monkeypatch.setattr(
+        supabase_client, "get_user", lambda athlete_id: User(athlete_id=athlete_id)
+    )
+    monkeypatch.setattr(
+        auth_manager, "get_strava_client", lambda athlete_id: FakeStravaClient()
+    )
+    monkeypatch.setattr(
+        supabase_client,
+        "upsert_run_event",
+        lambda **kwargs: run_events.append(kwargs),
+    )
+    monkeypatch.setattr(webhook, "update_training_week_wrapper", failing_wrapper)
+
+    event = StravaEvent(
+        subscription_id=1,
+        aspect_type="create",
+        object_type="activity",
+        object_id=10,
+        owner_id=2,
+        event_time=1731515741,
+        updates={},
+    )
+    assert not (await webhook.maybe_process_strava_event(event))["success"]
+    assert run_events == [
+        {
+            "athlete_id": 2,
+            "activity_id": 10,
+            "event_time": datetime.datetime(
+                2024, 11, 13, 16, 35, 41, tzinfo=datetime.timezone.utc
+            ),
+        }
+    ]
@@ -0,0 +1,22 @@
+import requests
+from src.strava_client_pool import StravaClientPool
+from src.types.user import StravaToken
+
+
+def test_pool_isolates_athletes_and_evicts_least_recently_used():
+    pool = StravaClientPool(max_size=2, new_session=requests.Session)
+
+    client_1 = pool.get(StravaToken(athlete_id=1, access_token="token_1"))
+    client_2 = pool.get(StravaToken(athlete_id=2, access_token="token_2"))
+    assert client_1 is not client_2
+    assert client_1.access_token == "token_1"
+    assert client_2.access_token == "token_2"
+
+    # same athlete reuses its client (and connections), with refreshed tokens
+    assert pool.get(StravaToken(athlete_id=1, access_token="token_1b")) is client_1
+    assert client_1.access_token == "token_1b"
+
+    pool.get(StravaToken(athlete_id=3, access_token="token_3"))
+    assert len(pool) == 2
+    assert pool.get(StravaToken(athlete_id=1, access_token="token_1b")) is client_1
+    assert pool.get(StravaToken(athlete_id=2, access_token="token_2")) is not client_2
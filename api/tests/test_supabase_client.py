@@ -0,0 +1,218 @@
+import datetime
+
+import pytest
+from postgrest.exceptions import APIError
+from src import supabase_client
+from src.types.update_pipeline import LeaseStatus
+
+
+class FakeResponse:
+    def __init__(self, data):
+        self.data = data
+
+
+class FakeQuery:
+    def __init__(self, table, action, values=None):
+        self.table = table
+        self.action = action
+        self.values = values
+        self.filters = {}
+        self.before = {}
+
+    def eq(self, column, value):
+        self.filters[column] = value
+        return self
+
+    def lt(self, column, value):
+        self.before[column] = value
+        return self
+
+    def execute(self):
+        return self.table.execute(self)
+
+
+class FakeTable:
+    """In-memory table keyed by run_key & athlete_id, like athlete_lease"""
+
+    def __init__(self, rows=()):
+        self.rows = {(row["run_key"], row["athlete_id"]): dict(row) for row in rows}
+        # runs between the select and the update of a retry, e.g. another worker
+        self.before_update = None
+
+    def insert(self, values):
+        return FakeQuery(self, "insert", values)
+
+    def select(self, columns):
+        return FakeQuery(self, "select")
+
+    def update(self, values):
+        return FakeQuery(self, "update", values)
+
+    def delete(self):
+        return FakeQuery(self, "delete")
+
+    def execute(self, query):
+        if query.action == "insert":
+            key = (query.values["run_key"], query.values["athlete_id"])
+            if key in self.rows:
+                raise APIError({"code": "23505", "message": "duplicate key"})
+            self.rows[key] = dict(query.values)
+            return FakeResponse([query.values])
+
+        if query.action == "update" and self.before_update is not None:
+            self.before_update(self)
+
+        matches = [
+            row
+            for row in self.rows.values()
+            if all(row[column] == value for column, value in query.filters.items())
+            and all(row[column] < value for column, value in query.before.items())
+        ]
+        if query.action == "update":
+            for row in matches:
+                row.update(query.values)
+        if query.action == "delete":
+            self.rows = {
+                key: row for key, row in self.rows.items() if row not in matches
+            }
+        return FakeResponse([dict(row) for row in matches])
+
+
+def lease_row(status, attempts=1, leased_for=datetime.timedelta(minutes=10)):
+    leased_until = datetime.datetime.now(datetime.timezone.utc) + leased_for
+    return {
+        "run_key": "run",
+        "athlete_id": 1,
+        "worker_id": "other",
+        "status": status,
+        "leased_until": leased_until.isoformat(),
+        "attempts": attempts,
+    }
+
+
+@pytest.fixture
+def patch_table(monkeypatch):
+    def patch(*rows):
+        table = FakeTable(rows)
+        monkeypatch.setattr(supabase_client.client, "table", lambda name: table)
+        return table
+
+    return patch
+
+
+def claim(worker_id="me", max_attempts=3):
+    return supabase_client.claim_athlete_lease(
+        run_key="run",
+        athlete_id=1,
+        worker_id=worker_id,
+        lease_seconds=600,
+        max_attempts=max_attempts,
+    )
+
+
+def test_claim_athlete_lease_inserts_first_claim(patch_table):
+    table = patch_table()
+    assert claim()
+    assert table.rows["run", 1]["worker_id"] == "me"
+    assert table.rows["run", 1]["attempts"] == 1
+
+    # leased by this run already, nobody else gets the athlete
+    assert not claim(worker_id="other")
+
+
+def test_claim_athlete_lease_skips_completed_athletes(patch_table):
+    table = patch_table(lease_row(LeaseStatus.DONE))
+    assert not claim()
+    assert table.rows["run", 1]["worker_id"] == "other"
+
+
+def test_claim_athlete_lease_retries_failed_athletes(patch_table):
+    table = patch_table(lease_row(LeaseStatus.FAILED))
+    assert claim()
+    assert table.rows["run", 1]["worker_id"] == "me"
+    assert table.rows["run", 1]["status"] == LeaseStatus.LEASED
+    assert table.rows["run", 1]["attempts"] == 2
+
+
+def test_claim_athlete_lease_reclaims_expired_leases(patch_table):
+    table = patch_table(
+        lease_row(LeaseStatus.LEASED, leased_for=-datetime.timedelta(minutes=1))
+    )
+    assert claim()
+    assert table.rows["run", 1]["worker_id"] == "me"
+    assert table.rows["run", 1]["attempts"] == 2
+
+
+def test_claim_athlete_lease_stops_at_max_attempts(patch_table):
+    table = patch_table(lease_row(LeaseStatus.FAILED, attempts=3))
+    assert not claim(max_attempts=3)
+    assert table.rows["run", 1]["status"] == LeaseStatus.FAILED
+
+
+def test_claim_athlete_lease_loses_compare_and_swap(patch_table):
+    table = patch_table(lease_row(LeaseStatus.FAILED))
+
+    def other_worker_retries(table):
+        table.rows["run", 1].update(
+            {"worker_id": "other", "status": LeaseStatus.LEASED, "attempts": 2}
+        )
+
+    table.before_update = other_worker_retries
+    assert not claim()
+    assert table.rows["run", 1]["worker_id"] == "other"
+
+
+def test_claim_athlete_lease_raises_other_api_errors(monkeypatch, patch_table):
+    table = patch_table()
+
+    def insert(values):
+        raise APIError({"code": "42P01", "message": "relation does not exist"})
+
+    monkeypatch.setattr(table, "insert", insert)
+    with pytest.raises(APIError):
+        claim()
+
+
+def test_complete_athlete_lease_records_outcome(patch_table):
+    table = patch_table(lease_row(LeaseStatus.LEASED))
+    table.rows["run", 1]["worker_id"] = "me"
+
+    # a worker whose lease was reclaimed cannot overwrite the new holder's row
+    supabase_client.complete_athlete_lease("run", 1, "stale", error="boom")
+    assert table.rows["run", 1]["status"] == LeaseStatus.LEASED
+
+    supabase_client.complete_athlete_lease("run", 1, "me", error="boom")
+    assert table.rows["run", 1]["status"] == LeaseStatus.FAILED
+    assert table.rows["run", 1]["error"] == "boom"
+    assert claim(worker_id="retry")
+
+    supabase_client.complete_athlete_lease("run", 1, "retry")
+    assert table.rows["run", 1]["status"] == LeaseStatus.DONE
+    assert table.rows["run", 1]["error"] is None
+    assert not claim()
+
+
+def test_renew_athlete_lease_extends_held_leases(patch_table):
+    table = patch_table(lease_row(LeaseStatus.LEASED, leased_for=datetime.timedelta()))
+    leased_until = table.rows["run", 1]["leased_until"]
+
+    assert not supabase_client.renew_athlete_lease("run", 1, "me", lease_seconds=600)
+    assert table.rows["run", 1]["leased_until"] == leased_until
+
+    assert supabase_client.renew_athlete_lease("run", 1, "other", lease_seconds=600)
+    assert table.rows["run", 1]["leased_until"] > leased_until
+
+    # finished leases stay finished
+    table.rows["run", 1]["status"] = LeaseStatus.DONE
+    assert not supabase_client.renew_athlete_lease("run", 1, "other", lease_seconds=600)
+
+
+def test_delete_athlete_leases_before_keeps_recent_runs(patch_table):
+    now = datetime.datetime.now(datetime.timezone.utc)
+    old = {**lease_row(LeaseStatus.DONE), "run_key": "old"}
+    old["created_at"] = (now - datetime.timedelta(days=30)).isoformat()
+    recent = {**lease_row(LeaseStatus.DONE), "created_at": now.isoformat()}
+    table = patch_table(old, recent)
+
+    supabase_client.delete_athlete_leases_before(now - datetime.timedelta(days=14))
+    assert list(table.rows) == [("run", 1)]
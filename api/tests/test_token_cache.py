@@ -0,0 +1,78 @@
+import datetime
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+
+from src.token_cache import TokenCache
+from src.types.user import StravaToken, User
+from src.utils import datetime_now_est
+
+
+def test_token_cache_refreshes_once_under_concurrency():
+    cache = TokenCache(margin=datetime.timedelta(minutes=10), max_size=8)
+    n_refreshes = 0
+    refresh_lock = threading.Lock()
+
+    def load(athlete_id):
+        return User(
+            athlete_id=athlete_id,
+            access_token="expiring",
+            refresh_token="refresh",
+            expires_at=datetime_now_est() + datetime.timedelta(minutes=5),
+        )
+
+    def refresh(token):
+        nonlocal n_refreshes
+        with refresh_lock:
+            n_refreshes += 1
+        time.sleep(0.05)
+        return User(
+            athlete_id=token.athlete_id,
+            access_token="fresh",
+            refresh_token=token.refresh_token,
+            expires_at=datetime_now_est() + datetime.timedelta(hours=6),
+        )
+
+    with ThreadPoolExecutor(max_workers=8) as executor:
+        tokens = list(
+            executor.map(lambda _: cache.get_or_refresh(1, load, refresh), range(8))
+        )
+
+    assert n_refreshes == 1
+    assert {token.access_token for token in tokens} == {"fresh"}
+
+
+def test_token_cache_skips_refresh_for_valid_stored_token():
+    cache = TokenCache(margin=datetime.timedelta(minutes=10), max_size=8)
+    stored = User(
+        athlete_id=1,
+        access_token="valid",
+        expires_at=datetime_now_est() + datetime.timedelta(hours=1),
+    )
+
+    def refresh(token):
+        raise AssertionError("valid tokens must not be refreshed")
+
+    token = cache.get_or_refresh(1, lambda athlete_id: stored, refresh)
+    assert token.access_token == "valid"
+    assert cache.get_or_refresh(1, lambda athlete_id: None, refresh) is token
+
+
+def test_token_cache_holds_only_tokens_of_recent_athletes():
+    cache = TokenCache(margin=datetime.timedelta(minutes=10), max_size=2)
+    expires_at = datetime_now_est() + datetime.timedelta(hours=1)
+    for athlete_id in range(1, 4):
+        cache.set(
+            User(
+                athlete_id=athlete_id,
+                email="runner@example.com",
+                access_token=f"token_{athlete_id}",
+                expires_at=expires_at,
+            )
+        )
+
+    assert len(cache) == 2
+    token = cache.get_or_refresh(3, load=None, refresh=None)
+    assert token == StravaToken(
+        athlete_id=3, access_token="token_3", expires_at=expires_at
+    )
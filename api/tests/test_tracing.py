@@ -0,0 +1,26 @@
+import pytest
+from src import tracing
+from src.types.tracing import SpanOutcome
+
+
+def test_spans_are_exported_and_summarized(monkeypatch, tmp_path):
+    """Spans record their outcome and can be summarized per stage"""
+    spans_file = str(tmp_path / "spans.jsonl")
+    monkeypatch.setattr(tracing, "SPANS_FILE", spans_file)
+
+    with tracing.collect_spans() as spans:
+        for _ in range(3):
+            with tracing.span("stage_a", athlete_id=1):
+                pass
+        with pytest.raises(ValueError):
+            with tracing.span("stage_b", athlete_id=1):
+                raise ValueError("boom")
+
+    assert [span.outcome for span in spans] == [SpanOutcome.OK] * 3 + [
+        SpanOutcome.ERROR
+    ]
+    assert tracing.read_spans(spans_file) == spans
+
+    summary = tracing.summarize_spans(spans)
+    assert summary["stage_a"].count == 3
+    assert summary["stage_b"].count == 1
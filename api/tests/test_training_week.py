@@ -0,0 +1,122 @@
+import datetime
+from types import SimpleNamespace
+
+import pytest
+from src import supabase_client, training_week
+from src.types.activity import Activity
+from src.types.training_week import EnrichedActivity, TrainingWeek
+from src.types.user import User
+from tests import reference_activities
+
+
+def gen_daily_activity(runs, end_date):
+    return reference_activities.aggregate_daily_activity(
+        reference_activities.add_missing_dates(
+            runs, start_date=end_date - datetime.timedelta(weeks=2), end_date=end_date
+        )
+    )
+
+
+def gen_run(activity_id, start_date, distance=8000):
+    return Activity(
+        id=activity_id,
+        distance=distance,
+        moving_time=datetime.timedelta(minutes=40),
+        start_date=start_date,
+        start_date_local=start_date,
+    )
+
+
+@pytest.mark.asyncio
+async def test_slice_and_gen_weekly_activity_reuses_unchanged_days(monkeypatch):
+    annotated = []
+
+    async def fake_gen_coaches_notes(activity_of_interest, **kwargs):
+        annotated.append(activity_of_interest.date)
+        return f"notes for {activity_of_interest.date}"
+
+    monkeypatch.setattr(training_week, "gen_coaches_notes", fake_gen_coaches_notes)
+    user = User(athlete_id=1)
+
+    # Thursday through Friday of ISO week 2024-33
+    thursday = datetime.datetime(2024, 8, 15, 7)
+    friday = thursday + datetime.timedelta(days=1)
+    runs = [gen_run(i, thursday - datetime.timedelta(days=i)) for i in range(10)]
+
+    thursday_week = await training_week.slice_and_gen_weekly_activity(
+        user=user,
+        strava_client=None,
+        daily_activity=gen_daily_activity(runs, thursday),
+        rest_of_week=["fri", "sat", "sun"],
+    )
+    assert len(annotated) == 4
+
+    # next day: a new run on friday and wednesday's run re-uploaded longer
+    annotated.clear()
+    runs = runs + [gen_run(100, friday)]
+    runs[1] = gen_run(1, thursday - datetime.timedelta(days=1), distance=9000)
+    friday_week = await training_week.slice_and_gen_weekly_activity(
+        user=user,
+        strava_client=None,
+        daily_activity=gen_daily_activity(runs, friday),
+        rest_of_week=["sat", "sun"],
+        previous_week=thursday_week,
+    )
+
+    assert sorted(annotated) == [
+        datetime.date(2024, 8, 14),
+        datetime.date(2024, 8, 16),
+    ]
+    assert [day.activity.date for day in friday_week] == [
+        datetime.date(2024, 8, 12) + datetime.timedelta(days=i) for i in range(5)
+    ]
+    assert friday_week[0] == thursday_week[0]
+    assert friday_week[2].activity.distance_in_miles > 5
+
+
+class FakeTrainingWeekTable:
+    """Latest training_week row of a single athlete"""
+
+    def __init__(self):
+        self.rows = []
+
+    def upsert(self, row):
+        self.rows.append(row)
+        return self
+
+    def select(self, columns):
+        return self
+
+    def eq(self, column, value):
+        return self
+
+    def order(self, column, desc=False):
+        return self
+
+    def limit(self, n):
+        return self
+
+    def execute(self):
+        return SimpleNamespace(data=self.rows[-1:])
+
+
+def test_get_previous_past_training_week(monkeypatch):
+    """No row yet is an empty week, a row that cannot be decoded raises"""
+    table = FakeTrainingWeekTable()
+    monkeypatch.setattr(supabase_client.client, "table", lambda name: table)
+    assert training_week.get_previous_past_training_week(1) == []
+
+    end_date = datetime.datetime(2024, 8, 15, 7)
+    runs = [gen_run(i, end_date - datetime.timedelta(days=i)) for i in range(4)]
+    past_training_week = [
+        EnrichedActivity(activity=day, coaches_notes=f"notes for {day.date}")
+        for day in gen_daily_activity(runs, end_date)[-4:]
+    ]
+    supabase_client.upsert_training_week(
+        1, TrainingWeek(sessions=[]), past_training_week
+    )
+    assert training_week.get_previous_past_training_week(1) == past_training_week
+
+    table.rows.append({"past_training_week": "[{"})
+    with pytest.raises(ValueError):
+        training_week.get_previous_past_training_week(1)
@@ -0,0 +1,136 @@
+import asyncio
+import datetime
+
+import pytest
+from fastapi.testclient import TestClient
+from src import main, supabase_client, update_pipeline
+from src.types.update_pipeline import (
+    ExeType,
+    UpdateRun,
+    UpdateRunStatus,
+    UpdateRunSummary,
+)
+
+client = TestClient(main.app)
+
+
+def gen_update_run(status, silent_for=datetime.timedelta(seconds=5), **fields):
+    updated_at = datetime.datetime.now(datetime.timezone.utc) - silent_for
+    return UpdateRun(
+        job_id="job",
+        status=status,
+        created_at=updated_at - datetime.timedelta(minutes=10),
+        updated_at=updated_at,
+        **fields,
+    )
+
+
+def patch_update_run(monkeypatch, update_run):
+    monkeypatch.setattr(supabase_client, "get_update_run", lambda job_id: update_run)
+
+
+def test_get_update_run_progress_counts_remaining_users(monkeypatch):
+    summary = UpdateRunSummary(
+        exe_type=ExeType.MID_WEEK,
+        n_users=10,
+        n_succeeded=4,
+        n_failed=1,
+        n_skipped=2,
+        n_deferred=1,
+    )
+    patch_update_run(
+        monkeypatch,
+        gen_update_run(
+            UpdateRunStatus.RUNNING,
+            stage_durations={"list_users": 1.5},
+            summary=summary.dict(),
+        ),
+    )
+
+    progress = update_pipeline.get_update_run_progress("job")
+    assert progress.status == UpdateRunStatus.RUNNING
+    assert progress.n_users == 10
+    assert progress.n_done == 4
+    assert progress.n_remaining == 2
+    assert progress.stage_durations == {"list_users": 1.5}
+    assert progress.elapsed_seconds >= 600
+
+
+def test_get_update_run_progress_fails_stale_jobs(monkeypatch):
+    stale_seconds = update_pipeline.UPDATE_RUN_STALE_SECONDS
+    silent_for = datetime.timedelta(seconds=stale_seconds + 1)
+    patch_update_run(monkeypatch, gen_update_run(UpdateRunStatus.RUNNING, silent_for))
+
+    progress = update_pipeline.get_update_run_progress("job")
+    assert progress.status == UpdateRunStatus.FAILED
+    assert "No heartbeat" in progress.error
+    # the job stopped at its last heartbeat
+    assert progress.elapsed_seconds == 600
+
+    # finished jobs are not expected to heartbeat
+    patch_update_run(monkeypatch, gen_update_run(UpdateRunStatus.COMPLETE, silent_for))
+    assert update_pipeline.get_update_run_progress("job").status == (
+        UpdateRunStatus.COMPLETE
+    )
+
+
+@pytest.mark.asyncio
+async def test_run_update_all_users_job_heartbeats(monkeypatch):
+    updates = []
+    monkeypatch.setattr(update_pipeline, "UPDATE_RUN_HEARTBEAT_SECONDS", 0.01)
+    monkeypatch.setattr(
+        supabase_client,
+        "update_update_run",
+        lambda job_id, **fields: updates.append(fields),
+    )
+
+    async def update_all_users(job_id):
+        await asyncio.sleep(0.1)
+
+    monkeypatch.setattr(update_pipeline, "update_all_users", update_all_users)
+    await update_pipeline.run_update_all_users_job("job")
+
+    assert updates[0] == {"status": UpdateRunStatus.RUNNING}
+    assert updates[-1] == {"status": UpdateRunStatus.COMPLETE}
+    assert {} in updates[1:-1]
+
+    # no heartbeats once the job has finished
+    n_updates = len(updates)
+    await asyncio.sleep(0.05)
+    assert len(updates) == n_updates
+
+
+def test_update_all_users_endpoints(monkeypatch):
+    monkeypatch.setenv("API_KEY", "key")
+    jobs = []
+    monkeypatch.setattr(supabase_client, "insert_update_run", jobs.append)
+
+    async def run_update_all_users_job(job_id, **kwargs):
+        jobs.append(kwargs)
+
+    monkeypatch.setattr(main, "run_update_all_users_job", run_update_all_users_job)
+
+    response = client.post("/update-all-users/", headers={"x-api-key": "wrong"})
+    assert response.status_code == 403
+    assert jobs == []
+
+    response = client.post(
+        "/update-all-users/?shard_index=1&shard_count=2",
+        headers={"x-api-key": "key"},
+    )
+    assert response.status_code == 200
+    job_id = response.json()["job_id"]
+    assert jobs == [job_id, {"shard_index": 1, "shard_count": 2}]
+
+    def get_update_run(requested_job_id):
+        if requested_job_id != job_id:
+            raise ValueError(f"Could not find update_run with {requested_job_id=}")
+        return gen_update_run(UpdateRunStatus.QUEUED).copy(update={"job_id": job_id})
+
+    monkeypatch.setattr(supabase_client, "get_update_run", get_update_run)
+    response = client.get(f"/update-all-users/{job_id}", headers={"x-api-key": "key"})
+    assert response.status_code == 200
+    assert response.json()["status"] == UpdateRunStatus.QUEUED
+
+    response = client.get("/update-all-users/missing", headers={"x-api-key": "key"})
+    assert response.status_code == 404